@@ -0,0 +1,38 @@
+"""Arranque de la API: ``python -m app [--host H] [--port P] [--workers N]``.
+
+Lo usan ``scripts/run_dev.bat`` y los servicios NSSM en lugar de
+``python -m uvicorn``: en Windows fija ``WindowsSelectorEventLoopPolicy``
+antes de que uvicorn cree el event loop. psycopg async no funciona con el
+ProactorEventLoop, y uvicorn solo cambia la política con ``--workers`` o
+``--reload``.
+"""
+import argparse
+import asyncio
+import sys
+
+import uvicorn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--reload", action="store_true")
+    args = parser.parse_args(argv)
+
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        reload=args.reload,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
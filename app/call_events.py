@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+
+def call_event(
+    call: models.Call, type: str, actor_id: Optional[str] = None, **payload: Any
+) -> Dict[str, Any]:
+    return {
+        "call_id": call.id,
+        "type": type,
+        "at": datetime.now(timezone.utc),
+        "actor_id": actor_id,
+        "payload": payload or None,
+    }
+
+
+async def record_events(db: AsyncSession, events: List[Dict[str, Any]]):
+    """Agrega los eventos en un solo INSERT multi-fila dentro de la
+    transacción de la transición: se confirman (o descartan) junto con ella.
+    """
+    if events:
+        await db.execute(insert(models.CallEvent).values(events))
+
+
+def event_values(event: models.CallEvent) -> Dict[str, Any]:
+    return {
+        "id": event.id,
+        "call_id": event.call_id,
+        "type": event.type,
+        "at": event.at,
+        "actor_id": event.actor_id,
+        "payload": event.payload,
+    }
@@ -0,0 +1,126 @@
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+
+_TOTALS = ("total", "duration_sum", "duration_count", "reconnects_sum", "reconnects_count")
+
+
+def metrics_state(call: models.Call) -> List[Any]:
+    # Lo mínimo de una llamada que afecta a MetricsResponse
+    return [call.status.value, call.duration_seconds or 0, call.total_reconnects or 0]
+
+
+def _metrics_query():
+    # Una sola pasada sobre calls, agrupada por estado
+    Call = models.Call
+    return select(
+        Call.status,
+        func.count(Call.id),
+        func.coalesce(func.sum(Call.duration_seconds).filter(Call.duration_seconds > 0), 0),
+        func.count(Call.id).filter(Call.duration_seconds > 0),
+        func.coalesce(func.sum(Call.total_reconnects).filter(Call.total_reconnects > 0), 0),
+        func.count(Call.id).filter(Call.total_reconnects > 0),
+    ).group_by(Call.status)
+
+
+class CallMetricsCounters:
+    """Contadores de ``/metrics/calls`` mantenidos de forma incremental.
+
+    Cada transición aplica un delta ``{"before": estado|None, "after": estado}``
+    (ver ``metrics_state``); ``reconcile`` recalcula todo desde la base en una
+    sola consulta y corrige la deriva como diferencia contra una foto tomada
+    antes de la consulta, sin pisar los deltas aplicados mientras corre.
+
+    No es exacto: una transición que se confirma en la base antes de que la
+    consulta tome su snapshot pero cuyo delta llega a ``apply`` después de la
+    foto (p. ej. un ``metrics-delta`` de otro worker en camino) queda contada
+    dos veces, en los totales de la base y en el delta. Los contadores pueden
+    desviarse así hasta el siguiente ``reconcile``.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.by_status: Counter = Counter()
+        self.duration_sum = 0
+        self.duration_count = 0
+        self.reconnects_sum = 0
+        self.reconnects_count = 0
+        self.loaded = False
+
+    def _account(self, state: List[Any], sign: int):
+        status, duration, reconnects = state
+        self.total += sign
+        self.by_status[status] += sign
+        if duration > 0:
+            self.duration_sum += sign * duration
+            self.duration_count += sign
+        if reconnects > 0:
+            self.reconnects_sum += sign * reconnects
+            self.reconnects_count += sign
+
+    def apply(self, delta: Dict[str, Any]):
+        if delta.get("before") is not None:
+            self._account(delta["before"], -1)
+        self._account(delta["after"], 1)
+
+    def transition(
+        self, before: Optional[List[Any]], call: models.Call
+    ) -> Optional[Dict[str, Any]]:
+        after = metrics_state(call)
+        if before == after:
+            return None
+        delta = {"before": before, "after": after}
+        self.apply(delta)
+        return delta
+
+    def _totals(self) -> Dict[str, int]:
+        return {name: getattr(self, name) for name in _TOTALS}
+
+    async def reconcile(self, db: AsyncSession):
+        # La conexión se toma antes de la foto para que entre la foto y la
+        # lectura de la base quede solo el envío de la consulta
+        await db.connection()
+        totals, by_status = self._totals(), Counter(self.by_status)
+        rows = (await db.execute(_metrics_query())).all()
+
+        fresh = dict.fromkeys(_TOTALS, 0)
+        fresh_status: Counter = Counter()
+        for status, count, dur_sum, dur_count, rec_sum, rec_count in rows:
+            if status is not None:
+                fresh_status[status.value] = count
+            fresh["total"] += count
+            fresh["duration_sum"] += int(dur_sum)
+            fresh["duration_count"] += dur_count
+            fresh["reconnects_sum"] += int(rec_sum)
+            fresh["reconnects_count"] += rec_count
+        # Sin awaits desde la foto hasta aquí salvo la consulta: lo que
+        # ``apply`` sumó mientras tanto queda encima de los totales de la base
+        # (dos veces si la base ya lo incluía; ver el docstring)
+        for name in _TOTALS:
+            setattr(self, name, getattr(self, name) + fresh[name] - totals[name])
+        for status in set(by_status) | set(fresh_status):
+            self.by_status[status] += fresh_status[status] - by_status[status]
+        self.loaded = True
+
+    def response(self) -> schemas.MetricsResponse:
+        return schemas.MetricsResponse(
+            total_calls=self.total,
+            waiting=self.by_status[models.CallStatus.waiting.value],
+            in_progress=self.by_status[models.CallStatus.in_progress.value],
+            ended=self.by_status[models.CallStatus.ended.value],
+            avg_duration_seconds=(
+                self.duration_sum / self.duration_count if self.duration_count else 0.0
+            ),
+            avg_reconnects=(
+                self.reconnects_sum / self.reconnects_count
+                if self.reconnects_count
+                else 0.0
+            ),
+        )
+
+
+call_metrics_counters = CallMetricsCounters()
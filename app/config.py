@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -14,15 +14,106 @@ class Settings(BaseSettings):
     POSTGRES_USER: str = "postgres"
     POSTGRES_PASSWORD: str = "postgres"
     SQL_ECHO: bool = False
+    # Pool de conexiones por proceso (ver GET /internal/db/pool para dimensionarlo)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    # Recicla conexiones más viejas que esto (-1 nunca); reemplaza al pre-ping,
+    # que cuesta un SELECT 1 por checkout
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_USE_LIFO: bool = False
+    # Detrás de PgBouncer en modo transacción: sin prepared statements y,
+    # opcionalmente, sin pool propio (NullPool)
+    DB_PGBOUNCER: bool = False
+    DB_NULL_POOL: bool = False
+
+    # Bus de Socket.IO para varios workers: redis://host:6379/0 o memory://
+    SIO_MESSAGE_QUEUE: Optional[str] = None
+    SIO_CHANNEL: str = "videollamada"
+    SIO_ROOM_TTL_SECONDS: int = 86400
+    # Participantes por sala de señalización (0 = sin límite)
+    SIO_ROOM_MAX_MEMBERS: int = 2
+    # join/relay solo con sesión autenticada (JWT en el handshake) y a salas
+    # de llamadas activas del usuario; false = salas libres (demos, pruebas)
+    SIO_REQUIRE_AUTH: bool = True
+    # Un peer que pierde el socket conserva su lugar en la sala durante esta
+    # ventana y las señales dirigidas a él se guardan (hasta
+    # SIO_RESUME_BUFFER) para reenviarlas al reanudar; 0 = peer-left inmediato
+    SIO_RESUME_GRACE_SECONDS: float = 15
+    SIO_RESUME_BUFFER: int = 256
+    # Historial de participants escrito en diferido
+    PARTICIPANT_FLUSH_BATCH: int = 500
+    PARTICIPANT_FLUSH_INTERVAL_SECONDS: float = 1.0
+    PARTICIPANT_MAX_PENDING: int = 10000
+    # Agrupación de candidatos ICE en "signal-batch" (0 = desactivada)
+    SIGNAL_BATCH_WINDOW_MS: int = 0
+    SIGNAL_BATCH_MAX_CANDIDATES: int = 32
+    # Límite de relay (token bucket, mensajes/s y ráfaga) por sid y por sala;
+    # rate 0 desactiva ese nivel. Tras SIGNAL_RELAY_DISCONNECT_AFTER descartes
+    # seguidos el socket se desconecta (0 = solo descartar)
+    SIGNAL_RELAY_RATE_PER_SID: float = 50
+    SIGNAL_RELAY_BURST_PER_SID: int = 200
+    SIGNAL_RELAY_RATE_PER_ROOM: float = 100
+    SIGNAL_RELAY_BURST_PER_ROOM: int = 400
+    SIGNAL_RELAY_DISCONNECT_AFTER: int = 1000
+
+    # manual: el médico toma llamadas; auto: se asignan al siguiente médico disponible;
+    # engine: motor en memoria que asigna por prioridad (metadata.priority) y espera
+    DISPATCH_MODE: str = "manual"
+
+    WAITING_QUEUE_RESYNC_SECONDS: int = 60
+    METRICS_RECONCILE_SECONDS: int = 300
+    METRICS_ROLLUP_INTERVAL_SECONDS: int = 60
+    METRICS_ROLLUP_LAG_SECONDS: int = 60
+
+    # Reaper: cierra llamadas sin actividad más allá del TTL de su estado
+    # (0 desactiva ese estado; CALL_REAPER_INTERVAL_SECONDS=0 apaga el reaper)
+    CALL_REAPER_INTERVAL_SECONDS: int = 30
+    CALL_REAPER_BATCH: int = 500
+    CALL_WAITING_TTL_SECONDS: int = 1800
+    CALL_ASSIGNED_TTL_SECONDS: int = 300
+    CALL_IN_PROGRESS_TTL_SECONDS: int = 14400
+    CALL_RECONNECTING_TTL_SECONDS: int = 120
 
     STUN_URLS: List[str] = ["stun:stun.l.google.com:19302"]
     TURN_URLS: List[str] = []
     TURN_USERNAME: Optional[str] = None
     TURN_CREDENTIAL: Optional[str] = None
+    # Con TURN_SHARED_SECRET (static-auth-secret de coturn) cada usuario recibe
+    # credenciales temporales en lugar de TURN_USERNAME/TURN_CREDENTIAL
+    TURN_SHARED_SECRET: Optional[str] = None
+    TURN_CREDENTIAL_TTL_SECONDS: int = 86400
+    TURN_CREDENTIAL_REFRESH_MARGIN_SECONDS: int = 600
+    ICE_CACHE_SIZE: int = 10000
 
     JWT_SECRET_KEY: str = "change-me"
     JWT_ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
+    # Caché de principal (id, rol, activo, disponible) por sub del token; 0 la desactiva
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL_SECONDS: float = 60
+
+    # bcrypt: coste (los hashes con otro coste se regeneran al iniciar sesión),
+    # hilos dedicados y máximo de operaciones en cola antes de responder 503
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    PASSWORD_HASH_RETRY_AFTER_SECONDS: int = 2
+
+    # Logs estructurados: nivel, formato (json|text) y escritura desde un hilo aparte
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_ASYNC: bool = True
+    # Muestreo de logs de relay por tipo de señal (0..1); el resto usa el default
+    LOG_RELAY_SAMPLE_RATES: Dict[str, float] = {"candidate": 0.01}
+    LOG_RELAY_SAMPLE_DEFAULT: float = 1.0
+    # Logs internos de python-socketio / python-engineio (uno por paquete)
+    SIO_LOGGER: bool = False
+    SIO_ENGINEIO_LOGGER: bool = False
+
+    # Token de los endpoints /internal/* (header X-Internal-Token); vacío los desactiva
+    INTERNAL_API_TOKEN: Optional[str] = None
 
     TLS_ENABLE_DIRECT: bool = False
     TLS_CERT_FILE: Optional[str] = None
@@ -1,5 +1,13 @@
-from sqlalchemy import create_engine
+import os
+import time
+from collections import deque
+from typing import Any, Dict
+
+from sqlalchemy import create_engine, event
+from sqlalchemy import exc as sa_exc
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from .config import settings
 
 DATABASE_URL = (
@@ -7,16 +15,135 @@ DATABASE_URL = (
     f"@{settings.POSTGRES_HOST}:{settings.POSTGRES_PORT}/{settings.POSTGRES_DB}"
 )
 
-engine = create_engine(
-    DATABASE_URL,
-    echo=settings.SQL_ECHO,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=5,
-)
+
+class PoolStats:
+    """Telemetría del pool de un proceso: espera por checkout (desde pedir
+    la conexión hasta tenerla, incluida la apertura si hace falta),
+    timeouts, fallos de pre-ping e invalidaciones."""
+
+    def __init__(self, window: int = 1024):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.pre_ping_failures = 0
+        self.invalidations = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self._recent.append(seconds)
+
+    def snapshot(self, pool) -> Dict[str, Any]:
+        recent = sorted(self._recent)
+
+        def pick(q: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(q * len(recent)))] * 1000, 3)
+
+        data = {
+            "pid": os.getpid(),
+            "pool": "null" if settings.DB_NULL_POOL else "queue",
+            "pgbouncer": settings.DB_PGBOUNCER,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "connects": self.connects,
+            "pre_ping_failures": self.pre_ping_failures,
+            "invalidations": self.invalidations,
+            "wait_ms": {
+                "mean": round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "p50": pick(0.50),
+                "p95": pick(0.95),
+                "p99": pick(0.99),
+                "max": round(self.wait_max * 1000, 3),
+            },
+        }
+        if isinstance(pool, QueuePool):
+            data.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(pool.overflow(), 0),
+                max_overflow=settings.DB_MAX_OVERFLOW,
+            )
+        return data
+
+
+def _timed_pool(base, stats: PoolStats):
+    # Subclase por engine: Pool.recreate() (dispose) conserva la clase y con
+    # ella las estadísticas
+    class TimedPool(base):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except sa_exc.TimeoutError:
+                stats.timeouts += 1
+                raise
+            stats.record_wait(time.perf_counter() - started)
+            return connection
+
+    return TimedPool
+
+
+def _engine_options(queue_pool) -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "echo": settings.SQL_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if settings.DB_PGBOUNCER:
+        # PgBouncer en modo transacción: cada transacción puede caer en otra
+        # conexión del servidor, así que nada de prepared statements
+        options["connect_args"] = {"prepare_threshold": None}
+    if settings.DB_NULL_POOL:
+        # Sin pool local: PgBouncer ya reparte las conexiones
+        options["poolclass"] = NullPool
+    else:
+        options.update(
+            poolclass=queue_pool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_use_lifo=settings.DB_POOL_USE_LIFO,
+        )
+    return options
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(QueuePool))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+
+# psycopg 3 async: no bloquea el event loop que también sirve Socket.IO
+pool_stats = PoolStats()
+_async_options = _engine_options(AsyncAdaptedQueuePool)
+_async_options["poolclass"] = _timed_pool(_async_options["poolclass"], pool_stats)
+async_engine = create_async_engine(DATABASE_URL, **_async_options)
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
 Base = declarative_base()
 
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _count_connect(dbapi_connection, connection_record):
+    pool_stats.connects += 1
+
+
+@event.listens_for(async_engine.sync_engine, "invalidate")
+def _count_invalidate(dbapi_connection, connection_record, exception):
+    pool_stats.invalidations += 1
+
+
+@event.listens_for(async_engine.sync_engine, "handle_error")
+def _count_pre_ping_failure(context):
+    if context.is_pre_ping:
+        pool_stats.pre_ping_failures += 1
+
+
 def init_db():
     from . import models
     Base.metadata.create_all(bind=engine)
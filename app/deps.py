@@ -1,4 +1,4 @@
-from .db import SessionLocal
+from .db import AsyncSessionLocal, SessionLocal
 
 def get_db():
     db = SessionLocal()
@@ -6,3 +6,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
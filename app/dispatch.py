@@ -0,0 +1,120 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import exists, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+# Estados en los que la llamada ocupa al médico: todos los activos salvo la espera
+ACTIVE_DOCTOR_STATUSES = tuple(
+    status for status in models.ACTIVE_CALL_STATUSES if status != models.CallStatus.waiting
+)
+
+
+def doctor_busy(doctor_id):
+    # NOT EXISTS de otra llamada activa del médico (ix_calls_doctor_status);
+    # ``doctor_id`` puede ser un valor o ``models.User.id`` correlacionado
+    return exists().where(
+        models.Call.doctor_id == doctor_id,
+        models.Call.status.in_(ACTIVE_DOCTOR_STATUSES),
+    )
+
+
+async def lock_doctor(db: AsyncSession, doctor_id: str):
+    # Serializa las asignaciones de un mismo médico: sin el lock, dos claims
+    # concurrentes a llamadas distintas pasarían ambos el NOT EXISTS
+    await db.execute(select(models.User.id).where(models.User.id == doctor_id).with_for_update())
+
+
+def _oldest_waiting_call():
+    # SKIP LOCKED: cada transacción concurrente toma una llamada distinta
+    return (
+        select(models.Call)
+        .where(models.Call.status == models.CallStatus.waiting)
+        .order_by(models.Call.requested_at.asc(), models.Call.id.asc())
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+
+
+def _next_available_doctor():
+    last_assigned = (
+        select(func.max(models.Call.assigned_at))
+        .where(models.Call.doctor_id == models.User.id)
+        .correlate(models.User)
+        .scalar_subquery()
+    )
+    return (
+        select(models.User)
+        .where(
+            models.User.role == models.UserRole.doctor,
+            models.User.is_active.is_(True),
+            models.User.is_available.is_(True),
+            ~doctor_busy(models.User.id),
+        )
+        .order_by(last_assigned.asc().nulls_first(), models.User.id)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=models.User)
+    )
+
+
+async def dispatch_next(
+    db: AsyncSession, doctor: Optional[models.User] = None
+) -> Optional[models.Call]:
+    """Asigna la llamada en espera más antigua.
+
+    Con ``doctor`` la toma ese médico (modo pull), que debe estar bloqueado
+    con ``lock_doctor`` y libre; sin él se elige el siguiente médico
+    disponible (modo push). Devuelve ``None`` si no hay llamada o médico
+    libres; el commit queda a cargo del llamador.
+    """
+    call = await db.scalar(_oldest_waiting_call())
+    if call is None:
+        return None
+    if doctor is None:
+        doctor = await db.scalar(_next_available_doctor())
+        if doctor is None:
+            return None
+
+    call.doctor_id = doctor.id
+    call.status = models.CallStatus.assigned
+    call.assigned_at = datetime.now(timezone.utc)
+    await db.flush()
+    return call
+
+
+async def assign_call(
+    db: AsyncSession, call_id: int, doctor_id: str
+) -> Optional[models.Call]:
+    """Persiste un par propuesto por el motor de emparejamiento.
+
+    Bloquea la fila del médico (igual que el modo push) y asigna la llamada
+    solo si sigue en espera y el médico sigue disponible y sin otra llamada
+    activa. Devuelve ``None`` si la base ya no lo permite; el commit queda a
+    cargo del llamador.
+    """
+    doctor = await db.scalar(
+        select(models.User.id)
+        .where(
+            models.User.id == doctor_id,
+            models.User.role == models.UserRole.doctor,
+            models.User.is_active.is_(True),
+            models.User.is_available.is_(True),
+        )
+        .with_for_update()
+    )
+    if doctor is None:
+        return None
+    if await db.scalar(select(doctor_busy(doctor_id))):
+        return None
+    return await db.scalar(
+        update(models.Call)
+        .where(models.Call.id == call_id, models.Call.status == models.CallStatus.waiting)
+        .values(
+            doctor_id=doctor_id,
+            status=models.CallStatus.assigned,
+            assigned_at=datetime.now(timezone.utc),
+        )
+        .returning(models.Call)
+    )
@@ -0,0 +1,37 @@
+from typing import Any, Dict, Iterable, List
+
+import orjson
+from fastapi.responses import JSONResponse
+
+from . import models, schemas
+
+CALL_FIELDS = tuple(schemas.CallDetail.model_fields)
+
+# orjson serializa datetime y Enum por sí mismo; UTC como "Z" igual que pydantic
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+def call_values(call: models.Call) -> Dict[str, Any]:
+    """Campos de ``CallDetail`` leídos directo del ORM, sin revalidar con
+    pydantic datos que acaban de salir de la base."""
+    loaded = call.__dict__
+    try:
+        return {name: loaded[name] for name in CALL_FIELDS}
+    except KeyError:
+        # Algún atributo no está cargado: se lee por el descriptor
+        return {name: getattr(call, name) for name in CALL_FIELDS}
+
+
+def call_values_list(calls: Iterable[models.Call]) -> List[Dict[str, Any]]:
+    return [call_values(call) for call in calls]
+
+
+def call_row(call: models.Call) -> Dict[str, Any]:
+    # Versión con tipos JSON puros (str en lugar de datetime/Enum) para
+    # payloads de Socket.IO y el índice de la cola
+    return orjson.loads(orjson.dumps(call_values(call), option=ORJSON_OPTIONS))
@@ -0,0 +1,84 @@
+import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+
+# max-age de la configuración sin credenciales temporales (solo cambia al
+# reiniciar con otros settings)
+ICE_STATIC_MAX_AGE = 3600
+
+
+def turn_credentials(user_id: str, secret: str, ttl_seconds: int, now: Optional[float] = None):
+    """Credenciales TURN REST compatibles con ``use-auth-secret`` de coturn.
+
+    El usuario es ``<expiración unix>:<user_id>`` y la contraseña el
+    HMAC-SHA1 en base64 de ese usuario con el secreto compartido; coturn
+    las valida sin consultar al backend y las rechaza al vencer.
+    """
+    expires_at = int(now if now is not None else time.time()) + ttl_seconds
+    username = f"{expires_at}:{user_id}"
+    digest = hmac.new(secret.encode(), username.encode(), hashlib.sha1).digest()
+    return username, base64.b64encode(digest).decode(), expires_at
+
+
+class IceConfigCache:
+    """Configuración ICE por usuario, reutilizada hasta poco antes de que
+    venzan sus credenciales TURN (``ttl_seconds - refresh_margin``)."""
+
+    def __init__(self, max_size: int, ttl_seconds: int, refresh_margin: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.cache_seconds = max(ttl_seconds - refresh_margin, 0)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def _build(self, user_id: str, now: float) -> Dict[str, Any]:
+        servers = [{"urls": settings.STUN_URLS}]
+        username, credential, expires_at = turn_credentials(
+            user_id, settings.TURN_SHARED_SECRET, self.ttl_seconds, now
+        )
+        servers.append(
+            {"urls": settings.TURN_URLS, "username": username, "credential": credential}
+        )
+        return {"iceServers": servers, "expiresAt": expires_at}
+
+    def get(self, user_id: str) -> Tuple[Dict[str, Any], int]:
+        """Devuelve la configuración y los segundos que el cliente puede
+        reutilizarla."""
+        now = time.time()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > now:
+            self._entries.move_to_end(user_id)
+        else:
+            entry = (now + self.cache_seconds, self._build(user_id, now))
+            if self.max_size > 0:
+                self._entries[user_id] = entry
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return entry[1], max(int(entry[0] - now), 0)
+
+
+@lru_cache(maxsize=None)
+def static_ice_config(include_turn: bool) -> Dict[str, Any]:
+    servers = [{"urls": settings.STUN_URLS}]
+    if include_turn and settings.TURN_URLS:
+        servers.append(
+            {
+                "urls": settings.TURN_URLS,
+                "username": settings.TURN_USERNAME,
+                "credential": settings.TURN_CREDENTIAL,
+            }
+        )
+    return {"iceServers": servers}
+
+
+ice_config_cache = IceConfigCache(
+    settings.ICE_CACHE_SIZE,
+    settings.TURN_CREDENTIAL_TTL_SECONDS,
+    settings.TURN_CREDENTIAL_REFRESH_MARGIN_SECONDS,
+)
@@ -0,0 +1,110 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Union
+
+from .config import settings
+
+# Atributos propios de LogRecord; el resto viene de ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_ATTRS
+        )
+        return f"{line} {fields}" if fields else line
+
+
+def configure_logging():
+    """Configura el logger ``app`` (y los de Socket.IO/Engine.IO).
+
+    Con ``LOG_ASYNC`` los registros pasan por una ``QueueHandler`` y un hilo
+    aparte hace la escritura, así el event loop nunca bloquea en stdout.
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    if settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = TextFormatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(formatter)
+
+    if settings.LOG_ASYNC:
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        handler: logging.Handler = logging.handlers.QueueHandler(records)
+        listener = logging.handlers.QueueListener(records, stream)
+        listener.start()
+        # Al salir se vacía la cola antes de terminar el proceso
+        atexit.register(listener.stop)
+    else:
+        handler = stream
+
+    for name in ("app", "socketio", "engineio"):
+        logger = logging.getLogger(name)
+        logger.handlers[:] = [handler]
+        logger.propagate = False
+    logging.getLogger("app").setLevel(settings.LOG_LEVEL.upper())
+    logging.getLogger("socketio").setLevel(logging.INFO)
+    logging.getLogger("engineio").setLevel(logging.INFO)
+
+
+def sio_logger(enabled: bool) -> Union[logging.Logger, bool]:
+    # python-socketio acepta un Logger propio o False para silenciarlo
+    return logging.getLogger("socketio") if enabled else False
+
+
+def engineio_logger(enabled: bool) -> Union[logging.Logger, bool]:
+    return logging.getLogger("engineio") if enabled else False
+
+
+class EventSampler:
+    """Decide qué eventos de alto volumen se registran.
+
+    ``rates`` asigna a cada tipo una probabilidad entre 0 y 1; los tipos
+    que no aparecen usan ``default``.
+    """
+
+    def __init__(self, rates: Dict[str, float], default: float = 1.0):
+        self.rates = rates
+        self.default = default
+
+    def __call__(self, kind: Any) -> bool:
+        # ``kind`` llega del cliente (``relay.type``): una lista o un dict no
+        # es hashable, y cualquier valor que no sea str usa ``default``
+        rate = self.rates.get(kind, self.default) if isinstance(kind, str) else self.default
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+relay_sampler = EventSampler(
+    settings.LOG_RELAY_SAMPLE_RATES, default=settings.LOG_RELAY_SAMPLE_DEFAULT
+)
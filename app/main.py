@@ -1,27 +1,69 @@
+import asyncio
 import json
+import logging
+import os
 import uuid
-from datetime import datetime
-from typing import List
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 
+import orjson
 import socketio
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from . import models, schemas
 from .config import settings
-from .db import init_db
-from .deps import get_db
+from .db import AsyncSessionLocal, async_engine, init_db, pool_stats
+from .deps import get_async_db
+from .call_events import call_event, event_values, record_events
+from .call_metrics import call_metrics_counters, metrics_state
+from .dispatch import assign_call, dispatch_next, doctor_busy, lock_doctor
+from .fast_json import ORJSON_OPTIONS, FastJSONResponse, call_row, call_values, call_values_list
+from .ice import ICE_STATIC_MAX_AGE, ice_config_cache, static_ice_config
+from .logs import configure_logging, engineio_logger, relay_sampler, sio_logger
+from .matching import matching_engine
+from .metrics_rollup import GROUP_BY_OPTIONS, TIME_GROUPS, materialize, query_timeseries
+from .pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from .participants import ParticipantWriter
+from .rate_limit import ALLOW, DISCONNECT, RelayLimiter
+from .reaper import expire_stale_calls
+from .realtime import (
+    INTERNAL_ROOM,
+    RoomFull,
+    create_room_store,
+    create_sio,
+    on_remote_emit,
+)
 from .schemas import Health
+from .signal_batch import CandidateBatcher
+from .signal_resume import SignalResume
+from .socket_auth import ACTIVE_STATUS_VALUES, SocketUsers, allowed_call_rooms, socket_token
 from .security import (
+    HashingBusy,
     create_access_token,
+    create_resume_token,
+    decode_access_token,
+    decode_resume_token,
     get_current_active_user,
-    get_password_hash,
+    get_current_user,
+    get_optional_principal,
+    load_principal,
+    optional_oauth2_scheme,
+    password_hasher,
+    principal_cache,
+    require_internal_token,
     require_role,
-    verify_password,
 )
+from .waiting_queue import QUEUE_ROOM, waiting_queue
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 # -------------------------------------------------------------------
 # Normalizar ALLOWED_ORIGINS a una lista de strings
@@ -43,16 +85,16 @@ else:
     origins = ["*"]
 
 cors_origins = ["*"] if "*" in origins else origins
-print("CORS origins usados:", cors_origins)
+logger.info("cors origins", extra={"origins": cors_origins})
 
 # -------------------------------------------------------------------
 # Socket.IO (ASGI)
 # -------------------------------------------------------------------
-sio = socketio.AsyncServer(
-    async_mode="asgi",
+# Con SIO_MESSAGE_QUEUE (redis://...) los eventos se comparten entre workers
+sio = create_sio(
     cors_allowed_origins="*",
-    engineio_logger=True,
-    logger=True
+    engineio_logger=engineio_logger(settings.SIO_ENGINEIO_LOGGER),
+    logger=sio_logger(settings.SIO_LOGGER),
 )
 
 # -------------------------------------------------------------------
@@ -64,6 +106,20 @@ api = FastAPI(title="Video API")
 @api.on_event("startup")
 async def on_startup():
     init_db()
+    sio.start_background_task(_resync_waiting_queue_forever)
+    sio.start_background_task(_reconcile_metrics_forever)
+    sio.start_background_task(_materialize_metrics_forever)
+    sio.start_background_task(participant_writer.run)
+    if settings.CALL_REAPER_INTERVAL_SECONDS > 0:
+        sio.start_background_task(_reap_stale_calls_forever)
+    if settings.DISPATCH_MODE == "engine":
+        sio.start_background_task(_match_calls_forever)
+
+
+@api.on_event("shutdown")
+async def on_shutdown():
+    # Escribe los altas/bajas de participants que sigan en el buffer
+    await participant_writer.close()
 
 api.add_middleware(
     CORSMiddleware,
@@ -71,16 +127,231 @@ api.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 
-def _get_call_or_404(db: Session, call_id: int) -> models.Call:
-    call = db.get(models.Call, call_id)
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Fechas sin zona en query params se interpretan como UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _calls_page(calls: List[models.Call], limit: int) -> FastJSONResponse:
+    # Se pide limit + 1 filas: si sobra una, hay página siguiente
+    headers = None
+    if len(calls) > limit:
+        del calls[limit:]
+        last = calls[-1]
+        headers = {NEXT_CURSOR_HEADER: encode_cursor(last.requested_at, last.id)}
+    return FastJSONResponse(call_values_list(calls), headers=headers)
+
+
+def _violated_constraint(exc: IntegrityError) -> Optional[str]:
+    diag = getattr(exc.orig, "diag", None)
+    return getattr(diag, "constraint_name", None)
+
+
+async def _get_call_or_404(db: AsyncSession, call_id: int) -> models.Call:
+    call = await db.get(models.Call, call_id)
     if not call:
         raise HTTPException(status_code=404, detail="Call not found")
     return call
 
 
+def _call_room(call_id: int) -> str:
+    return f"call:{call_id}"
+
+
+def _waiting_state(call: models.Call):
+    # Estado de métricas de una llamada justo antes de salir de la cola
+    return [models.CallStatus.waiting.value, *metrics_state(call)[1:]]
+
+
+async def _publish_call(call: models.Call, before=None):
+    # Reemplaza el polling de GET /calls/{id}: los participantes suscritos
+    # reciben el nuevo estado en cuanto cambia. ``before`` es el
+    # metrics_state previo a la transición (None para llamadas nuevas).
+    row = call_row(call)
+    await sio.emit("call-updated", row, room=_call_room(call.id))
+    await signaling.update_socket_rooms(row)
+    if settings.DISPATCH_MODE == "engine":
+        matching_engine.track(row)
+    delta = waiting_queue.track(call)
+    if delta is not None:
+        await sio.emit("queue-delta", delta, room=QUEUE_ROOM)
+    delta = call_metrics_counters.transition(before, call)
+    if delta is not None:
+        await sio.emit("metrics-delta", delta, room=INTERNAL_ROOM)
+
+
+async def _invalidate_principal(user_id: str):
+    principal_cache.invalidate(user_id)
+    await sio.emit("principal-invalidated", {"user_id": user_id}, room=INTERNAL_ROOM)
+
+
+@on_remote_emit("principal-invalidated")
+def _apply_remote_principal_invalidation(data):
+    principal_cache.invalidate(data["user_id"])
+
+
+async def _publish_availability(user: models.User):
+    if settings.DISPATCH_MODE != "engine":
+        return
+    matching_engine.set_available(user.id, user.is_active and user.is_available)
+    await sio.emit(
+        "doctor-availability",
+        {"user_id": user.id, "is_available": user.is_active and user.is_available},
+        room=INTERNAL_ROOM,
+    )
+
+
+@on_remote_emit("doctor-availability")
+def _apply_remote_availability(data):
+    if settings.DISPATCH_MODE == "engine":
+        matching_engine.set_available(data["user_id"], data["is_available"])
+
+
+@on_remote_emit("queue-delta")
+def _apply_remote_queue_delta(delta):
+    waiting_queue.apply(delta)
+
+
+@on_remote_emit("metrics-delta")
+def _apply_remote_metrics_delta(delta):
+    call_metrics_counters.apply(delta)
+
+
+async def _resync_waiting_queue_forever():
+    # Corrige la deriva del índice (cambios hechos fuera de la API)
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                deltas = await waiting_queue.resync(db)
+                if settings.DISPATCH_MODE == "engine":
+                    await matching_engine.resync(db)
+            for delta in deltas:
+                await sio.emit("queue-delta", delta, room=QUEUE_ROOM, ignore_queue=True)
+        except Exception:
+            logger.exception("waiting queue resync failed")
+        await asyncio.sleep(settings.WAITING_QUEUE_RESYNC_SECONDS)
+
+
+async def _reconcile_metrics_forever():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await call_metrics_counters.reconcile(db)
+        except Exception:
+            logger.exception("call metrics reconcile failed")
+        await asyncio.sleep(settings.METRICS_RECONCILE_SECONDS)
+
+
+async def _materialize_metrics_forever():
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await materialize(db, settings.METRICS_ROLLUP_LAG_SECONDS)
+        except Exception:
+            logger.exception("call metrics rollup failed")
+        await asyncio.sleep(settings.METRICS_ROLLUP_INTERVAL_SECONDS)
+
+
+async def reap_stale_calls() -> int:
+    """Vence las llamadas abandonadas por lote hasta vaciar los candidatos y
+    avisa a los sockets suscritos como cualquier otra transición."""
+    ttls = {
+        models.CallStatus.waiting: settings.CALL_WAITING_TTL_SECONDS,
+        models.CallStatus.assigned: settings.CALL_ASSIGNED_TTL_SECONDS,
+        models.CallStatus.ringing: settings.CALL_ASSIGNED_TTL_SECONDS,
+        models.CallStatus.in_progress: settings.CALL_IN_PROGRESS_TTL_SECONDS,
+        models.CallStatus.reconnecting: settings.CALL_RECONNECTING_TTL_SECONDS,
+    }
+    total = 0
+    async with AsyncSessionLocal() as db:
+        while True:
+            expired = await expire_stale_calls(db, ttls, _utcnow(), settings.CALL_REAPER_BATCH)
+            await db.commit()
+            for call, before in expired:
+                await _publish_call(call, before)
+            total += len(expired)
+            if len(expired) < settings.CALL_REAPER_BATCH:
+                break
+        if total:
+            # Las asignaciones vencidas liberan médicos
+            await _auto_dispatch(db)
+    return total
+
+
+async def _reap_stale_calls_forever():
+    while True:
+        try:
+            expired = await reap_stale_calls()
+            if expired:
+                logger.info("stale calls expired", extra={"count": expired})
+        except Exception:
+            logger.exception("stale call reaper failed")
+        await asyncio.sleep(settings.CALL_REAPER_INTERVAL_SECONDS)
+
+
+async def _match_calls():
+    # Persiste cada par del motor en su propia transacción; si la base lo
+    # rechaza (otro worker se adelantó, el médico dejó de estar libre) se
+    # deshace la reserva y se releen ambos lados
+    while (match := matching_engine.pop()) is not None:
+        call_id, doctor_id = match
+        async with AsyncSessionLocal() as db:
+            call = await assign_call(db, call_id, doctor_id)
+            if call is None:
+                await db.rollback()
+                matching_engine.release(call_id, doctor_id)
+                await matching_engine.refresh(db, call_id, doctor_id)
+                continue
+            await record_events(
+                db, [call_event(call, "claim", doctor_id=doctor_id, dispatch="engine")]
+            )
+            await db.commit()
+        await _publish_call(call, _waiting_state(call))
+
+
+async def _match_calls_forever():
+    # Asigna en cuanto hay llamada y médico libres, también cuando el cambio
+    # llega de otro worker
+    while True:
+        try:
+            if not matching_engine.loaded:
+                async with AsyncSessionLocal() as db:
+                    await matching_engine.resync(db)
+            await _match_calls()
+            await matching_engine.wait()
+        except Exception:
+            logger.exception("call matching failed")
+            await asyncio.sleep(1)
+
+
+async def _auto_dispatch(db: AsyncSession):
+    # En modo "auto" la cola se reparte sola a los médicos disponibles
+    if settings.DISPATCH_MODE == "engine":
+        if matching_engine.loaded:
+            await _match_calls()
+        return
+    if settings.DISPATCH_MODE != "auto":
+        return
+    dispatched = []
+    while (call := await dispatch_next(db)) is not None:
+        dispatched.append(call)
+    await record_events(
+        db,
+        [call_event(call, "claim", doctor_id=call.doctor_id, dispatch="auto") for call in dispatched],
+    )
+    await db.commit()
+    for call in dispatched:
+        await _publish_call(call, _waiting_state(call))
+
+
 @api.get("/health", response_model=Health)
 def health():
     return {"status": "ok"}
@@ -88,27 +359,46 @@ def health():
 
 @api.get("/config/ice")
 @api.get("/ice")
-def ice_config():
-    servers = [{"urls": settings.STUN_URLS}]
-    if settings.TURN_URLS:
-        servers.append(
-            {
-                "urls": settings.TURN_URLS,
-                "username": settings.TURN_USERNAME,
-                "credential": settings.TURN_CREDENTIAL,
-            }
-        )
-    return {"iceServers": servers}
+async def ice_config(
+    response: Response,
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Con TURN_SHARED_SECRET solo los usuarios autenticados reciben TURN, con
+    # credenciales propias que vencen. Sin sesión o con un token vencido o
+    # inválido, solo STUN: el token se valida únicamente para emitir TURN
+    response.headers["Vary"] = "Authorization"
+    user = None
+    if settings.TURN_SHARED_SECRET and settings.TURN_URLS:
+        user = await get_optional_principal(token, db)
+    if user is not None:
+        config, max_age = ice_config_cache.get(user.id)
+    else:
+        config = static_ice_config(include_turn=not settings.TURN_SHARED_SECRET)
+        max_age = ICE_STATIC_MAX_AGE
+    response.headers["Cache-Control"] = f"private, max-age={max_age}"
+    return config
 
 
 # -------------------------------------------------------------------
 # Auth & usuarios
 # -------------------------------------------------------------------
+@api.exception_handler(HashingBusy)
+async def hashing_busy_handler(request: Request, exc: HashingBusy):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Authentication service busy, retry later"},
+        headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER_SECONDS)},
+    )
+
+
 @api.post("/auth/register", response_model=schemas.UserRead)
-def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    user_exists = db.query(models.User).filter(
-        models.User.email == user_in.email.lower()
-    ).first()
+async def register_user(
+    user_in: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)
+):
+    user_exists = await db.scalar(
+        select(models.User.id).where(models.User.email == user_in.email.lower())
+    )
     if user_exists:
         raise HTTPException(status_code=400, detail="Email already registered")
 
@@ -116,37 +406,49 @@ def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
         email=user_in.email.lower(),
         full_name=user_in.full_name,
         role=models.UserRole(user_in.role.value),
-        password_hash=get_password_hash(user_in.password),
+        password_hash=await password_hasher.hash(user_in.password),
         is_available=user_in.role == schemas.Role.doctor,
     )
     db.add(model)
-    db.commit()
-    db.refresh(model)
+    await db.commit()
+    await db.refresh(model)
+    if model.role == models.UserRole.doctor:
+        await _publish_availability(model)
     return model
 
 
 @api.post("/auth/token", response_model=schemas.Token)
-def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+async def login(
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    user = (
-        db.query(models.User)
-        .filter(models.User.email == form_data.username.lower())
-        .first()
+    user = await db.scalar(
+        select(models.User).where(models.User.email == form_data.username.lower())
+    )
+    # Devuelve la conexión al pool mientras bcrypt trabaja
+    await db.commit()
+    verified, new_hash = (
+        await password_hasher.verify_and_update(form_data.password, user.password_hash)
+        if user
+        else (False, None)
     )
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # BCRYPT_ROUNDS cambió: se regenera el hash con el coste actual
+        user.password_hash = new_hash
+        await db.commit()
 
     access_token = create_access_token({"sub": user.id, "role": user.role.value})
     return {"access_token": access_token, "token_type": "bearer"}
 
 
 @api.get("/users/me", response_model=schemas.UserRead)
-async def read_users_me(current_user=Depends(get_current_active_user)):
+async def read_users_me(current_user=Depends(get_current_user)):
     return current_user
 
 
@@ -154,13 +456,18 @@ async def read_users_me(current_user=Depends(get_current_active_user)):
 async def update_availability(
     payload: schemas.AvailabilityUpdate,
     current_user=Depends(require_role(models.UserRole.doctor)),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    current_user.is_available = payload.is_available
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    user = await db.get(models.User, current_user.id)
+    user.is_available = payload.is_available
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    await _invalidate_principal(user.id)
+    await _publish_availability(user)
+    if user.is_available:
+        await _auto_dispatch(db)
+    return user
 
 
 # -------------------------------------------------------------------
@@ -170,30 +477,17 @@ async def update_availability(
 async def request_call(
     payload: schemas.CallRequestCreate,
     patient=Depends(require_role(models.UserRole.patient)),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    existing = (
-        db.query(models.Call)
-        .filter(
-            models.Call.patient_id == patient.id,
-            models.Call.status.in_(
-                [models.CallStatus.waiting, models.CallStatus.assigned, models.CallStatus.in_progress]
-            ),
-        )
-        .first()
-    )
-    if existing:
-        raise HTTPException(
-            status_code=400, detail="Patient already has an active call request"
-        )
-
     room_id = payload.room_id or f"room-{uuid.uuid4().hex[:10]}"
 
-    room = db.get(models.Room, room_id)
-    if not room:
-        room = models.Room(id=room_id)
-        db.add(room)
-        db.flush()
+    # Dos solicitudes con la misma sala nueva no chocan en rooms_pkey: la
+    # disputa la resuelve ix_calls_room_active al insertar la llamada
+    await db.execute(
+        pg_insert(models.Room)
+        .values(id=room_id)
+        .on_conflict_do_nothing(index_elements=[models.Room.id])
+    )
 
     call = models.Call(
         room_id=room_id,
@@ -202,41 +496,131 @@ async def request_call(
         meta=payload.metadata,
     )
     db.add(call)
-    db.commit()
-    db.refresh(call)
+    try:
+        # ix_calls_patient_active e ix_calls_room_active deciden en el
+        # INSERT, sin ventana entre comprobar y crear
+        await db.flush()
+    except IntegrityError as exc:
+        await db.rollback()
+        constraint = _violated_constraint(exc)
+        if constraint == "ix_calls_patient_active":
+            raise HTTPException(
+                status_code=400, detail="Patient already has an active call request"
+            )
+        if constraint == "ix_calls_room_active":
+            raise HTTPException(status_code=409, detail="Room already in use by another call")
+        raise
+    await record_events(db, [call_event(call, "request", patient.id)])
+    await db.commit()
+    await _publish_call(call)
+    await _auto_dispatch(db)
+    await db.refresh(call)
     return call
 
 
 @api.get("/calls/waiting", response_model=List[schemas.CallDetail])
 async def list_waiting_calls(
-    doctor=Depends(require_role(models.UserRole.doctor)), db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    doctor=Depends(require_role(models.UserRole.doctor)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     _ = doctor  # no-op, solo valida el rol
-    calls = (
-        db.query(models.Call)
-        .filter(models.Call.status == models.CallStatus.waiting)
-        .order_by(models.Call.requested_at.asc())
-        .all()
+    Call = models.Call
+    stmt = (
+        select(Call)
+        .where(Call.status == models.CallStatus.waiting)
+        .order_by(Call.requested_at.asc(), Call.id.asc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        stmt = stmt.where(tuple_(Call.requested_at, Call.id) > tuple_(*decode_cursor(cursor)))
+    return _calls_page(list(await db.scalars(stmt)), limit)
+
+
+@api.get("/calls/history", response_model=List[schemas.CallDetail])
+async def call_history(
+    statuses: Optional[List[models.CallStatus]] = Query(None, alias="status"),
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    current_user=Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Llamadas del usuario (como médico o paciente), de la más reciente a la
+    # más antigua; from/to filtran requested_at en [from, to)
+    Call = models.Call
+    owner = Call.doctor_id if current_user.role == models.UserRole.doctor else Call.patient_id
+    stmt = (
+        select(Call)
+        .where(owner == current_user.id)
+        .order_by(Call.requested_at.desc(), Call.id.desc())
+        .limit(limit + 1)
     )
-    return calls
+    if statuses:
+        stmt = stmt.where(Call.status.in_(statuses))
+    if start is not None:
+        stmt = stmt.where(Call.requested_at >= _as_utc(start))
+    if end is not None:
+        stmt = stmt.where(Call.requested_at < _as_utc(end))
+    if cursor:
+        stmt = stmt.where(tuple_(Call.requested_at, Call.id) < tuple_(*decode_cursor(cursor)))
+    return _calls_page(list(await db.scalars(stmt)), limit)
 
 
 @api.post("/calls/{call_id}/claim", response_model=schemas.CallDetail)
 async def claim_call(
     call_id: int,
     doctor=Depends(require_role(models.UserRole.doctor)),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    call = _get_call_or_404(db, call_id)
-    if call.status != models.CallStatus.waiting:
+    # Un solo UPDATE condicional: solo un médico puede ganar la llamada, y
+    # solo si no tiene otra activa
+    await lock_doctor(db, doctor.id)
+    call = await db.scalar(
+        update(models.Call)
+        .where(
+            models.Call.id == call_id,
+            models.Call.status == models.CallStatus.waiting,
+            ~doctor_busy(doctor.id),
+        )
+        .values(
+            doctor_id=doctor.id,
+            status=models.CallStatus.assigned,
+            assigned_at=_utcnow(),
+        )
+        .returning(models.Call)
+    )
+    if call is None:
+        call = await _get_call_or_404(db, call_id)
+        if call.status == models.CallStatus.waiting:
+            raise HTTPException(status_code=400, detail="Doctor already has an active call")
         raise HTTPException(status_code=400, detail="Call is not available")
+    await record_events(db, [call_event(call, "claim", doctor.id, doctor_id=doctor.id)])
+    await db.commit()
+    await _publish_call(call, _waiting_state(call))
+    return call
 
-    call.doctor_id = doctor.id
-    call.status = models.CallStatus.assigned
-    call.assigned_at = datetime.utcnow()
-    db.add(call)
-    db.commit()
-    db.refresh(call)
+
+@api.post("/calls/next", response_model=schemas.CallDetail)
+async def claim_next_call(
+    doctor=Depends(require_role(models.UserRole.doctor)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    if not doctor.is_available:
+        raise HTTPException(status_code=400, detail="Doctor is not available")
+    await lock_doctor(db, doctor.id)
+    if await db.scalar(select(doctor_busy(doctor.id))):
+        raise HTTPException(status_code=400, detail="Doctor already has an active call")
+    call = await dispatch_next(db, doctor)
+    if call is None:
+        raise HTTPException(status_code=404, detail="No waiting calls")
+    await record_events(
+        db, [call_event(call, "claim", doctor.id, doctor_id=doctor.id, dispatch="next")]
+    )
+    await db.commit()
+    await _publish_call(call, _waiting_state(call))
     return call
 
 
@@ -244,9 +628,9 @@ async def claim_call(
 async def start_call(
     call_id: int,
     current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    call = _get_call_or_404(db, call_id)
+    call = await _get_call_or_404(db, call_id)
     if call.status not in (
         models.CallStatus.assigned,
         models.CallStatus.waiting,
@@ -257,12 +641,15 @@ async def start_call(
     if current_user.id not in (call.patient_id, call.doctor_id):
         raise HTTPException(status_code=403, detail="User not part of this call")
 
+    before = metrics_state(call)
     if call.started_at is None or call.status == models.CallStatus.waiting:
-        call.started_at = datetime.utcnow()
+        call.started_at = _utcnow()
     call.status = models.CallStatus.in_progress
     db.add(call)
-    db.commit()
-    db.refresh(call)
+    await record_events(db, [call_event(call, "start", current_user.id)])
+    await db.commit()
+    await db.refresh(call)
+    await _publish_call(call, before)
     return call
 
 
@@ -271,25 +658,39 @@ async def resume_call(
     call_id: int,
     payload: schemas.CallResumePayload,
     current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    call = _get_call_or_404(db, call_id)
-    if call.status == models.CallStatus.ended:
+    # FOR UPDATE: el reaper salta la fila (SKIP LOCKED) en vez de
+    # cancelarla entre esta lectura y el commit
+    call = await db.get(models.Call, call_id, with_for_update=True)
+    if not call:
+        raise HTTPException(status_code=404, detail="Call not found")
+    # Una llamada vencida por el reaper queda "cancelled" con ended_at:
+    # reanudarla la dejaría activa sin que end_call pueda cerrarla
+    if call.status in (models.CallStatus.ended, models.CallStatus.cancelled) or call.ended_at is not None:
         raise HTTPException(status_code=400, detail="Call already finished")
     if current_user.id not in (call.patient_id, call.doctor_id):
         raise HTTPException(status_code=403, detail="User not part of this call")
 
+    before = metrics_state(call)
     call.status = models.CallStatus.in_progress
     call.total_reconnects += 1
-    call.last_resume_at = datetime.utcnow()
-    if payload.note:
-        meta = call.meta or {}
-        resumes = meta.setdefault("resumes", [])
-        resumes.append({"at": datetime.utcnow().isoformat(), "note": payload.note})
-        call.meta = meta
+    call.last_resume_at = _utcnow()
     db.add(call)
-    db.commit()
-    db.refresh(call)
+    # Las notas de reconexión van a call_events, no a calls.meta
+    event = call_event(call, "resume", current_user.id)
+    if payload.note:
+        event["payload"] = {"note": payload.note}
+    await record_events(db, [event])
+    try:
+        await db.commit()
+    except IntegrityError as exc:
+        await db.rollback()
+        if _violated_constraint(exc) == "ix_calls_patient_active":
+            raise HTTPException(status_code=400, detail="Patient already has an active call request")
+        raise
+    await db.refresh(call)
+    await _publish_call(call, before)
     return call
 
 
@@ -297,9 +698,9 @@ async def resume_call(
 async def end_call(
     call_id: int,
     current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    call = _get_call_or_404(db, call_id)
+    call = await _get_call_or_404(db, call_id)
     if current_user.id not in (call.patient_id, call.doctor_id):
         raise HTTPException(status_code=403, detail="User not part of this call")
 
@@ -309,15 +710,22 @@ async def end_call(
     if call.ended_at:
         return call
 
+    before = metrics_state(call)
     call.status = models.CallStatus.ended
-    call.ended_at = datetime.utcnow()
+    call.ended_at = _utcnow()
     if call.started_at and call.ended_at:
         call.duration_seconds = int(
             (call.ended_at - call.started_at).total_seconds()
         )
     db.add(call)
-    db.commit()
-    db.refresh(call)
+    await record_events(
+        db,
+        [call_event(call, "end", current_user.id, duration_seconds=call.duration_seconds)],
+    )
+    await db.commit()
+    await _publish_call(call, before)
+    await _auto_dispatch(db)
+    await db.refresh(call)
     return call
 
 
@@ -325,12 +733,39 @@ async def end_call(
 async def get_call(
     call_id: int,
     current_user=Depends(get_current_active_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
-    call = _get_call_or_404(db, call_id)
+    call = await _get_call_or_404(db, call_id)
     if current_user.id not in (call.patient_id, call.doctor_id):
         raise HTTPException(status_code=403, detail="User not part of this call")
-    return call
+    return FastJSONResponse(call_values(call))
+
+
+@api.get("/calls/{call_id}/events")
+async def call_timeline(
+    call_id: int,
+    current_user=Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """Línea de tiempo de la llamada como NDJSON (un evento por línea, en
+    orden), leída con un cursor del servidor sin cargarla entera."""
+    call = await _get_call_or_404(db, call_id)
+    if current_user.id not in (call.patient_id, call.doctor_id):
+        raise HTTPException(status_code=403, detail="User not part of this call")
+
+    async def lines():
+        # Sesión propia: la de la dependencia se cierra antes de enviar el cuerpo
+        async with AsyncSessionLocal() as stream_db:
+            events = await stream_db.stream_scalars(
+                select(models.CallEvent)
+                .where(models.CallEvent.call_id == call_id)
+                .order_by(models.CallEvent.id)
+                .execution_options(yield_per=500)
+            )
+            async for event in events:
+                yield orjson.dumps(event_values(event), option=ORJSON_OPTIONS) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 # -------------------------------------------------------------------
@@ -338,99 +773,484 @@ async def get_call(
 # -------------------------------------------------------------------
 @api.get("/metrics/calls", response_model=schemas.MetricsResponse)
 async def call_metrics(
-    doctor=Depends(require_role(models.UserRole.doctor)), db: Session = Depends(get_db)
+    doctor=Depends(require_role(models.UserRole.doctor)),
+    db: AsyncSession = Depends(get_async_db),
 ):
     _ = doctor
-    total_calls = db.query(func.count(models.Call.id)).scalar() or 0
-    waiting = (
-        db.query(func.count(models.Call.id))
-        .filter(models.Call.status == models.CallStatus.waiting)
-        .scalar()
-        or 0
-    )
-    in_progress = (
-        db.query(func.count(models.Call.id))
-        .filter(models.Call.status == models.CallStatus.in_progress)
-        .scalar()
-        or 0
-    )
-    ended = (
-        db.query(func.count(models.Call.id))
-        .filter(models.Call.status == models.CallStatus.ended)
-        .scalar()
-        or 0
-    )
-    avg_duration = (
-        db.query(func.avg(models.Call.duration_seconds))
-        .filter(models.Call.duration_seconds > 0)
-        .scalar()
-        or 0
-    )
-    avg_reconnects = (
-        db.query(func.avg(models.Call.total_reconnects))
-        .filter(models.Call.total_reconnects > 0)
-        .scalar()
-        or 0
-    )
-    return schemas.MetricsResponse(
-        total_calls=total_calls,
-        waiting=waiting,
-        in_progress=in_progress,
-        ended=ended,
-        avg_duration_seconds=float(avg_duration or 0),
-        avg_reconnects=float(avg_reconnects or 0),
-    )
+    # O(1): contadores incrementales; solo se consulta la base si aún no
+    # se cargaron (una consulta agrupada)
+    if not call_metrics_counters.loaded:
+        await call_metrics_counters.reconcile(db)
+    return call_metrics_counters.response()
+
+
+@api.get("/metrics/calls/timeseries", response_model=List[schemas.TimeseriesPoint])
+async def call_metrics_timeseries(
+    start: datetime = Query(..., alias="from"),
+    end: datetime = Query(..., alias="to"),
+    group_by: str = "day",
+    doctor_id: Optional[str] = None,
+    doctor=Depends(require_role(models.UserRole.doctor)),
+    db: AsyncSession = Depends(get_async_db),
+):
+    _ = doctor
+    # Solo lee el rollup horario (call_metrics_hourly), nunca la tabla calls
+    keys = [key.strip() for key in group_by.split(",") if key.strip()]
+    if any(key not in GROUP_BY_OPTIONS for key in keys) or len(set(keys)) != len(keys):
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be a comma separated subset of {', '.join(GROUP_BY_OPTIONS)}",
+        )
+    if sum(key in TIME_GROUPS for key in keys) > 1:
+        raise HTTPException(status_code=400, detail="Only one time grouping allowed")
+    start, end = _as_utc(start), _as_utc(end)
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+
+    rows = await query_timeseries(db, start, end, keys, doctor_id=doctor_id)
+    return [
+        schemas.TimeseriesPoint(
+            period=row.get("period"),
+            doctor_id=row.get("doctor_id"),
+            status=row["status"].value if row.get("status") else None,
+            calls=row["calls"],
+            avg_duration_seconds=(
+                row["duration_sum"] / row["duration_count"] if row["duration_count"] else 0.0
+            ),
+            avg_reconnects=(
+                row["reconnects_sum"] / row["reconnects_count"]
+                if row["reconnects_count"]
+                else 0.0
+            ),
+        )
+        for row in rows
+    ]
+
+
+@api.get("/internal/dispatch", include_in_schema=False)
+def dispatch_stats(_=Depends(require_internal_token)):
+    return {"pid": os.getpid(), "mode": settings.DISPATCH_MODE, **matching_engine.counters()}
+
+
+@api.get("/internal/db/pool", include_in_schema=False)
+def db_pool_stats(_=Depends(require_internal_token)):
+    # Por proceso: con varios workers cada uno reporta su propio pool (pid)
+    return pool_stats.snapshot(async_engine.sync_engine.pool)
 
 
 # -------------------------------------------------------------------
 # Señalización WebRTC con Socket.IO
 # -------------------------------------------------------------------
-rooms = {}  # room_id -> set(sid)
+room_store = create_room_store(settings.SIO_MESSAGE_QUEUE)
+participant_writer = ParticipantWriter(
+    batch_size=settings.PARTICIPANT_FLUSH_BATCH,
+    flush_interval=settings.PARTICIPANT_FLUSH_INTERVAL_SECONDS,
+    max_pending=settings.PARTICIPANT_MAX_PENDING,
+)
+_NO_ROOMS = frozenset()
+
+
+class SignalingNamespace(socketio.AsyncNamespace):
+    """connect/join/leave/resume/relay/disconnect de la señalización.
+
+    El estado propio de cada worker (limitador de relay, reanudación,
+    sockets autenticados y candidatos agrupados) vive en la instancia; la
+    membresía de salas y el historial de participants se reciben y se
+    comparten. Así se puede montar en otro ``AsyncServer`` de ``create_sio``,
+    p. ej. un segundo worker en el mismo proceso
+    (benchmarks/cross_worker_signaling.py).
+    """
+
+    def __init__(self, room_store, participant_writer: ParticipantWriter, namespace: str = "/"):
+        super().__init__(namespace)
+        self.room_store = room_store
+        self.participant_writer = participant_writer
+        self.relay_limiter = RelayLimiter(
+            sid_rate=settings.SIGNAL_RELAY_RATE_PER_SID,
+            sid_burst=settings.SIGNAL_RELAY_BURST_PER_SID,
+            room_rate=settings.SIGNAL_RELAY_RATE_PER_ROOM,
+            room_burst=settings.SIGNAL_RELAY_BURST_PER_ROOM,
+            disconnect_after=settings.SIGNAL_RELAY_DISCONNECT_AFTER,
+        )
+        self.signal_resume = SignalResume(
+            grace=settings.SIO_RESUME_GRACE_SECONDS,
+            buffer_size=settings.SIO_RESUME_BUFFER,
+        )
+        self.socket_users = SocketUsers()
+        # Con SIGNAL_BATCH_WINDOW_MS > 0 los candidatos ICE se entregan
+        # agrupados en un solo "signal-batch" por par en lugar de un
+        # "signal" por candidato
+        self.candidate_batcher = (
+            CandidateBatcher(
+                window=settings.SIGNAL_BATCH_WINDOW_MS / 1000,
+                max_candidates=settings.SIGNAL_BATCH_MAX_CANDIDATES,
+                send=self._send_candidate_batch,
+            )
+            if settings.SIGNAL_BATCH_WINDOW_MS > 0
+            else None
+        )
 
+    def counters(self):
+        return {
+            "pid": os.getpid(),
+            "rooms": self.room_store.counters(),
+            "relay": self.relay_limiter.counters(),
+            "resume": self.signal_resume.counters(),
+            "authenticated_sockets": len(self.socket_users),
+        }
+
+    async def update_socket_rooms(self, row):
+        # Las salas permitidas siguen a las llamadas: se agrega al quedar
+        # activa (request, claim) y se quita al terminar
+        active = row["status"] in ACTIVE_STATUS_VALUES
+        for user_id in (row["patient_id"], row["doctor_id"]):
+            for sid in self.socket_users.sids(user_id):
+                try:
+                    async with self.session(sid) as session:
+                        rooms = session.setdefault("rooms", set())
+                        if active:
+                            rooms.add(row["room_id"])
+                        else:
+                            rooms.discard(row["room_id"])
+                except KeyError:
+                    pass  # se desconectó mientras tanto
+
+    async def on_connect(self, sid, environ, auth=None):
+        """El JWT se valida una sola vez aquí; la sesión guarda usuario, rol
+        y salas permitidas, y join/relay se autorizan sin tocar la base."""
+        token = socket_token(environ, auth)
+        if token is None:
+            # Anónimo (p. ej. la página de diagnóstico): puede conectar, pero
+            # con SIO_REQUIRE_AUTH no puede unirse a salas ni hacer relay
+            logger.info("sio connect", extra={"sid": sid})
+            return
+        payload = decode_access_token(token)
+        if payload is None:
+            raise socketio.exceptions.ConnectionRefusedError("unauthorized")
+        user_id = payload["sub"]
+        # Primero el índice y la sesión: una transición que llegue mientras
+        # se leen las salas ya actualiza esta sesión
+        self.socket_users.add(user_id, sid)
+        await self.save_session(sid, {"user_id": user_id, "rooms": set(), "joined": set()})
+        async with AsyncSessionLocal() as db:
+            user = await load_principal(db, user_id)
+            rooms = await allowed_call_rooms(db, user_id) if user and user.is_active else None
+        if rooms is None:
+            self.socket_users.discard(user_id, sid)
+            raise socketio.exceptions.ConnectionRefusedError("unauthorized")
+        async with self.session(sid) as session:
+            session["role"] = user.role.value
+            session["rooms"] |= rooms
+        logger.info("sio connect", extra={"sid": sid, "user_id": user_id})
+
+    async def _deliver(self, peer_id: str, event: str, data):
+        # Señal a un peer: al sid que tenga ahora o a su buffer si está en
+        # la ventana de gracia
+        if self.signal_resume.buffer(peer_id, event, data):
+            return
+        await self.emit(event, data, to=self.signal_resume.sid_of(peer_id))
+
+    async def _leave_rooms(self, peer_id: str, sid: Optional[str] = None):
+        self.signal_resume.forget(peer_id)
+        if self.candidate_batcher is not None:
+            self.candidate_batcher.discard(peer_id)
+        for room_id in await self.room_store.leave_all(peer_id):
+            await self.participant_writer.leave(room_id, peer_id)
+            await self.emit("peer-left", {"sid": peer_id}, room=room_id, skip_sid=sid)
+
+    async def _expire_peer(self, peer_id: str):
+        if not self.signal_resume.is_detached(peer_id):
+            return  # reanudó en la ventana
+        await self._leave_rooms(peer_id)
+        await self.emit("signal-peer-expired", {"peer_id": peer_id}, room=INTERNAL_ROOM)
+
+    async def _evict_detached(self, room_id: str, user_id: Optional[str], joining: str):
+        # Un join nuevo del mismo usuario (p. ej. tras recargar la página,
+        # sin resume_token) reemplaza a su peer en la ventana de gracia: si
+        # no, le ocuparía el lugar en la sala hasta que venza
+        members = [m for m in await self.room_store.members(room_id) if m != joining]
+        for peer_id in self.signal_resume.detached_of(user_id, members):
+            self.signal_resume.evict(peer_id)
+            await self._leave_rooms(peer_id)
+            await self.emit("signal-peer-expired", {"peer_id": peer_id}, room=INTERNAL_ROOM)
+            logger.info("signaling peer evicted", extra={"peer_id": peer_id, "room": room_id})
+
+    async def peer_resumed(self, peer_id: str, sid: str, local: bool) -> Tuple[int, int]:
+        # Reenvía lo que este worker guardó para el peer y cierra el socket
+        # anterior si seguía abierto aquí
+        buffered, dropped = self.signal_resume.attach(peer_id, sid)
+        superseded = self.signal_resume.claim(peer_id, sid if local else None)
+        if superseded is not None:
+            await self.disconnect(superseded)
+        for event, data in buffered:
+            await self.emit(event, data, to=sid)
+        return len(buffered), dropped
+
+    async def on_disconnect(self, sid):
+        logger.info("sio disconnect", extra={"sid": sid})
+        session = await self.get_session(sid)
+        if session.get("user_id"):
+            self.socket_users.discard(session["user_id"], sid)
+        self.relay_limiter.discard(sid)
+        peer_id = session.get("peer_id", sid)
+        if not self.signal_resume.release(peer_id, sid):
+            return  # reemplazado por un socket que reanudó
+        if self.signal_resume.enabled and await self.room_store.rooms_of(peer_id):
+            # Conserva el lugar en la sala: sin peer-left hasta que venza la
+            # ventana
+            user_id = session.get("user_id")
+            self.signal_resume.detach(peer_id, user_id, self._expire_peer)
+            await self.emit(
+                "signal-peer-detached", {"peer_id": peer_id, "user_id": user_id}, room=INTERNAL_ROOM
+            )
+            if self.candidate_batcher is not None:
+                await self.candidate_batcher.flush_involving(peer_id)
+            logger.info("signaling peer detached", extra={"sid": sid, "peer_id": peer_id})
+            return
+        await self._leave_rooms(peer_id, sid)
+
+    async def on_join(self, sid, data):
+        if not isinstance(data, dict):
+            return {"ok": False, "error": "bad-request"}
+        room_id = str(data.get("room"))
+        session = await self.get_session(sid)
+        user_id = session.get("user_id")
+        if settings.SIO_REQUIRE_AUTH:
+            if user_id is None:
+                return {"ok": False, "error": "unauthorized"}
+            if room_id not in session["rooms"]:
+                return {"ok": False, "error": "forbidden"}
+        peer_id = session.get("peer_id", sid)
+        if self.signal_resume.enabled:
+            await self._evict_detached(room_id, user_id, peer_id)
+        try:
+            peers = await self.room_store.join(room_id, peer_id)
+        except RoomFull:
+            return {"ok": False, "error": "room full"}
+        await self.enter_room(sid, room_id)
+        self.relay_limiter.join(sid, room_id)
+        if user_id is not None:
+            async with self.session(sid) as session:
+                session["joined"].add(room_id)
+        await self.participant_writer.join(room_id, peer_id, user_id)
+
+        await self.emit("peer-joined", {"sid": peer_id}, room=room_id, skip_sid=sid)
+        if not self.signal_resume.enabled:
+            return {"ok": True, "peers": peers}
+        self.signal_resume.claim(peer_id, sid)
+        return {
+            "ok": True,
+            "peers": peers,
+            "peer_id": peer_id,
+            "resume_token": create_resume_token(peer_id, user_id),
+        }
+
+    async def on_leave(self, sid, data):
+        if not isinstance(data, dict):
+            return {"ok": False, "error": "bad-request"}
+        room_id = str(data.get("room"))
+        session = await self.get_session(sid)
+        peer_id = session.get("peer_id", sid)
+        if await self.room_store.leave(room_id, peer_id):
+            await self.leave_room(sid, room_id)
+            self.relay_limiter.leave(sid, room_id)
+            async with self.session(sid) as session:
+                session.get("joined", set()).discard(room_id)
+            await self.participant_writer.leave(room_id, peer_id)
+            await self.emit("peer-left", {"sid": peer_id}, room=room_id, skip_sid=sid)
+        return {"ok": True}
+
+    async def on_resume(self, sid, data):
+        """Reanuda un peer desde un socket nuevo con el ``resume_token`` de
+        su ``join``: recupera sus salas sin peer-left/peer-joined y recibe
+        las señales que llegaron mientras estaba desconectado."""
+        if not isinstance(data, dict):
+            return {"ok": False, "error": "bad-request"}
+        claims = decode_resume_token(str(data.get("token") or ""))
+        if claims is None:
+            return {"ok": False, "error": "invalid token"}
+        session = await self.get_session(sid)
+        if claims.get("uid") != session.get("user_id"):
+            return {"ok": False, "error": "forbidden"}
+        peer_id = claims["peer"]
+        room_ids = await self.room_store.rooms_of(peer_id)
+        if settings.SIO_REQUIRE_AUTH:
+            room_ids = [room_id for room_id in room_ids if room_id in session.get("rooms", _NO_ROOMS)]
+        if not room_ids:
+            # Venció la ventana (o la llamada terminó): hay que volver a hacer join
+            return {"ok": False, "error": "resume expired"}
+
+        async with self.session(sid) as session:
+            session["peer_id"] = peer_id
+            session.setdefault("joined", set()).update(room_ids)
+        for room_id in room_ids:
+            await self.enter_room(sid, room_id)
+            self.relay_limiter.join(sid, room_id)
+        await self.emit(
+            "signal-peer-resumed", {"peer_id": peer_id, "sid": sid}, room=INTERNAL_ROOM
+        )
+        replayed, dropped = await self.peer_resumed(peer_id, sid, local=True)
+        logger.info("signaling peer resumed", extra={"sid": sid, "peer_id": peer_id})
+        return {
+            "ok": True,
+            "peer_id": peer_id,
+            "rooms": room_ids,
+            "replayed": replayed,
+            "dropped": dropped,
+        }
+
+    async def on_relay(self, sid, data):
+        # Antes que nada: un cliente que inunda no debe costar más que esto
+        verdict = self.relay_limiter.check(sid)
+        if verdict != ALLOW:
+            if verdict == DISCONNECT:
+                logger.warning("relay flood, disconnecting", extra={"sid": sid})
+                await self.disconnect(sid)
+            return {"ok": False, "error": "rate limited"}
+        if not isinstance(data, dict):
+            return {"ok": False, "error": "bad-request"}
+        session = await self.get_session(sid)
+        if settings.SIO_REQUIRE_AUTH:
+            # Solo desde una sala de llamada a la que se unió y que sigue activa
+            rooms = session.get("joined", _NO_ROOMS) & session.get("rooms", _NO_ROOMS)
+            if not rooms:
+                return {"ok": False, "error": "forbidden"}
+        peer_id = session.get("peer_id", sid)
+
+        to = data.get("to")
+        typ = data.get("type")
+        if logger.isEnabledFor(logging.INFO) and relay_sampler(typ):
+            logger.info("relay", extra={"type": typ, "sid": sid, "to": to})
+
+        if not to:
+            return
+        to = str(to)
+        # ... y solo hacia un peer de una de esas salas (índice peer -> salas
+        # del room store, compartido entre workers)
+        if settings.SIO_REQUIRE_AUTH and rooms.isdisjoint(await self.room_store.rooms_of(to)):
+            return {"ok": False, "error": "forbidden"}
+
+        payload = data.get("payload")
+        if self.candidate_batcher is not None:
+            if typ == "candidate":
+                await self.candidate_batcher.add(peer_id, to, payload)
+                return
+            # Los candidatos pendientes salen antes que la siguiente señal del par
+            await self.candidate_batcher.flush(peer_id, to)
+        await self._deliver(to, "signal", {"from": peer_id, "type": typ, "payload": payload})
+
+    async def _send_candidate_batch(self, from_peer: str, to: str, payloads):
+        await self._deliver(
+            to, "signal-batch", {"from": from_peer, "type": "candidate", "payloads": payloads}
+        )
 
-@sio.event
-async def connect(sid, environ):
-    print("connect:", sid)
 
+signaling = SignalingNamespace(room_store, participant_writer)
+sio.register_namespace(signaling)
 
-@sio.event
-async def disconnect(sid):
-    print("disconnect:", sid)
-    for room_id, members in list(rooms.items()):
-        if sid in members:
-            members.remove(sid)
-            await sio.emit("peer-left", {"sid": sid}, room=room_id, skip_sid=sid)
-            if not members:
-                rooms.pop(room_id, None)
-            break
 
+@api.get("/internal/signaling", include_in_schema=False)
+def signaling_stats(_=Depends(require_internal_token)):
+    return signaling.counters()
 
-@sio.event
-async def join(sid, data):
-    room_id = str(data.get("room"))
-    rooms.setdefault(room_id, set()).add(sid)
-    await sio.enter_room(sid, room_id)
 
-    peers = [m for m in rooms[room_id] if m != sid]
-    await sio.emit("peer-joined", {"sid": sid}, room=room_id, skip_sid=sid)
-    return {"ok": True, "peers": peers}
+@on_remote_emit("call-updated")
+def _apply_remote_call_update(row):
+    asyncio.ensure_future(signaling.update_socket_rooms(row))
+    if settings.DISPATCH_MODE == "engine":
+        matching_engine.track(row)
 
 
-@sio.event
-async def relay(sid, data):
-    to = data.get("to")
-    typ = data.get("type")
-    print("relay:", typ, "from", sid, "to", to)
+@on_remote_emit("signal-peer-detached")
+def _apply_remote_peer_detached(data):
+    signaling.signal_resume.detach(data["peer_id"], data.get("user_id"))
 
-    if not to:
-        return
 
-    payload = data.get("payload")
-    await sio.emit(
-        "signal",
-        {"from": sid, "type": typ, "payload": payload},
-        to=to,
-    )
+@on_remote_emit("signal-peer-resumed")
+def _apply_remote_peer_resumed(data):
+    asyncio.ensure_future(signaling.peer_resumed(data["peer_id"], data["sid"], local=False))
+
+
+@on_remote_emit("signal-peer-expired")
+def _apply_remote_peer_expired(data):
+    signaling.signal_resume.forget(data["peer_id"])
+
+
+async def _event_user_id(sid, data: dict) -> Optional[str]:
+    # Token en el evento (clientes anteriores) o el usuario de la sesión; los
+    # handlers ya validaron que data sea un dict
+    token = data.get("token")
+    if token:
+        payload = decode_access_token(str(token))
+        return payload["sub"] if payload else None
+    return (await sio.get_session(sid)).get("user_id")
+
+
+@sio.on("subscribe-call")
+async def subscribe_call(sid, data):
+    if not isinstance(data, dict):
+        return {"ok": False, "error": "bad-request"}
+    user_id = await _event_user_id(sid, data)
+    if user_id is None:
+        return {"ok": False, "error": "unauthorized"}
+    try:
+        call_id = int(data.get("call_id"))
+    except (TypeError, ValueError):
+        return {"ok": False, "error": "invalid call_id"}
+
+    async with AsyncSessionLocal() as db:
+        user = await load_principal(db, user_id)
+        call = await db.get(models.Call, call_id)
+    if user is None or not user.is_active:
+        return {"ok": False, "error": "unauthorized"}
+    if call is None or user.id not in (call.patient_id, call.doctor_id):
+        return {"ok": False, "error": "forbidden"}
+
+    await sio.enter_room(sid, _call_room(call_id))
+    return {"ok": True, "call": call_row(call)}
+
+
+@sio.on("subscribe-queue")
+async def subscribe_queue(sid, data=None):
+    if data is None:
+        data = {}
+    if not isinstance(data, dict):
+        return {"ok": False, "error": "bad-request"}
+    user_id = await _event_user_id(sid, data)
+    if user_id is None:
+        return {"ok": False, "error": "unauthorized"}
+    async with AsyncSessionLocal() as db:
+        user = await load_principal(db, user_id)
+        if user is None or not user.is_active:
+            return {"ok": False, "error": "unauthorized"}
+        if user.role != models.UserRole.doctor:
+            return {"ok": False, "error": "forbidden"}
+        if not waiting_queue.loaded:
+            await waiting_queue.resync(db)
+
+    # Primero entra a la sala y luego toma la foto: un delta que llegue en
+    # medio se aplica de forma idempotente en el cliente
+    await sio.enter_room(sid, QUEUE_ROOM)
+    return {"ok": True, "calls": waiting_queue.snapshot()}
+
+
+@sio.on("unsubscribe-queue")
+async def unsubscribe_queue(sid, data=None):
+    await sio.leave_room(sid, QUEUE_ROOM)
+    return {"ok": True}
+
+
+@sio.on("unsubscribe-call")
+async def unsubscribe_call(sid, data):
+    if not isinstance(data, dict):
+        return {"ok": False, "error": "bad-request"}
+    try:
+        call_id = int(data.get("call_id"))
+    except (TypeError, ValueError):
+        return {"ok": False, "error": "invalid call_id"}
+    await sio.leave_room(sid, _call_room(call_id))
+    return {"ok": True}
+
 
 
 # -------------------------------------------------------------------
@@ -451,12 +1271,9 @@ def bootstrap():
 
 
 if __name__ == "__main__":
-    import uvicorn
+    # El arranque (con la política de event loop de Windows) vive en
+    # app/__main__.py: python -m app
+    from .__main__ import main
 
-    uvicorn.run(
-        "app.main:app",
-        host="0.0.0.0",
-        port=8100,
-        proxy_headers=True,
-    )
+    main()
 
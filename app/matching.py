@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .dispatch import ACTIVE_DOCTOR_STATUSES
+
+BUSY_STATUS_VALUES = frozenset(status.value for status in ACTIVE_DOCTOR_STATUSES)
+MAX_PRIORITY = 100
+
+
+def call_priority(meta: Optional[Dict[str, Any]]) -> int:
+    # ``metadata.priority`` de POST /calls/request: entero, mayor = antes.
+    # Valores ausentes o inválidos cuentan como 0
+    value = (meta or {}).get("priority", 0)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return 0
+    try:
+        return max(0, min(int(value), MAX_PRIORITY))
+    except (ValueError, OverflowError):
+        return 0
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class MatchingEngine:
+    """Emparejamiento en memoria de llamadas en espera con médicos libres.
+
+    Las llamadas están en un heap por ``(-prioridad, requested_at, id)`` y
+    los médicos libres (disponibles y sin llamada asignada o en curso) en
+    otro por ``(libre desde, id)``, así que cada emparejamiento cuesta
+    O(log n). Los heaps usan borrado perezoso: una entrada vale solo si
+    coincide con el estado actual del diccionario correspondiente.
+
+    El estado se alimenta de las filas de ``call-updated`` (propias y de
+    otros workers), de los cambios de disponibilidad y de ``resync``. La
+    base decide: ``pop`` solo propone un par y quien lo persiste llama a
+    ``release`` + ``refresh`` si la asignación no prosperó.
+    """
+
+    def __init__(self):
+        self._calls: Dict[int, Tuple[int, float, int]] = {}
+        self._call_heap: List[Tuple[int, float, int]] = []
+        self._available: Set[str] = set()
+        self._busy: Dict[str, Set[int]] = {}
+        self._free: Dict[str, Tuple[float, str]] = {}
+        self._doctor_heap: List[Tuple[float, str]] = []
+        self._wakeup = asyncio.Event()
+        self.loaded = False
+        self.matches = 0
+        self.conflicts = 0
+
+    # -- llamadas --------------------------------------------------------
+    def _push_call(self, call_id: int, priority: int, requested_at: float):
+        key = (-priority, requested_at, call_id)
+        if self._calls.get(call_id) == key:
+            return
+        self._calls[call_id] = key
+        heapq.heappush(self._call_heap, key)
+        self._notify()
+
+    def _drop_call(self, call_id: int):
+        # La entrada del heap queda y se descarta al llegar al tope
+        self._calls.pop(call_id, None)
+
+    def _peek_call(self) -> Optional[Tuple[int, float, int]]:
+        heap = self._call_heap
+        while heap and self._calls.get(heap[0][2]) != heap[0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    # -- médicos ---------------------------------------------------------
+    def _update_doctor(self, doctor_id: str, since: float):
+        eligible = doctor_id in self._available and not self._busy.get(doctor_id)
+        if not eligible:
+            self._free.pop(doctor_id, None)
+        elif doctor_id not in self._free:
+            entry = (since, doctor_id)
+            self._free[doctor_id] = entry
+            heapq.heappush(self._doctor_heap, entry)
+            self._notify()
+
+    def _peek_doctor(self) -> Optional[Tuple[float, str]]:
+        heap = self._doctor_heap
+        while heap and self._free.get(heap[0][1]) != heap[0]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def set_available(self, doctor_id: str, available: bool, now: Optional[float] = None):
+        if available:
+            self._available.add(doctor_id)
+        else:
+            self._available.discard(doctor_id)
+        self._update_doctor(doctor_id, _now() if now is None else now)
+
+    def _set_busy(self, doctor_id: str, call_id: int, busy: bool, now: float):
+        calls = self._busy.setdefault(doctor_id, set())
+        if busy:
+            calls.add(call_id)
+        else:
+            calls.discard(call_id)
+        if not calls:
+            del self._busy[doctor_id]
+        self._update_doctor(doctor_id, now)
+
+    # -- eventos ---------------------------------------------------------
+    def track(self, row: Dict[str, Any], now: Optional[float] = None):
+        """Aplica una fila de ``call_row`` (idempotente)."""
+        now = _now() if now is None else now
+        call_id = row["id"]
+        if row["status"] == models.CallStatus.waiting.value:
+            self._push_call(call_id, call_priority(row.get("meta")), _timestamp(row["requested_at"]))
+        else:
+            self._drop_call(call_id)
+        doctor_id = row.get("doctor_id")
+        if doctor_id:
+            self._set_busy(doctor_id, call_id, row["status"] in BUSY_STATUS_VALUES, now)
+
+    def pop(self) -> Optional[Tuple[int, str]]:
+        """Saca el par (llamada, médico) a asignar, o ``None`` si falta un
+        lado. El médico queda ocupado con esa llamada hasta que la fila
+        asignada llegue por ``track`` o se llame a ``release``."""
+        call = self._peek_call()
+        doctor = self._peek_doctor()
+        if call is None or doctor is None:
+            return None
+        call_id, doctor_id = call[2], doctor[1]
+        self._drop_call(call_id)
+        self._set_busy(doctor_id, call_id, True, doctor[0])
+        self.matches += 1
+        return call_id, doctor_id
+
+    def release(self, call_id: int, doctor_id: str):
+        # El par no se pudo persistir: se deshace la reserva del médico
+        self.conflicts += 1
+        self._set_busy(doctor_id, call_id, False, _now())
+
+    async def wait(self):
+        await self._wakeup.wait()
+        self._wakeup.clear()
+
+    def _notify(self):
+        if self._calls and self._free:
+            self._wakeup.set()
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "waiting": len(self._calls),
+            "free_doctors": len(self._free),
+            "busy_doctors": len(self._busy),
+            "matches": self.matches,
+            "conflicts": self.conflicts,
+        }
+
+    # -- base de datos ---------------------------------------------------
+    async def refresh(self, db: AsyncSession, call_id: int, doctor_id: str):
+        # Relee la llamada y el médico de un par que la base rechazó
+        call = await db.get(models.Call, call_id, populate_existing=True)
+        if call is not None:
+            self.track(_engine_row(call))
+        await self._load_doctors(db, models.User.id == doctor_id)
+
+    async def _load_doctors(self, db: AsyncSession, *where) -> Set[str]:
+        last_assigned = (
+            select(func.max(models.Call.assigned_at))
+            .where(models.Call.doctor_id == models.User.id)
+            .correlate(models.User)
+            .scalar_subquery()
+        )
+        doctors = await db.execute(
+            select(models.User.id, models.User.is_active, models.User.is_available, last_assigned)
+            .where(models.User.role == models.UserRole.doctor, *where)
+        )
+        busy = await db.execute(
+            select(models.Call.doctor_id, models.Call.id).where(
+                models.Call.status.in_(ACTIVE_DOCTOR_STATUSES),
+                models.Call.doctor_id.in_(
+                    select(models.User.id).where(models.User.role == models.UserRole.doctor, *where)
+                ),
+            )
+        )
+        busy_calls: Dict[str, Set[int]] = {}
+        for doctor_id, call_id in busy:
+            busy_calls.setdefault(doctor_id, set()).add(call_id)
+        seen = set()
+        for doctor_id, is_active, is_available, assigned_at in doctors:
+            seen.add(doctor_id)
+            if busy_calls.get(doctor_id):
+                self._busy[doctor_id] = busy_calls[doctor_id]
+            else:
+                self._busy.pop(doctor_id, None)
+            since = _timestamp(assigned_at) if assigned_at else 0.0
+            self.set_available(doctor_id, bool(is_active and is_available), since)
+        return seen
+
+    async def resync(self, db: AsyncSession):
+        """Recarga llamadas en espera y médicos desde la base."""
+        calls = await db.execute(
+            select(models.Call.id, models.Call.meta, models.Call.requested_at).where(
+                models.Call.status == models.CallStatus.waiting
+            )
+        )
+        fresh = {}
+        for call_id, meta, requested_at in calls:
+            fresh[call_id] = (-call_priority(meta), _timestamp(requested_at), call_id)
+        for call_id in set(self._calls) - set(fresh):
+            self._drop_call(call_id)
+        for key in fresh.values():
+            self._push_call(key[2], -key[0], key[1])
+        seen = await self._load_doctors(db)
+        for doctor_id in set(self._available) - seen:
+            self.set_available(doctor_id, False)
+        self.loaded = True
+
+
+def _now() -> float:
+    return datetime.now(timezone.utc).timestamp()
+
+
+def _engine_row(call: models.Call) -> Dict[str, Any]:
+    return {
+        "id": call.id,
+        "status": call.status.value,
+        "doctor_id": call.doctor_id,
+        "meta": call.meta,
+        "requested_at": call.requested_at,
+    }
+
+
+matching_engine = MatchingEngine()
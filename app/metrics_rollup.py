@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+WATERMARK_NAME = "call_metrics_hourly"
+TERMINAL_STATUSES = (models.CallStatus.ended, models.CallStatus.cancelled)
+# Clave de pg_try_advisory_xact_lock: un solo worker materializa a la vez
+ROLLUP_LOCK_KEY = 7_201_001
+
+TIME_GROUPS = ("hour", "day", "week")
+GROUP_BY_OPTIONS = (*TIME_GROUPS, "doctor", "status")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _utc_trunc(unit: str, column):
+    # date_trunc en UTC, independiente del TimeZone de la sesión
+    return func.timezone("UTC", func.date_trunc(unit, func.timezone("UTC", column)))
+
+
+async def materialize(db: AsyncSession, lag_seconds: int) -> bool:
+    """Suma al rollup las llamadas terminadas desde la última marca de agua.
+
+    Solo procesa ``ended_at`` en ``(marca, now - lag]``: el retraso deja
+    margen a transacciones que fijaron ``ended_at`` pero aún no hicieron
+    commit. Devuelve ``False`` si otro worker tiene el lock.
+    """
+    locked = await db.scalar(
+        select(func.pg_try_advisory_xact_lock(ROLLUP_LOCK_KEY))
+    )
+    if not locked:
+        await db.rollback()
+        return False
+
+    watermark = await db.get(models.MetricsWatermark, WATERMARK_NAME, with_for_update=True)
+    low = watermark.value if watermark else EPOCH
+    high = datetime.now(timezone.utc) - timedelta(seconds=lag_seconds)
+    if high <= low:
+        await db.rollback()
+        return True
+
+    Call = models.Call
+    source = (
+        select(
+            _utc_trunc("hour", Call.ended_at).label("bucket"),
+            func.coalesce(Call.doctor_id, "").label("doctor_id"),
+            Call.status,
+            func.count(Call.id),
+            func.coalesce(func.sum(Call.duration_seconds).filter(Call.duration_seconds > 0), 0),
+            func.count(Call.id).filter(Call.duration_seconds > 0),
+            func.coalesce(func.sum(Call.total_reconnects).filter(Call.total_reconnects > 0), 0),
+            func.count(Call.id).filter(Call.total_reconnects > 0),
+        )
+        .where(
+            Call.ended_at > low,
+            Call.ended_at <= high,
+            Call.status.in_(TERMINAL_STATUSES),
+        )
+        .group_by(literal_column("1"), literal_column("2"), Call.status)
+    )
+    Rollup = models.CallMetricsHourly
+    stmt = insert(Rollup).from_select(
+        [
+            "bucket",
+            "doctor_id",
+            "status",
+            "calls",
+            "duration_sum",
+            "duration_count",
+            "reconnects_sum",
+            "reconnects_count",
+        ],
+        source,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Rollup.bucket, Rollup.doctor_id, Rollup.status],
+        set_={
+            name: getattr(Rollup, name) + getattr(stmt.excluded, name)
+            for name in (
+                "calls",
+                "duration_sum",
+                "duration_count",
+                "reconnects_sum",
+                "reconnects_count",
+            )
+        },
+    )
+    await db.execute(stmt)
+
+    if watermark is None:
+        db.add(models.MetricsWatermark(name=WATERMARK_NAME, value=high))
+    else:
+        watermark.value = high
+    await db.commit()
+    return True
+
+
+async def query_timeseries(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    group_by: List[str],
+    doctor_id: Optional[str] = None,
+):
+    Rollup = models.CallMetricsHourly
+    columns = []
+    groups = []
+    for key in group_by:
+        if key in TIME_GROUPS:
+            column = (
+                Rollup.bucket
+                if key == "hour"
+                else _utc_trunc(key, Rollup.bucket)
+            ).label("period")
+        elif key == "doctor":
+            column = Rollup.doctor_id.label("doctor_id")
+        else:
+            column = Rollup.status.label("status")
+        columns.append(column)
+        groups.append(column)
+
+    stmt = select(
+        *columns,
+        func.sum(Rollup.calls).label("calls"),
+        func.sum(Rollup.duration_sum).label("duration_sum"),
+        func.sum(Rollup.duration_count).label("duration_count"),
+        func.sum(Rollup.reconnects_sum).label("reconnects_sum"),
+        func.sum(Rollup.reconnects_count).label("reconnects_count"),
+    ).where(Rollup.bucket >= start, Rollup.bucket < end)
+    if doctor_id is not None:
+        stmt = stmt.where(Rollup.doctor_id == doctor_id)
+    if groups:
+        stmt = stmt.group_by(*groups).order_by(*groups)
+    return (await db.execute(stmt)).mappings().all()
@@ -2,6 +2,7 @@ import enum
 from uuid import uuid4
 
 from sqlalchemy import (
+    BigInteger,
     Column,
     Integer,
     String,
@@ -33,6 +34,16 @@ class CallStatus(enum.Enum):
     cancelled = "cancelled"
 
 
+# Estados en los que la llamada sigue viva: un paciente solo puede tener una
+ACTIVE_CALL_STATUSES = (
+    CallStatus.waiting,
+    CallStatus.assigned,
+    CallStatus.ringing,
+    CallStatus.in_progress,
+    CallStatus.reconnecting,
+)
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -62,13 +73,13 @@ class Call(Base):
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     room_id = Column(String(64), ForeignKey("rooms.id"), index=True)
-    patient_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
-    doctor_id = Column(String(36), ForeignKey("users.id"), index=True)
-    status = Column(Enum(CallStatus), default=CallStatus.waiting, index=True)
+    patient_id = Column(String(36), ForeignKey("users.id"), nullable=False)
+    doctor_id = Column(String(36), ForeignKey("users.id"))
+    status = Column(Enum(CallStatus), default=CallStatus.waiting)
     requested_at = Column(DateTime(timezone=True), server_default=func.now())
     started_at = Column(DateTime(timezone=True))
     assigned_at = Column(DateTime(timezone=True))
-    ended_at = Column(DateTime(timezone=True))
+    ended_at = Column(DateTime(timezone=True), index=True)
     last_resume_at = Column(DateTime(timezone=True))
     total_reconnects = Column(Integer, default=0)
     duration_seconds = Column(Integer, default=0)
@@ -79,6 +90,62 @@ class Call(Base):
     doctor = relationship("User", foreign_keys=[doctor_id])
 
 
+# Sin índices de una sola columna sobre patient_id/doctor_id/status: los
+# compuestos de abajo cubren esos prefijos y status casi no filtra por sí solo
+
+# Una sola llamada activa por paciente (reemplaza el chequeo previo al INSERT)
+Index(
+    "ix_calls_patient_active",
+    Call.patient_id,
+    unique=True,
+    postgresql_where=Call.status.in_(ACTIVE_CALL_STATUSES),
+)
+# Una sala por llamada activa: la autorización de Socket.IO (join/relay) va
+# por room_id, así que otra llamada no puede reutilizar una sala en uso
+Index(
+    "ix_calls_room_active",
+    Call.room_id,
+    unique=True,
+    postgresql_where=Call.status.in_(ACTIVE_CALL_STATUSES),
+)
+# Médico ocupado (dispatch) y filtros por estado del historial del médico
+Index("ix_calls_doctor_status", Call.doctor_id, Call.status)
+# Paginación por clave de /calls/waiting y /calls/history
+Index(
+    "ix_calls_waiting_requested",
+    Call.requested_at,
+    Call.id,
+    postgresql_where=Call.status == CallStatus.waiting,
+)
+Index("ix_calls_patient_history", Call.patient_id, Call.requested_at, Call.id)
+Index("ix_calls_doctor_history", Call.doctor_id, Call.requested_at, Call.id)
+# Reaper de llamadas activas vencidas (ver app/reaper.py)
+Index(
+    "ix_calls_stale_active",
+    Call.status,
+    func.coalesce(Call.last_resume_at, Call.started_at, Call.assigned_at, Call.requested_at),
+    postgresql_where=Call.status.in_(
+        [status for status in ACTIVE_CALL_STATUSES if status != CallStatus.waiting]
+    ),
+)
+
+
+class CallEvent(Base):
+    # Bitácora append-only de transiciones de cada llamada (request, claim,
+    # start, resume, end, ...); reemplaza el historial dentro de calls.meta
+    __tablename__ = "call_events"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    call_id = Column(Integer, ForeignKey("calls.id", ondelete="CASCADE"), nullable=False)
+    type = Column(String(32), nullable=False)
+    at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    actor_id = Column(String(36), ForeignKey("users.id"), nullable=True)
+    payload = Column(JSON, nullable=True)
+
+
+Index("ix_call_events_call_id_id", CallEvent.call_id, CallEvent.id)
+
+
 class Participant(Base):
     __tablename__ = "participants"
 
@@ -94,3 +161,25 @@ class Participant(Base):
 
 
 Index("ix_participants_room_sid", Participant.room_id, Participant.sid, unique=True)
+
+
+class CallMetricsHourly(Base):
+    # Rollup por hora (de ended_at) × médico × estado final; doctor_id = ""
+    # agrupa las llamadas que terminaron sin médico asignado
+    __tablename__ = "call_metrics_hourly"
+
+    bucket = Column(DateTime(timezone=True), primary_key=True)
+    doctor_id = Column(String(36), primary_key=True, default="")
+    status = Column(Enum(CallStatus), primary_key=True)
+    calls = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Integer, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    reconnects_sum = Column(Integer, nullable=False, default=0)
+    reconnects_count = Column(Integer, nullable=False, default=0)
+
+
+class MetricsWatermark(Base):
+    __tablename__ = "metrics_watermarks"
+
+    name = Column(String(64), primary_key=True)
+    value = Column(DateTime(timezone=True), nullable=False)
@@ -0,0 +1,25 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException
+
+# Paginación por clave (keyset) sobre (requested_at, id): el cursor es la
+# última fila de la página anterior, así cada página es un range scan del
+# índice sin OFFSET
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(requested_at: datetime, call_id: int) -> str:
+    raw = json.dumps([requested_at.isoformat(), call_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        requested_at, call_id = json.loads(raw)
+        return datetime.fromisoformat(requested_at), int(call_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
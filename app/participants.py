@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.postgresql import insert
+
+from . import models
+from .db import AsyncSessionLocal
+
+ROOM_ID_MAX = models.Room.id.type.length
+SID_MAX = models.Participant.sid.type.length
+
+logger = logging.getLogger(__name__)
+
+
+class ParticipantWriter:
+    """Historial de ``participants`` escrito en diferido (write-behind).
+
+    ``join``/``leave`` solo encolan el evento; un flush agrupa la tanda en
+    un upsert y un update masivos cuando se juntan ``batch_size`` eventos o
+    pasan ``flush_interval`` segundos. Con ``max_pending`` eventos sin
+    escribir, quien encola espera al siguiente flush (backpressure).
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[Tuple[str, str, str, Optional[str], datetime]] = []
+        self._flush_now = asyncio.Event()
+        self._drained = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.throttled = 0
+
+    async def _record(self, op: str, room_id: str, sid: str, user_id: Optional[str]):
+        if len(room_id) > ROOM_ID_MAX or len(sid) > SID_MAX:
+            return
+        while len(self._pending) >= self.max_pending and not self._closed:
+            self.throttled += 1
+            self._flush_now.set()
+            await self._drained.wait()
+        self._pending.append((op, room_id, sid, user_id, datetime.now(timezone.utc)))
+        if len(self._pending) >= self.batch_size:
+            self._flush_now.set()
+
+    async def join(self, room_id: str, sid: str, user_id: Optional[str] = None):
+        await self._record("join", room_id, sid, user_id)
+
+    async def leave(self, room_id: str, sid: str):
+        await self._record("leave", room_id, sid, None)
+
+    @staticmethod
+    def _coalesce(batch) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        # Último estado de cada (sala, sid) dentro de la tanda
+        rows: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for op, room_id, sid, user_id, at in batch:
+            row = rows.setdefault((room_id, sid), {"room_id": room_id, "sid": sid})
+            if op == "join":
+                row.update(user_id=user_id, joined_at=at, left_at=None)
+            else:
+                row["left_at"] = at
+        return rows
+
+    async def _write(self, batch):
+        rows = self._coalesce(batch).values()
+        joined = [row for row in rows if "joined_at" in row]
+        left = [
+            {"b_room_id": row["room_id"], "b_sid": row["sid"], "b_left_at": row["left_at"]}
+            for row in rows
+            if "joined_at" not in row
+        ]
+        Participant = models.Participant
+        table = Participant.__table__
+        async with AsyncSessionLocal() as db:
+            if joined:
+                # Las salas de señalización no siempre tienen fila en rooms
+                room_ids = {row["room_id"] for row in joined}
+                await db.execute(
+                    insert(models.Room)
+                    .values([{"id": room_id} for room_id in room_ids])
+                    .on_conflict_do_nothing(index_elements=[models.Room.id])
+                )
+                stmt = insert(Participant).values(joined)
+                await db.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[Participant.room_id, Participant.sid],
+                        set_={
+                            "user_id": stmt.excluded.user_id,
+                            "joined_at": stmt.excluded.joined_at,
+                            "left_at": stmt.excluded.left_at,
+                        },
+                    )
+                )
+            if left:
+                await db.execute(
+                    update(table)
+                    .where(
+                        table.c.room_id == bindparam("b_room_id"),
+                        table.c.sid == bindparam("b_sid"),
+                    )
+                    .values(left_at=bindparam("b_left_at")),
+                    left,
+                )
+            await db.commit()
+
+    async def flush(self):
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            self._flush_now.clear()
+            try:
+                for start in range(0, len(batch), self.batch_size):
+                    chunk = batch[start : start + self.batch_size]
+                    try:
+                        await self._write(chunk)
+                        self.written += len(chunk)
+                    except Exception:
+                        # El historial es best-effort: no se reintenta para
+                        # no acumular memoria si la base no responde
+                        self.dropped += len(chunk)
+                        logger.exception("participant flush failed", extra={"dropped": len(chunk)})
+            finally:
+                drained, self._drained = self._drained, asyncio.Event()
+                drained.set()
+
+    async def run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def close(self):
+        self._closed = True
+        self._flush_now.set()
+        await self.flush()
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "throttled": self.throttled,
+        }
@@ -0,0 +1,132 @@
+import time
+from typing import Dict, Optional, Set
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, burst: float, now: float) -> bool:
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class RelayStats:
+    def __init__(self):
+        self.allowed = 0
+        self.dropped_sid = 0
+        self.dropped_room = 0
+        self.disconnects = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "dropped_sid": self.dropped_sid,
+            "dropped_room": self.dropped_room,
+            "disconnects": self.disconnects,
+        }
+
+
+ALLOW = "allow"
+DROP = "drop"
+DISCONNECT = "disconnect"
+
+
+class RelayLimiter:
+    """Token buckets en memoria para ``relay``: uno por sid y otro por sala
+    de señalización del emisor (``rate`` mensajes/s con ráfagas de hasta
+    ``burst``; rate 0 desactiva ese nivel).
+
+    Lo que excede se descarta; con ``disconnect_after`` > 0, un sid que
+    acumula esa cantidad de descartes sin dejar que su bucket se llene de
+    nuevo se desconecta. La contabilidad es por worker: la sala se conoce
+    por los join/leave que atiende este proceso.
+    """
+
+    def __init__(
+        self,
+        sid_rate: float,
+        sid_burst: int,
+        room_rate: float,
+        room_burst: int,
+        disconnect_after: int = 0,
+    ):
+        self.sid_rate = sid_rate
+        self.sid_burst = max(sid_burst, 1)
+        self.room_rate = room_rate
+        self.room_burst = max(room_burst, 1)
+        self.disconnect_after = disconnect_after
+        self._sids: Dict[str, TokenBucket] = {}
+        self._rooms: Dict[str, TokenBucket] = {}
+        self._strikes: Dict[str, int] = {}
+        self._sid_rooms: Dict[str, Set[str]] = {}
+        self._room_sids: Dict[str, int] = {}
+        self.stats = RelayStats()
+
+    def join(self, sid: str, room_id: str):
+        room_ids = self._sid_rooms.setdefault(sid, set())
+        if room_id not in room_ids:
+            room_ids.add(room_id)
+            self._room_sids[room_id] = self._room_sids.get(room_id, 0) + 1
+
+    def leave(self, sid: str, room_id: str):
+        room_ids = self._sid_rooms.get(sid)
+        if not room_ids or room_id not in room_ids:
+            return
+        room_ids.remove(room_id)
+        if not room_ids:
+            del self._sid_rooms[sid]
+        remaining = self._room_sids[room_id] - 1
+        if remaining:
+            self._room_sids[room_id] = remaining
+        else:
+            # Sin emisores locales la sala no necesita bucket
+            del self._room_sids[room_id]
+            self._rooms.pop(room_id, None)
+
+    def discard(self, sid: str):
+        for room_id in list(self._sid_rooms.get(sid, ())):
+            self.leave(sid, room_id)
+        self._sids.pop(sid, None)
+        self._strikes.pop(sid, None)
+
+    def _drop(self, sid: str) -> str:
+        strikes = self._strikes.get(sid, 0) + 1
+        self._strikes[sid] = strikes
+        if 0 < self.disconnect_after <= strikes:
+            self.stats.disconnects += 1
+            return DISCONNECT
+        return DROP
+
+    def check(self, sid: str, now: Optional[float] = None) -> str:
+        now = time.monotonic() if now is None else now
+        if self.sid_rate > 0:
+            bucket = self._sids.get(sid)
+            if bucket is None:
+                bucket = self._sids[sid] = TokenBucket(self.sid_burst, now)
+            if not bucket.take(self.sid_rate, self.sid_burst, now):
+                self.stats.dropped_sid += 1
+                return self._drop(sid)
+            if sid in self._strikes and bucket.tokens >= self.sid_burst - 1:
+                # Volvió a un ritmo normal: se perdonan los descartes previos
+                del self._strikes[sid]
+        if self.room_rate > 0:
+            for room_id in self._sid_rooms.get(sid, ()):
+                bucket = self._rooms.get(room_id)
+                if bucket is None:
+                    bucket = self._rooms[room_id] = TokenBucket(self.room_burst, now)
+                if not bucket.take(self.room_rate, self.room_burst, now):
+                    self.stats.dropped_room += 1
+                    return self._drop(sid)
+        self.stats.allowed += 1
+        return ALLOW
+
+    def counters(self) -> Dict[str, int]:
+        return {"sids": len(self._sids), "rooms": len(self._rooms), **self.stats.as_dict()}
@@ -0,0 +1,247 @@
+import asyncio
+from typing import Callable, Dict, List, Optional, Set
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from .config import settings
+
+
+# -------------------------------------------------------------------
+# Eventos emitidos por otros workers
+# -------------------------------------------------------------------
+# Sala a la que no se une ningún cliente: lo que se emite ahí solo viaja
+# por el bus para que los demás workers actualicen su estado local
+INTERNAL_ROOM = "internal"
+
+remote_emit_handlers: Dict[str, List[Callable[[object], None]]] = {}
+
+
+def on_remote_emit(event: str):
+    # Permite mantener estado local (p. ej. índices en memoria) al día con
+    # los eventos que emiten los demás workers a través del bus
+    def decorator(fn):
+        remote_emit_handlers.setdefault(event, []).append(fn)
+        return fn
+
+    return decorator
+
+
+class RemoteEmitHooksMixin:
+    async def _handle_emit(self, message):
+        if message.get("host_id") != self.host_id:
+            for handler in remote_emit_handlers.get(message.get("event"), ()):
+                handler(message.get("data"))
+        await super()._handle_emit(message)
+
+
+class RedisManager(RemoteEmitHooksMixin, socketio.AsyncRedisManager):
+    pass
+
+
+# -------------------------------------------------------------------
+# Bus pub/sub en proceso (sustituto de Redis para pruebas)
+# -------------------------------------------------------------------
+class InProcessPubSubManager(RemoteEmitHooksMixin, AsyncPubSubManager):
+    # Comparte mensajes entre varios AsyncServer del mismo proceso para
+    # simular varios workers en pruebas sin levantar Redis.
+    name = "inprocess"
+    _subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    async def _publish(self, data):
+        for queue in list(self._subscribers.get(self.channel, [])):
+            queue.put_nowait(data)
+
+    async def _listen(self):
+        queue: asyncio.Queue = asyncio.Queue()
+        subscribers = self._subscribers.setdefault(self.channel, [])
+        subscribers.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            subscribers.remove(queue)
+
+
+def create_client_manager(url: Optional[str]) -> Optional[socketio.AsyncManager]:
+    if not url:
+        return None  # AsyncManager por defecto, un solo proceso
+    if url.startswith(("redis://", "rediss://")):
+        return RedisManager(url, channel=settings.SIO_CHANNEL)
+    if url.startswith("memory://"):
+        return InProcessPubSubManager(channel=settings.SIO_CHANNEL)
+    raise ValueError(f"Unsupported SIO_MESSAGE_QUEUE: {url}")
+
+
+# -------------------------------------------------------------------
+# Membresía de salas compartida entre workers
+# -------------------------------------------------------------------
+class RoomFull(Exception):
+    pass
+
+
+class RoomStats:
+    def __init__(self):
+        self.joins = 0
+        self.leaves = 0
+        self.rejected = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"joins": self.joins, "leaves": self.leaves, "rejected": self.rejected}
+
+
+class MemoryRoomStore:
+    """Registro de salas con índice en ambos sentidos (sala -> sids y
+    sid -> salas): join, leave y leave_all cuestan O(1) por sala afectada,
+    sin recorrer el resto de salas.
+    """
+
+    def __init__(self, max_members: int = 0):
+        self.rooms: Dict[str, Set[str]] = {}  # room_id -> set(sid)
+        self.sid_rooms: Dict[str, Set[str]] = {}  # sid -> set(room_id)
+        self.max_members = max_members  # 0 = sin límite
+        self.stats = RoomStats()
+
+    async def join(self, room_id: str, sid: str) -> List[str]:
+        members = self.rooms.get(room_id)
+        if members is None:
+            members = self.rooms[room_id] = set()
+        elif sid not in members and 0 < self.max_members <= len(members):
+            self.stats.rejected += 1
+            raise RoomFull(room_id)
+        members.add(sid)
+        self.sid_rooms.setdefault(sid, set()).add(room_id)
+        self.stats.joins += 1
+        return [m for m in members if m != sid]
+
+    def _discard(self, room_id: str, sid: str):
+        members = self.rooms.get(room_id)
+        if members is None:
+            return
+        members.discard(sid)
+        if not members:
+            del self.rooms[room_id]
+        self.stats.leaves += 1
+
+    async def leave(self, room_id: str, sid: str) -> bool:
+        room_ids = self.sid_rooms.get(sid)
+        if not room_ids or room_id not in room_ids:
+            return False
+        room_ids.remove(room_id)
+        if not room_ids:
+            del self.sid_rooms[sid]
+        self._discard(room_id, sid)
+        return True
+
+    async def leave_all(self, sid: str) -> List[str]:
+        room_ids = self.sid_rooms.pop(sid, set())
+        for room_id in room_ids:
+            self._discard(room_id, sid)
+        return list(room_ids)
+
+    async def members(self, room_id: str) -> List[str]:
+        return list(self.rooms.get(room_id, ()))
+
+    async def rooms_of(self, sid: str) -> List[str]:
+        return list(self.sid_rooms.get(sid, ()))
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "rooms": len(self.rooms),
+            "sids": len(self.sid_rooms),
+            **self.stats.as_dict(),
+        }
+
+
+# Une el sid a la sala salvo que esté llena; devuelve nil si no cabe.
+# SMEMBERS incluye al propio sid, así que una respuesta válida nunca está vacía
+_REDIS_JOIN = """
+if tonumber(ARGV[2]) > 0
+   and redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 0
+   and redis.call('SCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+  return nil
+end
+redis.call('SADD', KEYS[1], ARGV[1])
+redis.call('SADD', KEYS[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+return redis.call('SMEMBERS', KEYS[1])
+"""
+
+
+class RedisRoomStore:
+    def __init__(self, url: str, prefix: str, ttl_seconds: int, max_members: int = 0):
+        from redis import asyncio as aioredis
+
+        self.redis = aioredis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_members = max_members
+        self.stats = RoomStats()  # contadores de este worker
+        self._join_script = self.redis.register_script(_REDIS_JOIN)
+
+    def _room_key(self, room_id: str) -> str:
+        return f"{self.prefix}:room:{room_id}"
+
+    def _sid_key(self, sid: str) -> str:
+        return f"{self.prefix}:sid:{sid}"
+
+    async def join(self, room_id: str, sid: str) -> List[str]:
+        # las claves caducan por si un worker muere sin limpiar
+        members = await self._join_script(
+            keys=[self._room_key(room_id), self._sid_key(sid)],
+            args=[sid, self.max_members, room_id, self.ttl_seconds],
+        )
+        if members is None:
+            self.stats.rejected += 1
+            raise RoomFull(room_id)
+        self.stats.joins += 1
+        return [m for m in members if m != sid]
+
+    async def leave(self, room_id: str, sid: str) -> bool:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.srem(self._sid_key(sid), room_id)
+            pipe.srem(self._room_key(room_id), sid)
+            removed, _ = await pipe.execute()
+        if removed:
+            self.stats.leaves += 1
+        return bool(removed)
+
+    async def leave_all(self, sid: str) -> List[str]:
+        sid_key = self._sid_key(sid)
+        room_ids = list(await self.redis.smembers(sid_key))
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for room_id in room_ids:
+                pipe.srem(self._room_key(room_id), sid)
+            pipe.delete(sid_key)
+            await pipe.execute()
+        self.stats.leaves += len(room_ids)
+        return room_ids
+
+    async def members(self, room_id: str) -> List[str]:
+        return list(await self.redis.smembers(self._room_key(room_id)))
+
+    async def rooms_of(self, sid: str) -> List[str]:
+        return list(await self.redis.smembers(self._sid_key(sid)))
+
+    def counters(self) -> Dict[str, int]:
+        return self.stats.as_dict()
+
+
+def create_room_store(url: Optional[str]):
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisRoomStore(
+            url,
+            prefix=settings.SIO_CHANNEL,
+            ttl_seconds=settings.SIO_ROOM_TTL_SECONDS,
+            max_members=settings.SIO_ROOM_MAX_MEMBERS,
+        )
+    return MemoryRoomStore(max_members=settings.SIO_ROOM_MAX_MEMBERS)
+
+
+def create_sio(**kwargs) -> socketio.AsyncServer:
+    return socketio.AsyncServer(
+        async_mode="asgi",
+        client_manager=create_client_manager(settings.SIO_MESSAGE_QUEUE),
+        **kwargs,
+    )
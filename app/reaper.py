@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import Integer, and_, case, cast, extract, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .call_events import call_event, record_events
+
+Status = models.CallStatus
+
+# Estados que ya pasaron por start: al vencer terminan como "ended" con
+# duración; el resto (nunca empezaron) queda "cancelled"
+STARTED_STATUSES = (Status.in_progress, Status.reconnecting)
+
+
+def last_activity():
+    # Última señal de vida de una llamada activa (no hay heartbeat propio)
+    Call = models.Call
+    return func.coalesce(Call.last_resume_at, Call.started_at, Call.assigned_at, Call.requested_at)
+
+
+def _stale_condition(ttls: Dict[Status, int], now: datetime):
+    # Una condición por estado con TTL > 0; waiting usa ix_calls_waiting_requested
+    # y el resto ix_calls_stale_active
+    Call = models.Call
+    conditions = []
+    for status, ttl in ttls.items():
+        if ttl <= 0:
+            continue
+        cutoff = now - timedelta(seconds=ttl)
+        column = Call.requested_at if status == Status.waiting else last_activity()
+        conditions.append(and_(Call.status == status, column < cutoff))
+    return or_(*conditions) if conditions else None
+
+
+async def expire_stale_calls(
+    db: AsyncSession, ttls: Dict[Status, int], now: datetime, batch_size: int
+) -> List[Tuple[models.Call, List]]:
+    """Cierra hasta ``batch_size`` llamadas vencidas en un solo
+    ``UPDATE ... RETURNING`` y registra un evento ``expire`` por cada una.
+
+    Las filas se toman con ``FOR UPDATE SKIP LOCKED``: varios workers pueden
+    correr a la vez sin procesar dos veces la misma llamada, y el UPDATE
+    vuelve a comprobar el estado por si una transición ganó la carrera.
+    Devuelve ``(llamada, metrics_state previo)``; el commit queda a cargo
+    del llamador.
+    """
+    condition = _stale_condition(ttls, now)
+    if condition is None:
+        return []
+    Call = models.Call
+    stale = (
+        select(Call.id, Call.status, Call.duration_seconds)
+        .where(condition)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("stale")
+    )
+    started = stale.c.status.in_(STARTED_STATUSES)
+    stmt = (
+        update(Call)
+        .where(Call.id == stale.c.id, Call.status == stale.c.status)
+        .values(
+            status=cast(
+                case((started, Status.ended.value), else_=Status.cancelled.value),
+                Call.status.type,
+            ),
+            ended_at=now,
+            duration_seconds=case(
+                (
+                    and_(started, Call.started_at.is_not(None)),
+                    func.greatest(extract("epoch", now - Call.started_at), 0).cast(Integer),
+                ),
+                else_=Call.duration_seconds,
+            ),
+        )
+        .returning(Call, stale.c.status, stale.c.duration_seconds)
+        .execution_options(synchronize_session=False)
+    )
+    expired = []
+    events = []
+    for call, previous, duration in (await db.execute(stmt)).all():
+        expired.append((call, [previous.value, duration or 0, call.total_reconnects or 0]))
+        events.append(
+            call_event(
+                call,
+                "expire",
+                previous_status=previous.value,
+                duration_seconds=call.duration_seconds,
+            )
+        )
+    await record_events(db, events)
+    return expired
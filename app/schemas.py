@@ -99,3 +99,12 @@ class MetricsResponse(BaseModel):
     ended: int
     avg_duration_seconds: float
     avg_reconnects: float
+
+
+class TimeseriesPoint(BaseModel):
+    period: Optional[datetime] = None
+    doctor_id: Optional[str] = None
+    status: Optional[CallStatus] = None
+    calls: int
+    avg_duration_seconds: float
+    avg_reconnects: float
@@ -1,18 +1,87 @@
+import asyncio
+import hmac
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .config import settings
-from .deps import get_db
+from .deps import get_async_db
 from . import models
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: str
+    role: models.UserRole
+    is_active: bool
+    is_available: bool
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(
+            id=user.id,
+            role=user.role,
+            is_active=bool(user.is_active),
+            is_available=bool(user.is_available),
+        )
+
+
+class PrincipalCache:
+    """LRU acotado con TTL de ``Principal`` por ``sub`` del token.
+
+    Evita la consulta a ``users`` en cada request autenticado. Las
+    entradas se invalidan al cambiar disponibilidad o estado activo por la
+    API; el TTL acota lo que puede quedar desactualizado por otras vías.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[Principal]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, principal: Principal):
+        if self.max_size <= 0:
+            return
+        self._entries[principal.id] = (time.monotonic() + self.ttl_seconds, principal)
+        self._entries.move_to_end(principal.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+
+principal_cache = PrincipalCache(
+    settings.AUTH_CACHE_SIZE, settings.AUTH_CACHE_TTL_SECONDS
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -23,6 +92,53 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+class HashingBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """Ejecuta bcrypt en un pool de hilos acotado, fuera del event loop.
+
+    bcrypt libera el GIL, así que los hilos bastan. Si ya hay
+    ``max_pending`` operaciones en curso o en cola se lanza ``HashingBusy``
+    en lugar de acumular trabajo.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int):
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bcrypt"
+        )
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HashingBusy()
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, fn, *args
+            )
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        # Devuelve un hash nuevo si el almacenado usa otro coste de bcrypt
+        return await self._run(pwd_context.verify_and_update, password, hashed_password)
+
+
+password_hasher = PasswordHasher(
+    settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING
+)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     expire = datetime.utcnow() + (
@@ -35,43 +151,135 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
+def decode_access_token(token: str) -> Optional[dict]:
+    try:
+        payload = jwt.decode(
+            token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
+        )
+    except JWTError:
+        return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+
+def create_resume_token(peer_id: str, user_id: Optional[str]) -> str:
+    # Sin "sub": decode_access_token lo rechaza, no sirve como token de acceso
+    return create_access_token(
+        {"typ": "resume", "peer": peer_id, "uid": user_id},
+        timedelta(seconds=settings.SIO_ROOM_TTL_SECONDS),
     )
+
+
+def decode_resume_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(
             token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM]
         )
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
+        return None
+    if payload.get("typ") != "resume" or not payload.get("peer"):
+        return None
+    return payload
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> models.User:
+    payload = decode_access_token(token)
+    if payload is None:
+        raise _credentials_exception()
+    user_id: str = payload["sub"]
+
+    user = await db.get(models.User, user_id)
     if user is None or not user.is_active:
-        raise credentials_exception
+        raise _credentials_exception()
+    principal_cache.put(Principal.from_user(user))
     return user
 
 
+async def load_principal(db: AsyncSession, user_id: str) -> Optional[Principal]:
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        user = await db.get(models.User, user_id)
+        if user is None:
+            return None
+        principal = Principal.from_user(user)
+        principal_cache.put(principal)
+    return principal
+
+
+async def get_current_principal(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+) -> Principal:
+    # Camino rápido: sin consulta a la base si el principal está en caché
+    payload = decode_access_token(token)
+    if payload is None:
+        raise _credentials_exception()
+    principal = await load_principal(db, payload["sub"])
+    if principal is None or not principal.is_active:
+        raise _credentials_exception()
+    return principal
+
+
+async def get_optional_principal(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db),
+) -> Optional[Principal]:
+    # Para endpoints que también responden sin sesión: un token vencido o
+    # inválido cuenta como anónimo en lugar de responder 401
+    if token is None:
+        return None
+    try:
+        return await get_current_principal(token, db)
+    except HTTPException:
+        return None
+
+
 def require_role(role: models.UserRole):
-    async def _role_dependency(user: models.User = Depends(get_current_user)):
-        if user.role != role:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail=f"Operation restricted to {role.value}s",
-            )
-        return user
+    async def _role_dependency(
+        token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+    ) -> Principal:
+        forbidden = HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=f"Operation restricted to {role.value}s",
+        )
+        payload = decode_access_token(token)
+        if payload is None:
+            raise _credentials_exception()
+        # El rol viaja en el token: se rechaza sin tocar la base
+        if payload.get("role") not in (None, role.value):
+            raise forbidden
+        principal = await load_principal(db, payload["sub"])
+        if principal is None or not principal.is_active:
+            raise _credentials_exception()
+        if principal.role != role:
+            raise forbidden
+        return principal
 
     return _role_dependency
 
 
-async def get_current_active_user(user: models.User = Depends(get_current_user)):
-    if not user.is_active:
+async def get_current_active_user(
+    principal: Principal = Depends(get_current_principal),
+) -> Principal:
+    if not principal.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    return user
+    return principal
+
+
+def require_internal_token(x_internal_token: Optional[str] = Header(None)):
+    # Endpoints de operación: 404 si no hay INTERNAL_API_TOKEN configurado
+    expected = settings.INTERNAL_API_TOKEN
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_internal_token or not hmac.compare_digest(x_internal_token, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid internal token")
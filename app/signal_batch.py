@@ -0,0 +1,61 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+Pair = Tuple[str, str]  # (from_sid, to_sid)
+
+
+class CandidateBatcher:
+    """Agrupa los candidatos ICE de cada par (from, to) durante ``window``
+    segundos y los entrega juntos con ``send(from_sid, to_sid, payloads)``.
+
+    La tanda sale antes si llega a ``max_candidates`` o si el mismo par
+    envía otra señal (offer/answer/end-of-candidates), para no alterar el
+    orden en que el receptor las procesa.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        max_candidates: int,
+        send: Callable[[str, str, List[Any]], Awaitable[None]],
+    ):
+        self.window = window
+        self.max_candidates = max_candidates
+        self.send = send
+        self._pending: Dict[Pair, List[Any]] = {}
+        self._timers: Dict[Pair, asyncio.TimerHandle] = {}
+        self.batches = 0
+        self.candidates = 0
+
+    async def add(self, from_sid: str, to: str, payload: Any):
+        pair = (from_sid, to)
+        batch = self._pending.get(pair)
+        if batch is None:
+            batch = self._pending[pair] = []
+            self._timers[pair] = asyncio.get_running_loop().call_later(
+                self.window, lambda: asyncio.ensure_future(self.flush(from_sid, to))
+            )
+        batch.append(payload)
+        if len(batch) >= self.max_candidates:
+            await self.flush(from_sid, to)
+
+    async def flush(self, from_sid: str, to: str):
+        pair = (from_sid, to)
+        timer = self._timers.pop(pair, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(pair, None)
+        if batch:
+            self.batches += 1
+            self.candidates += len(batch)
+            await self.send(from_sid, to, batch)
+
+    async def flush_involving(self, sid: str):
+        for from_sid, to in [pair for pair in self._pending if sid in pair]:
+            await self.flush(from_sid, to)
+
+    def discard(self, sid: str):
+        # El socket se fue: sus candidatos (enviados o recibidos) ya no sirven
+        for pair in [pair for pair in self._pending if sid in pair]:
+            self._timers.pop(pair).cancel()
+            del self._pending[pair]
@@ -0,0 +1,179 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+Signal = Tuple[str, Any]  # (evento, datos) tal como se emitirían
+
+
+class DetachedPeer:
+    __slots__ = ("buffer", "dropped", "timer", "user_id")
+
+    def __init__(self, size: int, user_id: Optional[str]):
+        self.buffer: Deque[Signal] = deque(maxlen=size)
+        self.dropped = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.user_id = user_id
+
+
+class ResumeStats:
+    def __init__(self):
+        self.detached = 0
+        self.resumed = 0
+        self.expired = 0
+        self.superseded = 0
+        self.buffered = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "detached": self.detached,
+            "resumed": self.resumed,
+            "expired": self.expired,
+            "superseded": self.superseded,
+            "buffered": self.buffered,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+        }
+
+
+class SignalResume:
+    """Ventana de gracia para reconexiones de señalización.
+
+    Un peer se identifica por el sid con el que entró a la sala
+    (``peer_id``): es lo que ven los demás en ``peers``, ``peer-joined`` y
+    ``signal.from``, y no cambia al reanudar desde otro socket. Mientras el
+    peer está desconectado (``detach``) las señales dirigidas a él se
+    guardan en un ring buffer de ``buffer_size`` (las más viejas se pierden
+    si se llena) y se devuelven en orden al reanudar (``attach``).
+
+    Cada worker guarda lo que él mismo relayó; los cambios de estado viajan
+    por el bus para que todos los workers bufferen y luego reenvíen al sid
+    nuevo. Solo el worker donde se cayó el socket programa el vencimiento.
+    Un ``join`` nuevo del mismo usuario a la sala desaloja a su peer
+    desconectado (``detached_of``) en vez de esperar la ventana.
+    """
+
+    def __init__(self, grace: float, buffer_size: int):
+        self.grace = grace
+        self.buffer_size = max(buffer_size, 1)
+        self._sids: Dict[str, str] = {}  # peer_id -> sid actual, si cambió
+        self._local: Dict[str, str] = {}  # peer_id -> sid conectado a este worker
+        self._detached: Dict[str, DetachedPeer] = {}
+        self._superseded: Set[str] = set()
+        self.stats = ResumeStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.grace > 0
+
+    def sid_of(self, peer_id: str) -> str:
+        return self._sids.get(peer_id, peer_id)
+
+    def buffer(self, peer_id: str, event: str, data: Any) -> bool:
+        # True si el peer está desconectado y la señal quedó guardada
+        peer = self._detached.get(peer_id)
+        if peer is None:
+            return False
+        if len(peer.buffer) == peer.buffer.maxlen:
+            peer.dropped += 1
+            self.stats.dropped += 1
+        peer.buffer.append((event, data))
+        self.stats.buffered += 1
+        return True
+
+    def detach(
+        self,
+        peer_id: str,
+        user_id: Optional[str] = None,
+        on_expire: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        peer = self._detached.get(peer_id)
+        if peer is None:
+            peer = self._detached[peer_id] = DetachedPeer(self.buffer_size, user_id)
+        if on_expire is not None:
+            self.stats.detached += 1
+            self._local.pop(peer_id, None)
+            peer.timer = asyncio.get_running_loop().call_later(
+                self.grace, lambda: asyncio.ensure_future(on_expire(peer_id))
+            )
+
+    def is_detached(self, peer_id: str) -> bool:
+        return peer_id in self._detached
+
+    def detached_of(self, user_id: Optional[str], peer_ids: Iterable[str]) -> List[str]:
+        # Peers de ``user_id`` en la ventana de gracia entre ``peer_ids``
+        if user_id is None:
+            return []
+        return [
+            peer_id
+            for peer_id in peer_ids
+            if (peer := self._detached.get(peer_id)) is not None and peer.user_id == user_id
+        ]
+
+    def attach(self, peer_id: str, sid: str) -> Tuple[List[Signal], int]:
+        """El peer sigue en ``sid``: devuelve las señales guardadas en orden
+        y cuántas se perdieron por falta de espacio."""
+        if sid == peer_id:
+            self._sids.pop(peer_id, None)
+        else:
+            self._sids[peer_id] = sid
+        peer = self._detached.pop(peer_id, None)
+        if peer is None:
+            return [], 0
+        if peer.timer is not None:
+            peer.timer.cancel()
+            self.stats.resumed += 1
+        return list(peer.buffer), peer.dropped
+
+    def claim(self, peer_id: str, sid: Optional[str]) -> Optional[str]:
+        """Registra el socket del peer en este worker (``None`` si reanudó en
+        otro) y devuelve el socket anterior que quedó reemplazado, si lo hay:
+        el cliente reconectó antes de que el servidor notara la caída."""
+        previous = self._local.pop(peer_id, None)
+        if sid is not None:
+            self._local[peer_id] = sid
+        if previous is None or previous == sid:
+            return None
+        self._superseded.add(previous)
+        self.stats.superseded += 1
+        return previous
+
+    def release(self, peer_id: str, sid: str) -> bool:
+        """Al desconectar ``sid``: False si era un socket reemplazado, al que
+        no le corresponde dejar las salas ni abrir la ventana de gracia."""
+        if sid in self._superseded:
+            self._superseded.discard(sid)
+            return False
+        if self._local.get(peer_id) == sid:
+            del self._local[peer_id]
+        return True
+
+    def evict(self, peer_id: str):
+        # Lo reemplaza un join nuevo del mismo usuario: no cuenta como vencido
+        peer = self._detached.pop(peer_id, None)
+        if peer is None:
+            return
+        if peer.timer is not None:
+            peer.timer.cancel()
+        self.stats.evicted += 1
+
+    def forget(self, peer_id: str) -> bool:
+        # El peer dejó las salas o venció: devuelve False si ya había reanudado
+        peer = self._detached.pop(peer_id, None)
+        self._sids.pop(peer_id, None)
+        self._local.pop(peer_id, None)
+        if peer is None:
+            return False
+        if peer.timer is not None:
+            peer.timer.cancel()
+            self.stats.expired += 1
+        return True
+
+    def counters(self) -> Dict[str, int]:
+        return {
+            "grace_seconds": self.grace,
+            "detached_now": len(self._detached),
+            "resumed_peers": len(self._sids),
+            **self.stats.as_dict(),
+        }
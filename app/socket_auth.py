@@ -0,0 +1,58 @@
+from typing import Any, Dict, Optional, Set
+
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+ACTIVE_STATUS_VALUES = frozenset(status.value for status in models.ACTIVE_CALL_STATUSES)
+
+
+def socket_token(environ: Dict[str, Any], auth: Any) -> Optional[str]:
+    """JWT del handshake: ``auth.token`` (cliente JS ``io(url, {auth})``) o
+    un header ``Authorization: Bearer`` para clientes que no son navegador."""
+    if isinstance(auth, dict) and auth.get("token"):
+        return str(auth["token"])
+    scheme, _, value = environ.get("HTTP_AUTHORIZATION", "").partition(" ")
+    if scheme.lower() == "bearer" and value.strip():
+        return value.strip()
+    return None
+
+
+async def allowed_call_rooms(db: AsyncSession, user_id: str) -> Set[str]:
+    # Salas de las llamadas activas del usuario (como paciente o médico);
+    # ix_calls_room_active garantiza que cada una pertenece a una sola llamada
+    # activa. Usa ix_calls_patient_active e ix_calls_doctor_status
+    Call = models.Call
+    rows = await db.scalars(
+        select(Call.room_id).where(
+            or_(Call.patient_id == user_id, Call.doctor_id == user_id),
+            Call.status.in_(models.ACTIVE_CALL_STATUSES),
+        )
+    )
+    return {room_id for room_id in rows if room_id}
+
+
+class SocketUsers:
+    """Índice user_id -> sids autenticados de este worker, para actualizar las
+    salas permitidas de sus sesiones cuando cambia una de sus llamadas."""
+
+    def __init__(self):
+        self._sids: Dict[str, Set[str]] = {}
+
+    def add(self, user_id: str, sid: str):
+        self._sids.setdefault(user_id, set()).add(sid)
+
+    def discard(self, user_id: str, sid: str):
+        sids = self._sids.get(user_id)
+        if sids is None:
+            return
+        sids.discard(sid)
+        if not sids:
+            del self._sids[user_id]
+
+    def sids(self, user_id: Optional[str]) -> Set[str]:
+        return set(self._sids.get(user_id, ())) if user_id else set()
+
+    def __len__(self) -> int:
+        return sum(len(sids) for sids in self._sids.values())
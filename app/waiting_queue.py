@@ -0,0 +1,77 @@
+import bisect
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .fast_json import call_row
+
+QUEUE_ROOM = "waiting-queue"
+
+
+class WaitingQueueIndex:
+    """Índice en memoria de las llamadas en espera, ordenado por
+    ``(requested_at, id)`` igual que ``GET /calls/waiting``.
+
+    Cada operación devuelve el delta a difundir (o ``None`` si no cambió
+    nada), de modo que aplicar dos veces el mismo delta es inocuo.
+    """
+
+    def __init__(self):
+        self._items: Dict[int, Dict[str, Any]] = {}
+        self._order: List[Tuple[datetime, int]] = []
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @staticmethod
+    def _key(item: Dict[str, Any]) -> Tuple[datetime, int]:
+        return (datetime.fromisoformat(item["requested_at"]), item["id"])
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [self._items[call_id] for _, call_id in self._order]
+
+    def upsert(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        current = self._items.get(item["id"])
+        if current == item:
+            return None
+        if current is not None:
+            self._order.pop(bisect.bisect_left(self._order, self._key(current)))
+        bisect.insort(self._order, self._key(item))
+        self._items[item["id"]] = item
+        return {"op": "add" if current is None else "update", "call": item}
+
+    def remove(self, call_id: int) -> Optional[Dict[str, Any]]:
+        current = self._items.pop(call_id, None)
+        if current is None:
+            return None
+        self._order.pop(bisect.bisect_left(self._order, self._key(current)))
+        return {"op": "remove", "call_id": call_id}
+
+    def apply(self, delta: Dict[str, Any]):
+        if delta["op"] == "remove":
+            self.remove(delta["call_id"])
+        else:
+            self.upsert(delta["call"])
+
+    def track(self, call: models.Call) -> Optional[Dict[str, Any]]:
+        if call.status == models.CallStatus.waiting:
+            return self.upsert(call_row(call))
+        return self.remove(call.id)
+
+    async def resync(self, db: AsyncSession) -> List[Dict[str, Any]]:
+        # Recarga desde la base y devuelve los deltas que corrigen la deriva
+        calls = await db.scalars(
+            select(models.Call).where(models.Call.status == models.CallStatus.waiting)
+        )
+        fresh = {call.id: call_row(call) for call in calls}
+        deltas = [self.remove(call_id) for call_id in set(self._items) - set(fresh)]
+        deltas += [self.upsert(item) for item in fresh.values()]
+        self.loaded = True
+        return [delta for delta in deltas if delta is not None]
+
+
+waiting_queue = WaitingQueueIndex()
@@ -0,0 +1,80 @@
+"""Consultas SQL por request autenticado, con y sin caché de principal.
+
+Uso:
+    python benchmarks/auth_query_count.py --requests 200
+"""
+import argparse
+import asyncio
+import json
+
+import httpx
+from sqlalchemy import event
+
+from common import create_user
+
+from app.db import async_engine
+from app.main import api
+from app.security import principal_cache
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args, **kwargs):
+        self.count += 1
+
+
+async def run_phase(client, calls, counter: QueryCounter, requests: int):
+    results = {}
+    for name, path, headers in calls:
+        counter.count = 0
+        for _ in range(requests):
+            resp = await client.get(path, headers=headers)
+            resp.raise_for_status()
+        results[name] = round(counter.count / requests, 2)
+    return results
+
+
+async def main(args):
+    counter = QueryCounter()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", counter)
+
+    transport = httpx.ASGITransport(app=api)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        doctor = await create_user(client, "doctor")
+        patient = await create_user(client, "patient")
+        call = (await client.post("/calls/request", json={}, headers=patient)).json()
+        (await client.post(f"/calls/{call['id']}/claim", headers=doctor)).raise_for_status()
+        calls = [
+            ("GET /calls/{id}", f"/calls/{call['id']}", patient),
+            ("GET /calls/waiting", "/calls/waiting", doctor),
+            ("GET /metrics/calls", "/metrics/calls", doctor),
+        ]
+
+        max_size = principal_cache.max_size
+        principal_cache.max_size = 0
+        principal_cache._entries.clear()
+        without_cache = await run_phase(client, calls, counter, args.requests)
+        principal_cache.max_size = max_size
+        with_cache = await run_phase(client, calls, counter, args.requests)
+
+        (await client.post(f"/calls/{call['id']}/end", headers=patient)).raise_for_status()
+
+    print(
+        json.dumps(
+            {
+                "queries_per_request_without_cache": without_cache,
+                "queries_per_request_with_cache": with_cache,
+                "cache_hits": principal_cache.hits,
+                "cache_misses": principal_cache.misses,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,194 @@
+"""Guardas de transición de llamadas contra la base configurada.
+
+Recorre casos que antes dejaban llamadas en estados imposibles y comprueba
+la respuesta de la API:
+
+- ``reaped-resume``: una llamada en curso vencida por el reaper (queda
+  ``ended``) y una en espera cancelada no se pueden reanudar (400), y el
+  médico queda libre para otra llamada.
+- ``room-hijack``: un segundo paciente no puede pedir una llamada con el
+  ``room_id`` de otra llamada activa (409) ni hacer ``join``/``relay`` en esa
+  sala; la sala se libera cuando la llamada termina.
+- ``bad-payload``: los eventos de Socket.IO con datos que no son un objeto
+  responden ``bad-request`` en vez de romper el handler.
+
+Levanta la app en el mismo proceso con el reaper de fondo apagado y lo
+corre a mano con ``reap_stale_calls``. Termina con código 1 si alguna
+comprobación falla.
+
+Uso:
+    python benchmarks/call_guards.py
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import timedelta
+
+# Antes de importar la app: la configuración se lee al importar
+os.environ.update(CALL_REAPER_INTERVAL_SECONDS="0", LOG_LEVEL="WARNING")
+
+import httpx
+import socketio
+
+from common import create_user, free_port, start_server
+
+
+async def backdate(call_id: int, seconds: int):
+    # Simula inactividad: corre hacia atrás todas las marcas de last_activity
+    from sqlalchemy import update
+
+    from app import models
+    from app.db import AsyncSessionLocal
+
+    Call = models.Call
+    delta = timedelta(seconds=seconds)
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Call)
+            .where(Call.id == call_id)
+            .values(
+                requested_at=Call.requested_at - delta,
+                assigned_at=Call.assigned_at - delta,
+                started_at=Call.started_at - delta,
+                last_resume_at=Call.last_resume_at - delta,
+            )
+        )
+        await db.commit()
+
+
+async def check_reaped_resume(client: httpx.AsyncClient):
+    from app.config import settings
+    from app.main import reap_stale_calls
+
+    doctor = await create_user(client, "doctor")
+    patient = await create_user(client, "patient")
+    # Sin disponibilidad el auto-dispatch no toma las llamadas del chequeo
+    await client.patch("/users/me/availability", json={"is_available": False}, headers=doctor)
+
+    call = (await client.post("/calls/request", json={}, headers=patient)).json()
+    resp = await client.post(f"/calls/{call['id']}/claim", headers=doctor)
+    assert resp.status_code == 200, resp.text
+    resp = await client.post(f"/calls/{call['id']}/start", headers=doctor)
+    assert resp.status_code == 200, resp.text
+
+    await backdate(call["id"], settings.CALL_IN_PROGRESS_TTL_SECONDS + 60)
+    await reap_stale_calls()
+    reaped = (await client.get(f"/calls/{call['id']}", headers=patient)).json()
+    assert reaped["status"] == "ended" and reaped["ended_at"], reaped
+
+    # Ni el paciente ni el médico reanudan la llamada vencida
+    fresh = (await client.post("/calls/request", json={}, headers=patient)).json()
+    for headers in (patient, doctor):
+        resp = await client.post(f"/calls/{call['id']}/resume", json={}, headers=headers)
+        assert resp.status_code == 400, (resp.status_code, resp.text)
+
+    # Una solicitud en espera vencida queda cancelled y tampoco se reanuda
+    await backdate(fresh["id"], settings.CALL_WAITING_TTL_SECONDS + 60)
+    await reap_stale_calls()
+    cancelled = (await client.get(f"/calls/{fresh['id']}", headers=patient)).json()
+    assert cancelled["status"] == "cancelled", cancelled
+    # ... ni siquiera con otra solicitud activa del paciente (antes: 500)
+    other = (await client.post("/calls/request", json={}, headers=patient)).json()
+    resp = await client.post(f"/calls/{fresh['id']}/resume", json={}, headers=patient)
+    assert resp.status_code == 400, (resp.status_code, resp.text)
+
+    # El médico no quedó bloqueado por las llamadas vencidas
+    resp = await client.post(f"/calls/{other['id']}/claim", headers=doctor)
+    assert resp.status_code == 200, resp.text
+    await client.post(f"/calls/{other['id']}/end", headers=doctor)
+
+
+SOCKET_EVENTS = (
+    "join",
+    "leave",
+    "resume",
+    "relay",
+    "subscribe-call",
+    "subscribe-queue",
+    "unsubscribe-call",
+)
+
+
+def socket_auth(headers):
+    return {"token": headers["Authorization"].split()[1]}
+
+
+async def check_room_hijack(client: httpx.AsyncClient):
+    doctor = await create_user(client, "doctor")
+    owner = await create_user(client, "patient")
+    intruder = await create_user(client, "patient")
+    await client.patch("/users/me/availability", json={"is_available": False}, headers=doctor)
+    url = str(client.base_url)
+    room = f"guard-{uuid.uuid4().hex[:10]}"
+
+    call = (await client.post("/calls/request", json={"room_id": room}, headers=owner)).json()
+    resp = await client.post(f"/calls/{call['id']}/claim", headers=doctor)
+    assert resp.status_code == 200, resp.text
+    resp = await client.post("/calls/request", json={"room_id": room}, headers=intruder)
+    assert resp.status_code == 409, (resp.status_code, resp.text)
+
+    owner_sock, intruder_sock = socketio.AsyncClient(), socketio.AsyncClient()
+    try:
+        await owner_sock.connect(url, transports=["websocket"], auth=socket_auth(owner))
+        await intruder_sock.connect(url, transports=["websocket"], auth=socket_auth(intruder))
+        ack = await owner_sock.call("join", {"room": room})
+        assert ack["ok"], ack
+        ack = await intruder_sock.call("join", {"room": room})
+        assert ack == {"ok": False, "error": "forbidden"}, ack
+        ack = await intruder_sock.call(
+            "relay", {"to": owner_sock.get_sid(), "type": "offer", "payload": {}}
+        )
+        assert ack == {"ok": False, "error": "forbidden"}, ack
+    finally:
+        for sock in (owner_sock, intruder_sock):
+            if sock.connected:
+                await sock.disconnect()
+
+    # Terminada la llamada, la sala puede volver a usarse
+    await client.post(f"/calls/{call['id']}/end", headers=doctor)
+    resp = await client.post("/calls/request", json={"room_id": room}, headers=intruder)
+    assert resp.status_code == 200, resp.text
+    await client.post(f"/calls/{resp.json()['id']}/end", headers=intruder)
+
+
+async def check_bad_payload(client: httpx.AsyncClient):
+    patient = await create_user(client, "patient")
+    sock = socketio.AsyncClient()
+    try:
+        await sock.connect(str(client.base_url), transports=["websocket"], auth=socket_auth(patient))
+        for event in SOCKET_EVENTS:
+            for data in ("room", ["room"], 1):
+                ack = await sock.call(event, data)
+                assert ack == {"ok": False, "error": "bad-request"}, (event, data, ack)
+    finally:
+        if sock.connected:
+            await sock.disconnect()
+
+
+CHECKS = {
+    "reaped-resume": check_reaped_resume,
+    "room-hijack": check_room_hijack,
+    "bad-payload": check_bad_payload,
+}
+
+
+async def main():
+    port = free_port()
+    server = await start_server(port)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            for name, check in CHECKS.items():
+                await check(client)
+                print(f"ok {name}")
+    finally:
+        server.should_exit = True
+        await asyncio.sleep(0.2)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except AssertionError as exc:
+        print(f"FAIL {exc}", file=sys.stderr)
+        sys.exit(1)
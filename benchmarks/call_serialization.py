@@ -0,0 +1,104 @@
+"""Serializar 1.000 ``CallDetail``: camino por defecto de FastAPI (validar con
+pydantic desde el ORM + ``json.dumps``) contra ``call_values_list`` + orjson.
+
+No usa servidor ni base de datos: las llamadas son objetos ORM en memoria.
+
+Uso:
+    python benchmarks/call_serialization.py --calls 1000 --repeat 200
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+import common  # noqa: F401  (agrega la raíz del repo a sys.path)
+from app import models, schemas
+from app.fast_json import FastJSONResponse, call_values_list
+
+
+def make_calls(count: int) -> List[models.Call]:
+    now = datetime.now(timezone.utc)
+    statuses = list(models.CallStatus)
+    calls = []
+    for i in range(count):
+        requested = now - timedelta(seconds=count - i)
+        ended = i % 3 == 0
+        calls.append(
+            models.Call(
+                id=i + 1,
+                room_id=f"room-{uuid.uuid4().hex[:10]}",
+                patient_id=str(uuid.uuid4()),
+                doctor_id=str(uuid.uuid4()) if i % 4 else None,
+                status=statuses[i % len(statuses)],
+                requested_at=requested,
+                assigned_at=requested + timedelta(seconds=5) if i % 4 else None,
+                started_at=requested + timedelta(seconds=8) if ended else None,
+                ended_at=requested + timedelta(seconds=600) if ended else None,
+                last_resume_at=None,
+                total_reconnects=i % 3,
+                duration_seconds=592 if ended else 0,
+                meta={"source": "bench", "notes": ["a", "b"]} if i % 2 else {},
+            )
+        )
+    return calls
+
+
+# Lo que hace FastAPI con response_model=List[CallDetail]: validar desde
+# atributos, volcar en modo JSON y json.dumps compacto (JSONResponse)
+adapter = TypeAdapter(List[schemas.CallDetail])
+
+
+def default_path(calls) -> bytes:
+    validated = adapter.validate_python(calls, from_attributes=True)
+    content = adapter.dump_python(validated, mode="json")
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_path(calls) -> bytes:
+    return FastJSONResponse(call_values_list(calls)).body
+
+
+def measure(fn, calls, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(calls)
+        samples.append(time.perf_counter() - started)
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+    }
+
+
+def main(args):
+    calls = make_calls(args.calls)
+    # Mismo JSON por ambos caminos
+    assert json.loads(default_path(calls)) == json.loads(fast_path(calls))
+
+    default = measure(default_path, calls, args.repeat)
+    fast = measure(fast_path, calls, args.repeat)
+    print(
+        json.dumps(
+            {
+                "calls": args.calls,
+                "pydantic_json_dumps": default,
+                "orm_values_orjson": fast,
+                "speedup": round(default["median_ms"] / fast["median_ms"], 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    main(parser.parse_args())
@@ -0,0 +1,118 @@
+"""Mensajes Socket.IO y tiempo de entrega de ráfagas de candidatos ICE,
+con y sin agrupación en ``signal-batch``.
+
+Uso:
+    python benchmarks/candidate_batching.py --pairs 50 --candidates 30 --window-ms 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import socketio
+
+from common import free_port, start_server
+
+# Pares en salas ad hoc, sin llamadas detrás
+os.environ.setdefault("SIO_REQUIRE_AUTH", "false")
+
+
+async def connect_pairs(base_url: str, pairs: int):
+    received = {"messages": 0, "candidates": 0}
+    clients = []
+    for i in range(pairs):
+        a = socketio.AsyncClient()
+        b = socketio.AsyncClient()
+
+        @b.on("signal")
+        async def on_signal(data):
+            received["messages"] += 1
+            if data["type"] == "candidate":
+                received["candidates"] += 1
+
+        @b.on("signal-batch")
+        async def on_signal_batch(data):
+            received["messages"] += 1
+            received["candidates"] += len(data["payloads"])
+
+        for client in (a, b):
+            await client.connect(base_url, transports=["websocket"])
+            await client.call("join", {"room": f"batch-{i}"})
+        clients.append((a, b))
+    return clients, received
+
+
+async def burst(clients, received, candidates: int):
+    received["messages"] = received["candidates"] = 0
+    expected = len(clients) * candidates
+    cpu = time.process_time()
+    started = time.perf_counter()
+
+    async def send(a, b):
+        to = b.get_sid()
+        for n in range(candidates):
+            payload = {"candidate": f"candidate:{n} 1 udp 2122260223 10.0.0.1 {50000 + n} typ host"}
+            await a.emit("relay", {"to": to, "type": "candidate", "payload": payload})
+        await a.emit("relay", {"to": to, "type": "end-of-candidates"})
+
+    await asyncio.gather(*(send(a, b) for a, b in clients))
+    while received["candidates"] < expected and time.perf_counter() - started < 30:
+        await asyncio.sleep(0.005)
+    delivery = time.perf_counter() - started
+    cpu = time.process_time() - cpu
+    await asyncio.sleep(0.2)  # deja llegar los end-of-candidates
+    return {
+        "candidates": received["candidates"],
+        "messages": received["messages"],
+        "delivery_ms": round(delivery * 1000, 1),
+        "cpu_ms": round(cpu * 1000, 1),
+    }
+
+
+async def main(args):
+    port = free_port()
+    server = await start_server(port)
+
+    from app import main as app_main
+    from app.signal_batch import CandidateBatcher
+
+    clients, received = await connect_pairs(f"http://127.0.0.1:{port}", args.pairs)
+
+    signaling = app_main.signaling
+    signaling.candidate_batcher = None
+    unbatched = await burst(clients, received, args.candidates)
+
+    signaling.candidate_batcher = CandidateBatcher(
+        window=args.window_ms / 1000,
+        max_candidates=args.max_candidates,
+        send=signaling._send_candidate_batch,
+    )
+    batched = await burst(clients, received, args.candidates)
+
+    for a, b in clients:
+        await a.disconnect()
+        await b.disconnect()
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+    print(
+        json.dumps(
+            {
+                "pairs": args.pairs,
+                "candidates_per_pair": args.candidates,
+                "window_ms": args.window_ms,
+                "unbatched": unbatched,
+                "batched": batched,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--window-ms", type=int, default=20)
+    parser.add_argument("--max-candidates", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
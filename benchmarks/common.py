@@ -0,0 +1,87 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import uuid
+from pathlib import Path
+from typing import Dict, List
+
+import httpx
+import uvicorn
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def conninfo(url, dbname: str) -> str:
+    return (
+        f"host={url.host} port={url.port or 5432} user={url.username} "
+        f"password={url.password} dbname={dbname}"
+    )
+
+
+def recreate_database(url):
+    # Base descartable para el benchmark, con el esquema de alembic
+    import psycopg
+
+    with psycopg.connect(conninfo(url, "postgres"), autocommit=True) as conn:
+        conn.execute(f'DROP DATABASE IF EXISTS "{url.database}"')
+        conn.execute(f'CREATE DATABASE "{url.database}"')
+    subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=ROOT,
+        env={**os.environ, "POSTGRES_DB": url.database},
+        check=True,
+        capture_output=True,
+    )
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start_server(port: int) -> uvicorn.Server:
+    # La app corre en el mismo proceso y event loop que el benchmark
+    config = uvicorn.Config(
+        "app.main:app", host="127.0.0.1", port=port, log_level="warning", lifespan="on"
+    )
+    server = uvicorn.Server(config)
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"count": 0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": pick(0.50),
+        "p95_ms": pick(0.95),
+        "p99_ms": pick(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+async def create_user(client: httpx.AsyncClient, role: str, password: str = "bench-secret"):
+    email = f"bench-{role}-{uuid.uuid4().hex[:12]}@example.com"
+    resp = await client.post(
+        "/auth/register",
+        json={"email": email, "full_name": f"Bench {role}", "password": password, "role": role},
+    )
+    resp.raise_for_status()
+    resp = await client.post("/auth/token", data={"username": email, "password": password})
+    resp.raise_for_status()
+    return {"Authorization": f"Bearer {resp.json()['access_token']}"}
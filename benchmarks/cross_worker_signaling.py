@@ -0,0 +1,152 @@
+"""Señalización entre dos workers en el mismo proceso.
+
+Levanta dos ``AsyncServer`` de ``create_sio`` sobre el bus ``memory://``,
+cada uno con su propio ``SignalingNamespace`` (el de ``app.main`` y uno
+nuevo) y la misma membresía de salas, como harían dos workers con Redis.
+Un peer se une en cada worker y se comprueba que ``peer-joined``,
+``signal`` y ``peer-left`` cruzan de un worker al otro; además mide la
+latencia de ``relay`` entre workers.
+
+No necesita base de datos: los sockets son anónimos
+(``SIO_REQUIRE_AUTH=false``) y los participants quedan en el buffer.
+
+Uso:
+    python benchmarks/cross_worker_signaling.py --signals 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Antes de importar la app: la configuración se lee al importar
+os.environ.update(
+    SIO_MESSAGE_QUEUE="memory://",
+    SIO_REQUIRE_AUTH="false",
+    SIO_RESUME_GRACE_SECONDS="0",
+    SIGNAL_BATCH_WINDOW_MS="0",
+    LOG_LEVEL="WARNING",
+)
+
+import socketio
+import uvicorn
+
+from common import free_port, percentiles
+
+
+class Peer:
+    def __init__(self, name: str):
+        self.name = name
+        self.client = socketio.AsyncClient()
+        self.events = []
+        self.changed = asyncio.Event()
+        for event in ("peer-joined", "peer-left", "signal"):
+            self.client.on(event, self._on_event(event))
+
+    def _on_event(self, event: str):
+        async def handler(data):
+            self.events.append((event, data, time.perf_counter()))
+            self.changed.set()
+
+        return handler
+
+    async def wait_for(self, event: str, predicate=lambda data: True, timeout: float = 5.0):
+        deadline = time.perf_counter() + timeout
+        while True:
+            for name, data, at in self.events:
+                if name == event and predicate(data):
+                    return data, at
+            self.changed.clear()
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise AssertionError(f"{self.name}: no llegó {event}")
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def serve(asgi_app, port: int) -> uvicorn.Server:
+    config = uvicorn.Config(asgi_app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    return server
+
+
+async def main(args):
+    from app import main as app_main
+    from app.realtime import create_sio
+
+    # Worker A: el servidor de la app. Worker B: otro AsyncServer con su
+    # propio namespace de señalización y la misma membresía de salas
+    sio_b = create_sio()
+    sio_b.register_namespace(
+        app_main.SignalingNamespace(app_main.room_store, app_main.participant_writer)
+    )
+    ports = free_port(), free_port()
+    servers = [
+        await serve(socketio.ASGIApp(app_main.sio), ports[0]),
+        await serve(socketio.ASGIApp(sio_b), ports[1]),
+    ]
+    alice, bob = Peer("alice"), Peer("bob")
+    room = "cross-worker"
+    try:
+        await alice.client.connect(f"http://127.0.0.1:{ports[0]}", transports=["websocket"])
+        await bob.client.connect(f"http://127.0.0.1:{ports[1]}", transports=["websocket"])
+        alice_sid, bob_sid = alice.client.get_sid(), bob.client.get_sid()
+
+        await alice.client.call("join", {"room": room})
+        ack = await bob.client.call("join", {"room": room})
+        assert ack["ok"] and ack["peers"] == [alice_sid], ack
+        await alice.wait_for("peer-joined", lambda d: d["sid"] == bob_sid)
+
+        # Offer de B hacia A y answer de vuelta
+        await bob.client.emit("relay", {"to": alice_sid, "type": "offer", "payload": {"sdp": "o"}})
+        offer, _ = await alice.wait_for("signal", lambda d: d["type"] == "offer")
+        assert offer["from"] == bob_sid and offer["payload"] == {"sdp": "o"}, offer
+        await alice.client.emit("relay", {"to": bob_sid, "type": "answer", "payload": {"sdp": "a"}})
+        answer, _ = await bob.wait_for("signal", lambda d: d["type"] == "answer")
+        assert answer["from"] == alice_sid, answer
+
+        # Latencia de relay A -> B, de a una señal por vez
+        latencies = []
+        for n in range(args.signals):
+            sent = time.perf_counter()
+            await alice.client.emit("relay", {"to": bob_sid, "type": "candidate", "payload": {"n": n}})
+            _, at = await bob.wait_for("signal", lambda d, n=n: d.get("payload") == {"n": n})
+            latencies.append(at - sent)
+
+        await bob.client.disconnect()
+        left, _ = await alice.wait_for("peer-left")
+        assert left["sid"] == bob_sid, left
+        assert await app_main.room_store.members(room) == [alice_sid]
+    finally:
+        for peer in (alice, bob):
+            if peer.client.connected:
+                await peer.client.disconnect()
+        for server in servers:
+            server.should_exit = True
+        await asyncio.sleep(0.2)
+
+    print(
+        json.dumps(
+            {
+                "checks": ["peer-joined", "signal", "peer-left"],
+                "cross_worker_relay": percentiles(latencies),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--signals", type=int, default=200)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except AssertionError as exc:
+        print(f"FAIL {exc}", file=sys.stderr)
+        sys.exit(1)
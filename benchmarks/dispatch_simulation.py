@@ -0,0 +1,287 @@
+"""Tiempo hasta la asignación (time-to-assign) con llegadas en ráfagas, por
+modo de despacho: ``manual`` (médicos que consultan ``/calls/waiting`` y
+toman la primera), ``auto`` (despacho en la base) y ``engine`` (motor en
+memoria por prioridad).
+
+Cada modo corre en un servidor uvicorn aparte sobre una base recién creada
+(``<POSTGRES_DB>_dispatch``). Los pacientes llegan en ráfagas, esperan el
+``call-updated`` de su llamada con estado asignado, simulan la consulta y
+la terminan, lo que libera al médico. Una fracción de las llamadas pide
+prioridad (``metadata.priority``); el tiempo se reporta también por clase.
+Además mide el costo por emparejamiento del motor en proceso.
+
+Uso:
+    python benchmarks/dispatch_simulation.py --doctors 10 --bursts 4 --burst-size 50
+    python benchmarks/dispatch_simulation.py --modes engine --urgent-share 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+import socketio
+from sqlalchemy.engine import make_url
+
+import common
+from app.config import settings
+from app.db import DATABASE_URL
+from common import create_user, free_port, percentiles
+
+INTERNAL_TOKEN = "dispatch-simulation-bench"
+URGENT_PRIORITY = 5
+ASSIGNED_STATUSES = ("assigned", "ringing", "in_progress")
+
+
+def socket_auth(headers) -> dict:
+    return {"token": headers["Authorization"].partition(" ")[2]}
+
+
+class CallWatcher:
+    """Socket.IO autenticado que resuelve futures por (call_id, estados)."""
+
+    def __init__(self):
+        self.client = socketio.AsyncClient()
+        self._waiters = []
+        self.client.on("call-updated", self._on_call_updated)
+
+    async def _on_call_updated(self, call):
+        for waiter in list(self._waiters):
+            call_id, statuses, future = waiter
+            if call["id"] == call_id and call["status"] in statuses and not future.done():
+                future.set_result(call)
+                self._waiters.remove(waiter)
+
+    async def wait_for(self, call_id: int, statuses, timeout: float):
+        future = asyncio.get_running_loop().create_future()
+        waiter = (call_id, statuses, future)
+        self._waiters.append(waiter)
+        # La suscripción devuelve el estado actual: cubre la transición que
+        # haya ocurrido antes de suscribirse
+        ack = await self.client.call("subscribe-call", {"call_id": call_id})
+        if ack.get("ok") and ack["call"]["status"] in statuses and not future.done():
+            future.set_result(ack["call"])
+            self._waiters.remove(waiter)
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+
+async def patient(client, headers, watcher: CallWatcher, priority: int, args, results):
+    started = time.perf_counter()
+    resp = await client.post(
+        "/calls/request", json={"metadata": {"priority": priority}}, headers=headers
+    )
+    resp.raise_for_status()
+    call = resp.json()
+    try:
+        if call["status"] not in ASSIGNED_STATUSES:
+            call = await watcher.wait_for(call["id"], ASSIGNED_STATUSES, args.timeout)
+    except asyncio.TimeoutError:
+        results.append({"priority": priority, "seconds": None})
+        await client.post(f"/calls/{call['id']}/end", headers=headers)
+        return
+    results.append({"priority": priority, "seconds": time.perf_counter() - started})
+    await asyncio.sleep(random.uniform(args.service * 0.5, args.service * 1.5))
+    (await client.post(f"/calls/{call['id']}/end", headers=headers)).raise_for_status()
+
+
+async def manual_doctor(client, headers, watcher: CallWatcher, stop: asyncio.Event, args):
+    # Lista la cola, toma la primera y espera a que termine la consulta
+    while not stop.is_set():
+        waiting = (await client.get("/calls/waiting", params={"limit": 1}, headers=headers)).json()
+        if waiting:
+            resp = await client.post(f"/calls/{waiting[0]['id']}/claim", headers=headers)
+            if resp.status_code == 200:
+                call_id = resp.json()["id"]
+                try:
+                    await watcher.wait_for(call_id, ("ended", "cancelled"), args.timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+        try:
+            await asyncio.wait_for(stop.wait(), args.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def wait_ready(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(400):
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+def summarize(results, elapsed: float) -> dict:
+    assigned = [r for r in results if r["seconds"] is not None]
+    by_class = {}
+    for name, match in (("urgent", lambda p: p > 0), ("normal", lambda p: p == 0)):
+        by_class[name] = percentiles([r["seconds"] for r in assigned if match(r["priority"])])
+    return {
+        "calls": len(results),
+        "assigned": len(assigned),
+        "timed_out": len(results) - len(assigned),
+        "elapsed_seconds": round(elapsed, 1),
+        "time_to_assign": percentiles([r["seconds"] for r in assigned]),
+        "by_priority": by_class,
+    }
+
+
+async def run_mode(mode: str, args) -> dict:
+    url = make_url(DATABASE_URL).set(database=args.database)
+    common.recreate_database(url)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "POSTGRES_DB": args.database,
+        "DISPATCH_MODE": mode,
+        "LOG_LEVEL": "WARNING",
+        "BCRYPT_ROUNDS": "4",
+        "CALL_REAPER_INTERVAL_SECONDS": "0",
+        "INTERNAL_API_TOKEN": INTERNAL_TOKEN,
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=common.ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    watchers = []
+    try:
+        await wait_ready(base_url)
+        limits = httpx.Limits(max_connections=args.burst_size + args.doctors)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+            doctors = [await create_user(client, "doctor") for _ in range(args.doctors)]
+            patients = [
+                await create_user(client, "patient") for _ in range(args.bursts * args.burst_size)
+            ]
+
+            async def connect(headers):
+                watcher = CallWatcher()
+                await watcher.client.connect(
+                    base_url, transports=["websocket"], auth=socket_auth(headers)
+                )
+                watchers.append(watcher)
+                return watcher
+
+            doctor_watchers = [await connect(h) for h in doctors]
+            patient_watchers = [await connect(h) for h in patients]
+
+            stop = asyncio.Event()
+            agents = []
+            if mode == "manual":
+                agents = [
+                    asyncio.create_task(manual_doctor(client, h, w, stop, args))
+                    for h, w in zip(doctors, doctor_watchers)
+                ]
+
+            rng = random.Random(args.seed)
+            results = []
+            tasks = []
+            started = time.perf_counter()
+            for burst in range(args.bursts):
+                # Ráfaga: burst_size llegadas repartidas en burst_spread segundos
+                for i in range(args.burst_size):
+                    n = burst * args.burst_size + i
+                    priority = URGENT_PRIORITY if rng.random() < args.urgent_share else 0
+                    delay = burst * args.burst_gap + rng.uniform(0, args.burst_spread)
+
+                    async def arrive(n=n, priority=priority, delay=delay):
+                        await asyncio.sleep(delay)
+                        await patient(client, patients[n], patient_watchers[n], priority, args, results)
+
+                    tasks.append(asyncio.create_task(arrive()))
+            await asyncio.gather(*tasks)
+            elapsed = time.perf_counter() - started
+            stop.set()
+            await asyncio.gather(*agents)
+
+            summary = summarize(results, elapsed)
+            if mode == "engine":
+                resp = await client.get(
+                    "/internal/dispatch", headers={"X-Internal-Token": INTERNAL_TOKEN}
+                )
+                summary["engine"] = resp.json()
+    finally:
+        for watcher in watchers:
+            if watcher.client.connected:
+                await watcher.client.disconnect()
+        server.terminate()
+        server.wait()
+    return summary
+
+
+def engine_ops(n: int) -> dict:
+    # Costo del motor en proceso: n llamadas en espera y n médicos libres
+    from app.matching import MatchingEngine
+
+    engine = MatchingEngine()
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for call_id in range(n):
+        engine._push_call(call_id, rng.choice((0, 0, 0, URGENT_PRIORITY)), rng.random())
+    for doctor in range(n):
+        engine.set_available(f"d{doctor}", True, rng.random())
+    loaded = time.perf_counter() - started
+    started = time.perf_counter()
+    matched = 0
+    while engine.pop() is not None:
+        matched += 1
+    popped = time.perf_counter() - started
+    return {
+        "n": n,
+        "insert_us": round(loaded / (2 * n) * 1e6, 2),
+        "match_us": round(popped / max(matched, 1) * 1e6, 2),
+    }
+
+
+async def main(args):
+    results = {}
+    for mode in args.modes.split(","):
+        results[mode] = await run_mode(mode, args)
+    print(
+        json.dumps(
+            {
+                "doctors": args.doctors,
+                "bursts": args.bursts,
+                "burst_size": args.burst_size,
+                "burst_gap_seconds": args.burst_gap,
+                "service_seconds": args.service,
+                "urgent_share": args.urgent_share,
+                "modes": results,
+                "engine_ops": engine_ops(args.engine_ops),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", default="manual,auto,engine")
+    parser.add_argument("--doctors", type=int, default=10)
+    parser.add_argument("--bursts", type=int, default=4)
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--burst-gap", type=float, default=5.0, help="segundos entre ráfagas")
+    parser.add_argument("--burst-spread", type=float, default=0.5, help="duración de cada ráfaga")
+    parser.add_argument("--service", type=float, default=1.0, help="duración media de la consulta")
+    parser.add_argument("--urgent-share", type=float, default=0.1)
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="modo manual")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--engine-ops", type=int, default=100_000)
+    parser.add_argument("--database", default=f"{settings.POSTGRES_DB}_dispatch")
+    asyncio.run(main(parser.parse_args()))
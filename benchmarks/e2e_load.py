@@ -0,0 +1,301 @@
+"""Carga de punta a punta: N pares paciente/médico recorren el flujo completo.
+
+login -> /calls/request -> /calls/waiting -> claim -> start -> Socket.IO join
++ offer/answer/ICE por relay -> end. Reporta throughput y p50/p95/p99 por
+paso y guarda el resultado en JSON; con ``--compare`` marca los pasos cuyo
+p95 empeoró más de ``--threshold`` respecto a una corrida anterior.
+
+Uso:
+    python benchmarks/e2e_load.py --pairs 50 --concurrency 20
+    python benchmarks/e2e_load.py --pairs 50 --compare benchmarks/results/anterior.json
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+import socketio
+
+from common import ROOT, free_port, percentiles, start_server
+
+PASSWORD = "bench-secret"
+STEPS = (
+    "login",
+    "request",
+    "waiting",
+    "claim",
+    "start",
+    "sio_connect",
+    "join",
+    "offer_answer",
+    "ice",
+    "end",
+)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+
+    async def timed(self, step: str, coro):
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except Exception:
+            self.errors[step] += 1
+            raise
+        self.latencies[step].append(time.perf_counter() - started)
+        return result
+
+
+async def register(client: httpx.AsyncClient, role: str) -> str:
+    email = f"e2e-{role}-{uuid.uuid4().hex[:12]}@example.com"
+    resp = await client.post(
+        "/auth/register",
+        json={"email": email, "full_name": f"E2E {role}", "password": PASSWORD, "role": role},
+    )
+    resp.raise_for_status()
+    return email
+
+
+async def post(client: httpx.AsyncClient, url: str, **kwargs):
+    resp = await client.post(url, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def get(client: httpx.AsyncClient, url: str, **kwargs):
+    resp = await client.get(url, **kwargs)
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def login(client: httpx.AsyncClient, email: str):
+    token = await post(client, "/auth/token", data={"username": email, "password": PASSWORD})
+    return {"Authorization": f"Bearer {token['access_token']}"}
+
+
+def socket_auth(headers) -> dict:
+    # El JWT va en el handshake de Socket.IO, no por evento
+    return {"token": headers["Authorization"].partition(" ")[2]}
+
+
+async def signaling(
+    rec: Recorder, base_url: str, room: str, candidates: int, doctor_auth: dict, patient_auth: dict
+):
+    doctor = socketio.AsyncClient()
+    patient = socketio.AsyncClient()
+    inbox = {"doctor": asyncio.Queue(), "patient": asyncio.Queue()}
+    ice_received = {"doctor": 0, "patient": 0}
+    ice_done = asyncio.Event()
+
+    def bind(client: socketio.AsyncClient, name: str):
+        @client.on("signal")
+        async def on_signal(data):
+            if data["type"] == "candidate":
+                count(name, 1)
+            elif data["type"] != "end-of-candidates":
+                await inbox[name].put(data)
+
+        @client.on("signal-batch")
+        async def on_signal_batch(data):
+            count(name, len(data["payloads"]))
+
+    def count(name: str, n: int):
+        ice_received[name] += n
+        if all(v >= candidates for v in ice_received.values()):
+            ice_done.set()
+
+    bind(doctor, "doctor")
+    bind(patient, "patient")
+    try:
+        await rec.timed(
+            "sio_connect",
+            asyncio.gather(
+                doctor.connect(base_url, transports=["websocket"], auth=doctor_auth),
+                patient.connect(base_url, transports=["websocket"], auth=patient_auth),
+            ),
+        )
+        await rec.timed("join", doctor.call("join", {"room": room}))
+        await rec.timed("join", patient.call("join", {"room": room}))
+
+        async def offer_answer():
+            await doctor.emit(
+                "relay", {"to": patient.get_sid(), "type": "offer", "payload": {"sdp": "offer"}}
+            )
+            offer = await inbox["patient"].get()
+            await patient.emit(
+                "relay", {"to": offer["from"], "type": "answer", "payload": {"sdp": "answer"}}
+            )
+            await inbox["doctor"].get()
+
+        await rec.timed("offer_answer", asyncio.wait_for(offer_answer(), 10))
+
+        async def ice():
+            for sender, receiver in ((doctor, patient), (patient, doctor)):
+                to = receiver.get_sid()
+                for n in range(candidates):
+                    payload = {"candidate": f"candidate:{n} 1 udp 2122260223 10.0.0.1 {50000 + n} typ host"}
+                    await sender.emit("relay", {"to": to, "type": "candidate", "payload": payload})
+                await sender.emit("relay", {"to": to, "type": "end-of-candidates"})
+            await ice_done.wait()
+
+        if candidates:
+            await rec.timed("ice", asyncio.wait_for(ice(), 10))
+    finally:
+        await doctor.disconnect()
+        await patient.disconnect()
+
+
+async def flow(rec: Recorder, client, base_url: str, pair, candidates: int):
+    patient_email, doctor_email = pair
+    patient = await rec.timed("login", login(client, patient_email))
+    doctor = await rec.timed("login", login(client, doctor_email))
+
+    call = await rec.timed("request", post(client, "/calls/request", json={}, headers=patient))
+    await rec.timed("waiting", get(client, "/calls/waiting", headers=doctor))
+    if call["status"] == "waiting":
+        # Con DISPATCH_MODE=auto la llamada puede llegar ya asignada
+        call = await rec.timed(
+            "claim", post(client, f"/calls/{call['id']}/claim", headers=doctor)
+        )
+    call_doctor = doctor if call["doctor_id"] else patient
+    await rec.timed("start", post(client, f"/calls/{call['id']}/start", headers=call_doctor))
+
+    await signaling(
+        rec, base_url, call["room_id"], candidates, socket_auth(doctor), socket_auth(patient)
+    )
+
+    await rec.timed("end", post(client, f"/calls/{call['id']}/end", headers=patient))
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(current: dict, previous: dict, threshold: float) -> dict:
+    regressions = {}
+    for step, stats in current["steps"].items():
+        before = previous.get("steps", {}).get(step)
+        if not before or not before["p95_ms"]:
+            continue
+        ratio = stats["p95_ms"] / before["p95_ms"]
+        if ratio > 1 + threshold:
+            regressions[step] = {
+                "p95_ms_before": before["p95_ms"],
+                "p95_ms_now": stats["p95_ms"],
+                "ratio": round(ratio, 2),
+            }
+    return regressions
+
+
+async def run(args) -> dict:
+    from app.config import settings
+
+    port = free_port()
+    server = await start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+    rec = Recorder()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        pairs = [
+            (await register(client, "patient"), await register(client, "doctor"))
+            for _ in range(args.pairs)
+        ]
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+        failures = Counter()
+
+        async def guarded(pair):
+            async with semaphore:
+                try:
+                    await flow(rec, client, base_url, pair, args.candidates)
+                except Exception as exc:
+                    failures[type(exc).__name__] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(guarded(pair) for pair in pairs))
+        elapsed = time.perf_counter() - started
+
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+
+    steps = {}
+    for step in STEPS:
+        samples = rec.latencies.get(step)
+        if not samples:
+            continue
+        stats = {key: round(value, 2) for key, value in percentiles(samples).items()}
+        stats["per_second"] = round(len(samples) / elapsed, 1)
+        stats["errors"] = rec.errors[step]
+        steps[step] = stats
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "pairs": args.pairs,
+            "concurrency": args.concurrency,
+            "candidates": args.candidates,
+            "settings": {
+                "DISPATCH_MODE": settings.DISPATCH_MODE,
+                "BCRYPT_ROUNDS": settings.BCRYPT_ROUNDS,
+                "SIGNAL_BATCH_WINDOW_MS": settings.SIGNAL_BATCH_WINDOW_MS,
+                "SIO_MESSAGE_QUEUE": settings.SIO_MESSAGE_QUEUE,
+            },
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        "flows_completed": len(rec.latencies.get("end", [])),
+        "flows_per_second": round(len(rec.latencies.get("end", [])) / elapsed, 2),
+        "failures": dict(failures),
+        "steps": steps,
+    }
+
+
+def main(args):
+    result = asyncio.run(run(args))
+    if args.compare:
+        previous = json.loads(Path(args.compare).read_text())
+        result["regressions"] = compare(result, previous, args.threshold)
+
+    output = Path(args.output) if args.output else (
+        ROOT / "benchmarks" / "results"
+        / f"e2e-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{result['meta']['revision']}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2))
+
+    print(json.dumps(result, indent=2))
+    print(f"resultado guardado en {output}", file=sys.stderr)
+    if result.get("regressions") or result["failures"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=10, help="candidatos ICE por peer")
+    parser.add_argument("--output", help="archivo JSON de salida")
+    parser.add_argument("--compare", help="JSON de una corrida anterior")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="aumento de p95 tolerado (0.2 = 20%%)"
+    )
+    main(parser.parse_args())
@@ -0,0 +1,214 @@
+"""Regresión de planes: EXPLAIN de las consultas calientes de calls sobre una
+base sembrada con 1M de llamadas; termina con código 1 si alguna recorre
+``calls`` con Seq Scan.
+
+Crea (o reutiliza con ``--reuse``) la base ``<POSTGRES_DB>_explain``, aplica
+las migraciones con alembic y siembra usuarios, salas y llamadas con
+``generate_series``. Las consultas son las mismas que arman los endpoints,
+el dispatch y el reaper.
+
+Uso:
+    python benchmarks/explain_hot_queries.py --rows 1000000
+    python benchmarks/explain_hot_queries.py --reuse
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg
+from sqlalchemy import create_engine, select, tuple_
+from sqlalchemy.engine import make_url
+
+import common
+from app import models
+from app.config import settings
+from app.db import DATABASE_URL
+from app.dispatch import _next_available_doctor, _oldest_waiting_call
+from app.reaper import _stale_condition
+
+Call = models.Call
+Status = models.CallStatus
+
+# Reparto de estados (fracción de filas); el resto queda "ended"
+ACTIVE_SHARE = {"waiting": 0.01, "assigned": 0.002, "in_progress": 0.003}
+CANCELLED_SHARE = 0.05
+
+SEED_SQL = """
+INSERT INTO users (id, email, full_name, role, password_hash, is_active, is_available)
+SELECT 'd' || g, 'd' || g || '@explain.local', 'Doctor ' || g, 'doctor', 'x', true, g %% 2 = 0
+FROM generate_series(1, %(doctors)s) g;
+
+INSERT INTO users (id, email, full_name, role, password_hash, is_active, is_available)
+SELECT 'p' || g, 'p' || g || '@explain.local', 'Paciente ' || g, 'patient', 'x', true, false
+FROM generate_series(1, %(patients)s) g;
+
+INSERT INTO rooms (id) SELECT 'r' || g FROM generate_series(0, 999) g;
+
+-- Las llamadas activas son las primeras filas: un paciente distinto cada una
+INSERT INTO calls (
+    room_id, patient_id, doctor_id, status, requested_at, assigned_at, started_at,
+    ended_at, duration_seconds, total_reconnects
+)
+SELECT
+    'r' || (g %% 1000),
+    'p' || (g %% %(patients)s + 1),
+    CASE WHEN status <> 'waiting' THEN 'd' || (g %% %(doctors)s + 1) END,
+    status::callstatus,
+    requested_at,
+    CASE WHEN status <> 'waiting' THEN requested_at + interval '30 seconds' END,
+    CASE WHEN status IN ('in_progress', 'ended') THEN requested_at + interval '1 minute' END,
+    CASE WHEN status IN ('ended', 'cancelled') THEN requested_at + interval '10 minutes' END,
+    CASE WHEN status = 'ended' THEN 540 ELSE 0 END,
+    g %% 3
+FROM (
+    SELECT
+        g,
+        CASE
+            WHEN g <= %(waiting)s THEN 'waiting'
+            WHEN g <= %(assigned)s THEN 'assigned'
+            WHEN g <= %(in_progress)s THEN 'in_progress'
+            WHEN g <= %(cancelled)s THEN 'cancelled'
+            ELSE 'ended'
+        END AS status,
+        CASE
+            WHEN g <= %(in_progress)s THEN now() - random() * interval '2 hours'
+            ELSE now() - random() * interval '365 days'
+        END AS requested_at
+    FROM generate_series(1, %(rows)s) g
+) seeded;
+"""
+
+
+def seeded_rows(url) -> int:
+    try:
+        with psycopg.connect(common.conninfo(url, url.database)) as conn:
+            return conn.execute("SELECT count(*) FROM calls").fetchone()[0]
+    except psycopg.Error:
+        return 0
+
+
+def prepare(url, rows: int):
+    started = time.perf_counter()
+    common.recreate_database(url)
+    active = 0
+    bounds = {}
+    for status, share in ACTIVE_SHARE.items():
+        active += int(rows * share)
+        bounds[status] = active
+    patients = max(active * 2, 100_000)
+    params = {
+        "rows": rows,
+        "doctors": 500,
+        "patients": patients,
+        **bounds,
+        "cancelled": active + int(rows * CANCELLED_SHARE),
+    }
+    with psycopg.connect(common.conninfo(url, url.database)) as conn:
+        for statement in SEED_SQL.split(";\n\n"):
+            conn.execute(statement, params)
+        conn.commit()
+        conn.autocommit = True
+        conn.execute("VACUUM ANALYZE")
+    return round(time.perf_counter() - started, 1)
+
+
+def hot_queries(now: datetime):
+    active = list(models.ACTIVE_CALL_STATUSES)
+    ttls = {
+        Status.waiting: settings.CALL_WAITING_TTL_SECONDS,
+        Status.assigned: settings.CALL_ASSIGNED_TTL_SECONDS,
+        Status.ringing: settings.CALL_ASSIGNED_TTL_SECONDS,
+        Status.in_progress: settings.CALL_IN_PROGRESS_TTL_SECONDS,
+        Status.reconnecting: settings.CALL_RECONNECTING_TTL_SECONDS,
+    }
+    waiting = (
+        select(Call)
+        .where(Call.status == Status.waiting)
+        .order_by(Call.requested_at.asc(), Call.id.asc())
+        .limit(101)
+    )
+    return {
+        # request_call: la unicidad la decide ix_calls_patient_active
+        "patient_active_call": select(Call.id)
+        .where(Call.patient_id == "p42", Call.status.in_(active))
+        .limit(1),
+        "waiting_first_page": waiting,
+        "waiting_cursor_page": waiting.where(
+            tuple_(Call.requested_at, Call.id) > tuple_(now - timedelta(minutes=30), 5000)
+        ),
+        "dispatch_oldest_waiting": _oldest_waiting_call(),
+        "dispatch_next_doctor": _next_available_doctor(),
+        "patient_history": select(Call)
+        .where(Call.patient_id == "p42")
+        .order_by(Call.requested_at.desc(), Call.id.desc())
+        .limit(51),
+        "doctor_history_by_status": select(Call)
+        .where(Call.doctor_id == "d7", Call.status.in_([Status.ended]))
+        .order_by(Call.requested_at.desc(), Call.id.desc())
+        .limit(51),
+        "doctor_busy": select(Call.id)
+        .where(Call.doctor_id == "d7", Call.status.in_([Status.assigned, Status.in_progress]))
+        .limit(1),
+        "reaper_stale_calls": select(Call.id).where(_stale_condition(ttls, now)).limit(500),
+    }
+
+
+def walk(plan, seq_scans, indexes):
+    if plan["Node Type"] == "Seq Scan" and plan.get("Relation Name") == Call.__tablename__:
+        seq_scans.append(plan["Relation Name"])
+    if "Index Name" in plan:
+        indexes.add(plan["Index Name"])
+    for child in plan.get("Plans", ()):
+        walk(child, seq_scans, indexes)
+
+
+def main(args):
+    url = make_url(DATABASE_URL).set(database=args.database)
+    rows = seeded_rows(url) if args.reuse else 0
+    seed_seconds = None
+    if rows < args.rows:
+        seed_seconds = prepare(url, args.rows)
+        rows = args.rows
+
+    engine = create_engine(url)
+    now = datetime.now(timezone.utc)
+    report = {}
+    failed = []
+    with engine.connect() as conn:
+        for name, stmt in hot_queries(now).items():
+            sql = stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar_one()[0]["Plan"]
+            seq_scans, indexes = [], set()
+            walk(plan, seq_scans, indexes)
+            report[name] = {
+                "ok": not seq_scans,
+                "indexes": sorted(indexes),
+                "total_cost": plan["Total Cost"],
+            }
+            if seq_scans:
+                failed.append(name)
+    engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "database": args.database,
+                "calls": rows,
+                "seed_seconds": seed_seconds,
+                "queries": report,
+                "seq_scans_on_calls": failed,
+            },
+            indent=2,
+        )
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--database", default=f"{settings.POSTGRES_DB}_explain")
+    parser.add_argument("--reuse", action="store_true", help="no resembrar si ya hay --rows llamadas")
+    main(parser.parse_args())
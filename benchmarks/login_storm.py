@@ -0,0 +1,90 @@
+"""Tormenta de logins (inicio de turno) y su efecto en la latencia de relay.
+
+Uso:
+    python benchmarks/login_storm.py --users 50 --logins 400 --concurrency 100
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+from common import free_port, percentiles, start_server
+from signaling_under_rest_load import connect_pair, measure_relay
+
+PASSWORD = "bench-secret"
+
+
+async def register(client: httpx.AsyncClient) -> str:
+    email = f"storm-{uuid.uuid4().hex[:12]}@example.com"
+    resp = await client.post(
+        "/auth/register",
+        json={"email": email, "full_name": "Bench storm", "password": PASSWORD, "role": "patient"},
+    )
+    resp.raise_for_status()
+    return email
+
+
+async def storm(client, emails, total: int, concurrency: int):
+    statuses = Counter()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            resp = await client.post(
+                "/auth/token",
+                data={"username": emails[i % len(emails)], "password": PASSWORD},
+            )
+            latencies.append(time.perf_counter() - started)
+            statuses[resp.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    return {
+        "statuses": dict(statuses),
+        "logins_per_second": round(total / elapsed, 1),
+        "latency": percentiles(latencies),
+    }
+
+
+async def main(args):
+    port = free_port()
+    server = await start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        emails = [await register(client) for _ in range(args.users)]
+        a, b, latencies = await connect_pair(base_url, "storm-room")
+        idle = await measure_relay(a, b, latencies, args.duration, args.interval)
+
+        storm_task = asyncio.create_task(storm(client, emails, args.logins, args.concurrency))
+        during = await measure_relay(a, b, latencies, args.duration, args.interval)
+        storm_result = await storm_task
+
+        await a.disconnect()
+        await b.disconnect()
+
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+    print(
+        json.dumps(
+            {"relay_idle": idle, "relay_during_storm": during, "login_storm": storm_result},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=0.005)
+    asyncio.run(main(parser.parse_args()))
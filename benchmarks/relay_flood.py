@@ -0,0 +1,185 @@
+"""Latencia del relay en salas normales mientras otro cliente inunda el
+servidor, con y sin límites de relay (``SIGNAL_RELAY_*``).
+
+El servidor (uvicorn) y los clientes que inundan corren en procesos aparte
+para que ni el flood ni la medición compartan event loop con el servidor.
+Los contadores de descartes salen de ``GET /internal/signaling``.
+
+Uso:
+    python benchmarks/relay_flood.py --victims 5 --flooders 2 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+import socketio
+
+from common import ROOT, free_port, percentiles
+
+INTERNAL_TOKEN = "relay-flood-bench"
+
+PROFILES = {
+    "unlimited": {"SIGNAL_RELAY_RATE_PER_SID": "0", "SIGNAL_RELAY_RATE_PER_ROOM": "0"},
+    "limited": {},
+}
+
+
+async def connect_pair(base_url: str, room: str, on_signal=None):
+    a = socketio.AsyncClient()
+    b = socketio.AsyncClient()
+    if on_signal is not None:
+        b.on("signal", on_signal)
+    for client in (a, b):
+        await client.connect(base_url, transports=["websocket"])
+        await client.call("join", {"room": room})
+    return a, b
+
+
+async def flood(base_url: str, duration: float):
+    # Proceso hijo: un par en su propia sala y relay sin pausa
+    a, b = await connect_pair(base_url, f"flood-{uuid.uuid4().hex[:8]}")
+    to = b.get_sid()
+    sent = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline and a.connected:
+        await a.emit("relay", {"to": to, "type": "candidate", "payload": {"n": sent}})
+        sent += 1
+        if sent % 100 == 0:
+            await asyncio.sleep(0)
+    disconnected = not a.connected
+    for client in (a, b):
+        if client.connected:
+            await client.disconnect()
+    print(json.dumps({"sent": sent, "disconnected_by_server": disconnected}))
+
+
+async def measure_victims(pairs, duration: float, interval: float):
+    latencies = []
+
+    async def send(a, b):
+        to = b.get_sid()
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            await a.emit("relay", {"to": to, "type": "candidate", "payload": {"t": time.perf_counter()}})
+            await asyncio.sleep(interval)
+
+    for _, _, received in pairs:
+        received.clear()
+    await asyncio.gather(*(send(a, b) for a, b, _ in pairs))
+    await asyncio.sleep(1.0)
+    for _, _, received in pairs:
+        latencies.extend(received)
+    return percentiles(latencies)
+
+
+async def wait_ready(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(200):
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+async def run_profile(name: str, args):
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "LOG_LEVEL": "WARNING",
+        "INTERNAL_API_TOKEN": INTERNAL_TOKEN,
+        # Salas ad hoc, sin llamadas detrás
+        "SIO_REQUIRE_AUTH": "false",
+        **PROFILES[name],
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_ready(base_url)
+        pairs = []
+        for i in range(args.victims):
+            received = []
+
+            def on_signal(data, received=received):
+                received.append(time.perf_counter() - data["payload"]["t"])
+
+            a, b = await connect_pair(base_url, f"victim-{i}", on_signal)
+            pairs.append((a, b, received))
+
+        idle = await measure_victims(pairs, args.duration, args.interval)
+
+        flooders = [
+            await asyncio.create_subprocess_exec(
+                sys.executable,
+                __file__,
+                "--flood",
+                base_url,
+                "--duration",
+                str(args.duration),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            for _ in range(args.flooders)
+        ]
+        # Margen para que el flood arranque antes de medir
+        await asyncio.sleep(0.5)
+        flooded = await measure_victims(pairs, args.duration - 0.5, args.interval)
+        flood_results = []
+        for proc in flooders:
+            out, _ = await proc.communicate()
+            flood_results.append(json.loads(out.decode().strip().splitlines()[-1]))
+
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            resp = await client.get("/internal/signaling", headers={"X-Internal-Token": INTERNAL_TOKEN})
+            counters = resp.json()["relay"]
+        for a, b, _ in pairs:
+            await a.disconnect()
+            await b.disconnect()
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "victims_idle": idle,
+        "victims_under_flood": flooded,
+        "flooders": flood_results,
+        "relay_counters": counters,
+    }
+
+
+async def main(args):
+    if args.flood:
+        await flood(args.flood, args.duration)
+        return
+    results = {}
+    for name in PROFILES:
+        results[name] = await run_profile(name, args)
+    print(
+        json.dumps(
+            {"victims": args.victims, "flooders": args.flooders, **results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--victims", type=int, default=5)
+    parser.add_argument("--flooders", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.05)
+    parser.add_argument("--flood", help=argparse.SUPPRESS)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""Throughput del relay Socket.IO según la configuración de logs.
+
+Cada perfil corre en un proceso aparte (la configuración se lee al importar
+la app) con los logs redirigidos a un archivo:
+
+- ``verbose``: como antes, todo a stdout de forma síncrona, un log por
+  relay y los loggers de Socket.IO/Engine.IO activos.
+- ``default``: logs por cola, candidatos muestreados y Engine.IO apagado.
+
+Uso:
+    python benchmarks/relay_throughput.py --pairs 20 --messages 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PROFILES = {
+    "verbose": {
+        "LOG_ASYNC": "false",
+        "LOG_FORMAT": "text",
+        "LOG_RELAY_SAMPLE_RATES": "{}",
+        "LOG_RELAY_SAMPLE_DEFAULT": "1",
+        "SIO_LOGGER": "true",
+        "SIO_ENGINEIO_LOGGER": "true",
+    },
+    "default": {},
+}
+# Mide el costo de los logs, no los límites de relay ni la autorización
+# de salas (los pares usan salas ad hoc)
+UNLIMITED_RELAY = {
+    "SIGNAL_RELAY_RATE_PER_SID": "0",
+    "SIGNAL_RELAY_RATE_PER_ROOM": "0",
+    "SIO_REQUIRE_AUTH": "false",
+}
+
+
+async def measure(args):
+    import socketio
+
+    from common import free_port, start_server
+
+    port = free_port()
+    server = await start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    received = [0]
+    pairs = []
+    for i in range(args.pairs):
+        a = socketio.AsyncClient()
+        b = socketio.AsyncClient()
+
+        @b.on("signal")
+        async def on_signal(data):
+            received[0] += 1
+
+        for client in (a, b):
+            await client.connect(base_url, transports=["websocket"])
+            await client.call("join", {"room": f"throughput-{i}"})
+        pairs.append((a, b))
+
+    async def send(a, b):
+        to = b.get_sid()
+        for n in range(args.messages):
+            typ = "candidate" if n % 10 else "offer"
+            await a.emit("relay", {"to": to, "type": typ, "payload": {"n": n}})
+
+    expected = args.pairs * args.messages
+    cpu = time.process_time()
+    started = time.perf_counter()
+    await asyncio.gather(*(send(a, b) for a, b in pairs))
+    while received[0] < expected and time.perf_counter() - started < 60:
+        await asyncio.sleep(0.005)
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu
+
+    for a, b in pairs:
+        await a.disconnect()
+        await b.disconnect()
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+    return {
+        "delivered": received[0],
+        "messages_per_second": round(received[0] / elapsed, 1),
+        "cpu_us_per_message": round(cpu / max(received[0], 1) * 1e6, 1),
+    }
+
+
+def run_profile(name: str, args) -> dict:
+    env = {**os.environ, **UNLIMITED_RELAY, **PROFILES[name]}
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        log_path = os.path.join(tmp, "server.log")
+        with open(log_path, "w") as log:
+            subprocess.run(
+                [
+                    sys.executable,
+                    __file__,
+                    "--child",
+                    result_path,
+                    "--pairs",
+                    str(args.pairs),
+                    "--messages",
+                    str(args.messages),
+                ],
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                check=True,
+            )
+        with open(result_path) as fh:
+            result = json.load(fh)
+        result["log_bytes"] = os.path.getsize(log_path)
+    return result
+
+
+def main(args):
+    if args.child:
+        result = asyncio.run(measure(args))
+        with open(args.child, "w") as fh:
+            json.dump(result, fh)
+        return
+    results = {name: run_profile(name, args) for name in PROFILES}
+    print(
+        json.dumps(
+            {"pairs": args.pairs, "messages_per_pair": args.messages, **results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pairs", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    main(parser.parse_args())
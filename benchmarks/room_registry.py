@@ -0,0 +1,101 @@
+"""Costo de join/disconnect del registro de salas con muchas salas activas.
+
+Compara el registro indexado (``MemoryRoomStore``) con el recorrido lineal
+que hacía ``disconnect`` antes, sin servidor ni base de datos.
+
+Uso:
+    python benchmarks/room_registry.py --rooms 100000 --ops 2000
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Dict, List, Set
+
+import common  # noqa: F401  (agrega la raíz del repo a sys.path)
+from app.realtime import MemoryRoomStore
+
+
+class LinearRoomStore:
+    # Implementación anterior: leave_all recorre todas las salas
+    def __init__(self):
+        self.rooms: Dict[str, Set[str]] = {}
+
+    async def join(self, room_id: str, sid: str) -> List[str]:
+        members = self.rooms.setdefault(room_id, set())
+        members.add(sid)
+        return [m for m in members if m != sid]
+
+    async def leave_all(self, sid: str) -> List[str]:
+        for room_id, members in list(self.rooms.items()):
+            if sid in members:
+                members.remove(sid)
+                if not members:
+                    self.rooms.pop(room_id, None)
+                return [room_id]
+        return []
+
+
+async def populate(store, rooms: int):
+    for i in range(rooms):
+        await store.join(f"room-{i}", f"a-{i}")
+        await store.join(f"room-{i}", f"b-{i}")
+
+
+async def measure(store, rooms: int, ops: int) -> Dict[str, float]:
+    await populate(store, rooms)
+    step = max(1, rooms // ops)
+    targets = list(range(0, rooms, step))[:ops]
+
+    started = time.perf_counter()
+    for i in targets:
+        await store.leave_all(f"a-{i}")
+    disconnect = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for i in targets:
+        await store.join(f"room-{i}", f"a-{i}")
+    join = time.perf_counter() - started
+
+    return {
+        "disconnect_us": round(disconnect / len(targets) * 1e6, 2),
+        "join_us": round(join / len(targets) * 1e6, 2),
+    }
+
+
+async def check_multi_room_leak():
+    # Un sid en varias salas: la versión lineal solo lo saca de la primera
+    result = {}
+    for name, store in (("linear", LinearRoomStore()), ("indexed", MemoryRoomStore())):
+        for room_id in ("r1", "r2", "r3"):
+            await store.join(room_id, "peer")
+            await store.join(room_id, "x")
+        await store.leave_all("x")
+        result[name] = sum("x" in members for members in store.rooms.values())
+    return result
+
+
+async def main(args):
+    linear = await measure(LinearRoomStore(), args.rooms, args.linear_ops)
+    indexed_store = MemoryRoomStore(max_members=2)
+    indexed = await measure(indexed_store, args.rooms, args.ops)
+    print(
+        json.dumps(
+            {
+                "rooms": args.rooms,
+                "linear": linear,
+                "indexed": indexed,
+                "indexed_counters": indexed_store.counters(),
+                "memberships_left_after_disconnect": await check_multi_room_leak(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=100_000)
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--linear-ops", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
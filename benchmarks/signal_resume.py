@@ -0,0 +1,155 @@
+"""Recuperación de la señalización tras un corte breve, con y sin ventana
+de reanudación (``SIO_RESUME_GRACE_SECONDS``).
+
+En cada prueba un par se une a una sala, uno de los dos pierde el socket y
+el otro le envía ``--signals`` candidatos durante el corte. Al reconectar:
+
+- ``resume``: el cliente manda ``resume`` con su token y recibe las señales
+  guardadas; se mide hasta tener todas.
+- ``no_resume``: el cliente vuelve a hacer ``join`` como peer nuevo, el otro
+  recibe ``peer-joined`` y renegocia (offer/answer); se mide hasta que llega
+  el answer. Las señales del corte se pierden. No incluye la nueva
+  recolección de candidatos ICE, que en un navegador suma segundos.
+
+Uso:
+    python benchmarks/signal_resume.py --trials 20 --signals 10 --gap 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import socketio
+
+from common import ROOT, free_port, percentiles
+
+PROFILES = {
+    "no_resume": {"SIO_RESUME_GRACE_SECONDS": "0"},
+    "resume": {},
+}
+
+
+class Peer:
+    def __init__(self):
+        self.client = socketio.AsyncClient()
+        self.signals = []
+        self.changed = asyncio.Event()
+        self.client.on("signal", self._on_event("signal"))
+        self.client.on("peer-joined", self._on_event("peer-joined"))
+
+    def _on_event(self, event: str):
+        async def handler(data):
+            self.signals.append((event, data))
+            self.changed.set()
+
+        return handler
+
+    async def wait_for(self, predicate, timeout: float = 5.0):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            self.changed.clear()
+            await asyncio.wait_for(self.changed.wait(), deadline - time.perf_counter())
+
+
+async def trial(base_url: str, n: int, args) -> dict:
+    room = f"resume-{n}"
+    a, b = Peer(), Peer()
+    for peer in (a, b):
+        await peer.client.connect(base_url, transports=["websocket"])
+    await a.client.call("join", {"room": room})
+    joined = await b.client.call("join", {"room": room})
+    b_peer = joined.get("peer_id", b.client.get_sid())
+
+    await b.client.disconnect()
+    await asyncio.sleep(0.05)  # el servidor procesa la desconexión
+    for i in range(args.signals):
+        await a.client.emit("relay", {"to": b_peer, "type": "candidate", "payload": {"n": i}})
+    await asyncio.sleep(args.gap)
+
+    b2 = Peer()
+    started = time.perf_counter()
+    await b2.client.connect(base_url, transports=["websocket"])
+    token = joined.get("resume_token")
+    resumed = token and (await b2.client.call("resume", {"token": token})).get("ok")
+    if resumed:
+        await b2.wait_for(lambda: len(b2.signals) >= args.signals)
+    else:
+        # Peer nuevo: el otro lado renegocia desde cero
+        a.signals.clear()
+        await b2.client.call("join", {"room": room})
+        await a.wait_for(lambda: any(e == "peer-joined" for e, _ in a.signals))
+        await a.client.emit("relay", {"to": b2.client.get_sid(), "type": "offer", "payload": {}})
+        await b2.wait_for(lambda: any(d.get("type") == "offer" for _, d in b2.signals))
+        await b2.client.emit("relay", {"to": a.client.get_sid(), "type": "answer", "payload": {}})
+        await a.wait_for(lambda: any(d.get("type") == "answer" for _, d in a.signals))
+    recovered = time.perf_counter() - started
+    received = sum(1 for _, d in b2.signals if d.get("type") == "candidate")
+
+    await b2.client.call("leave", {"room": room})
+    for peer in (a, b2):
+        await peer.client.disconnect()
+    return {"seconds": recovered, "lost": args.signals - received, "resumed": bool(resumed)}
+
+
+async def wait_ready(base_url: str):
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        for _ in range(200):
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not start")
+
+
+async def run_profile(name: str, args) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {
+        **os.environ,
+        "LOG_LEVEL": "WARNING",
+        # Salas ad hoc, sin llamadas detrás
+        "SIO_REQUIRE_AUTH": "false",
+        **PROFILES[name],
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        await wait_ready(base_url)
+        results = [await trial(base_url, n, args) for n in range(args.trials)]
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "resumed": sum(r["resumed"] for r in results),
+        "recovery": percentiles([r["seconds"] for r in results]),
+        "signals_lost_per_trial": sum(r["lost"] for r in results) / len(results),
+    }
+
+
+async def main(args):
+    results = {name: await run_profile(name, args) for name in PROFILES}
+    print(
+        json.dumps(
+            {"trials": args.trials, "signals": args.signals, "gap_seconds": args.gap, **results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--signals", type=int, default=10, help="señales enviadas durante el corte")
+    parser.add_argument("--gap", type=float, default=0.2, help="duración del corte en segundos")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""Latencia de relay Socket.IO (p50/p99) con y sin carga REST concurrente.
+
+Uso:
+    python benchmarks/signaling_under_rest_load.py --rest-workers 32 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import httpx
+import socketio
+
+from common import create_user, free_port, percentiles, start_server
+
+# La sonda de latencia envía más rápido que los límites de relay por defecto
+os.environ.setdefault("SIGNAL_RELAY_RATE_PER_SID", "0")
+os.environ.setdefault("SIGNAL_RELAY_RATE_PER_ROOM", "0")
+# Los pares de la sonda usan salas ad hoc, sin llamadas detrás
+os.environ.setdefault("SIO_REQUIRE_AUTH", "false")
+
+
+async def connect_pair(base_url: str, room: str):
+    latencies = []
+    a = socketio.AsyncClient()
+    b = socketio.AsyncClient()
+
+    @b.on("signal")
+    async def on_signal(data):
+        latencies.append(time.perf_counter() - data["payload"]["t"])
+
+    for client in (a, b):
+        await client.connect(base_url, transports=["websocket"])
+        await client.call("join", {"room": room})
+    return a, b, latencies
+
+
+async def measure_relay(a, b, latencies, duration: float, interval: float):
+    latencies.clear()
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        await a.emit(
+            "relay",
+            {"to": b.get_sid(), "type": "candidate", "payload": {"t": time.perf_counter()}},
+        )
+        await asyncio.sleep(interval)
+    await asyncio.sleep(0.5)
+    return percentiles(list(latencies))
+
+
+async def rest_worker(client: httpx.AsyncClient, headers, stop: asyncio.Event, counter):
+    while not stop.is_set():
+        resp = await client.get("/calls/waiting", headers=headers)
+        resp.raise_for_status()
+        resp = await client.get("/metrics/calls", headers=headers)
+        resp.raise_for_status()
+        counter[0] += 2
+
+
+async def main(args):
+    port = free_port()
+    server = await start_server(port)
+    base_url = f"http://127.0.0.1:{port}"
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        doctor = await create_user(client, "doctor")
+        for _ in range(args.waiting_calls):
+            patient = await create_user(client, "patient")
+            (await client.post("/calls/request", json={}, headers=patient)).raise_for_status()
+
+        a, b, latencies = await connect_pair(base_url, "bench-room")
+        idle = await measure_relay(a, b, latencies, args.duration, args.interval)
+
+        stop = asyncio.Event()
+        counter = [0]
+        workers = [
+            asyncio.create_task(rest_worker(client, doctor, stop, counter))
+            for _ in range(args.rest_workers)
+        ]
+        started = time.perf_counter()
+        loaded = await measure_relay(a, b, latencies, args.duration, args.interval)
+        stop.set()
+        await asyncio.gather(*workers)
+        rest_rps = counter[0] / (time.perf_counter() - started)
+
+        await a.disconnect()
+        await b.disconnect()
+
+    server.should_exit = True
+    await asyncio.sleep(0.2)
+    print(
+        json.dumps(
+            {
+                "relay_idle": idle,
+                "relay_under_rest_load": loaded,
+                "rest_workers": args.rest_workers,
+                "rest_requests_per_second": round(rest_rps, 1),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=float, default=0.005)
+    parser.add_argument("--rest-workers", type=int, default=32)
+    parser.add_argument("--waiting-calls", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
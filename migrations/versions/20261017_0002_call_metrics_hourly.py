@@ -0,0 +1,58 @@
+"""hourly per-doctor call metrics rollup
+
+Revision ID: 20261017_0002
+Revises: 20251203_0001
+Create Date: 2026-10-17 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision = "20261017_0002"
+down_revision = "20251203_0001"
+branch_labels = None
+depends_on = None
+
+# El tipo ya existe desde la revisión inicial
+call_status_enum = postgresql.ENUM(
+    "waiting",
+    "assigned",
+    "ringing",
+    "in_progress",
+    "reconnecting",
+    "ended",
+    "cancelled",
+    name="callstatus",
+    create_type=False,
+)
+
+
+def upgrade() -> None:
+    op.create_index(op.f("ix_calls_ended_at"), "calls", ["ended_at"], unique=False)
+
+    op.create_table(
+        "call_metrics_hourly",
+        sa.Column("bucket", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("doctor_id", sa.String(length=36), nullable=False, server_default=""),
+        sa.Column("status", call_status_enum, nullable=False),
+        sa.Column("calls", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("duration_sum", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("duration_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("reconnects_sum", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("reconnects_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.PrimaryKeyConstraint("bucket", "doctor_id", "status"),
+    )
+
+    op.create_table(
+        "metrics_watermarks",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("value", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("metrics_watermarks")
+    op.drop_table("call_metrics_hourly")
+    op.drop_index(op.f("ix_calls_ended_at"), table_name="calls")
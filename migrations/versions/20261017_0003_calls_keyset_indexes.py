@@ -0,0 +1,49 @@
+"""keyset pagination indexes for waiting queue and call history
+
+Revision ID: 20261017_0003
+Revises: 20261017_0002
+Create Date: 2026-10-17 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261017_0003"
+down_revision = "20261017_0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY para no bloquear escrituras en calls mientras se construyen
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_calls_waiting_requested",
+            "calls",
+            ["requested_at", "id"],
+            unique=False,
+            postgresql_where=sa.text("status = 'waiting'"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_calls_patient_history",
+            "calls",
+            ["patient_id", "requested_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_calls_doctor_history",
+            "calls",
+            ["doctor_id", "requested_at", "id"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_calls_doctor_history", table_name="calls", postgresql_concurrently=True)
+        op.drop_index("ix_calls_patient_history", table_name="calls", postgresql_concurrently=True)
+        op.drop_index("ix_calls_waiting_requested", table_name="calls", postgresql_concurrently=True)
@@ -0,0 +1,65 @@
+"""append-only call_events log; move meta.resumes into it
+
+Revision ID: 20261017_0004
+Revises: 20261017_0003
+Create Date: 2026-10-17 15:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261017_0004"
+down_revision = "20261017_0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "call_events",
+        sa.Column("id", sa.BigInteger(), primary_key=True, autoincrement=True),
+        sa.Column(
+            "call_id",
+            sa.Integer(),
+            sa.ForeignKey("calls.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("type", sa.String(length=32), nullable=False),
+        sa.Column(
+            "at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("NOW()"),
+            nullable=False,
+        ),
+        sa.Column("actor_id", sa.String(length=36), sa.ForeignKey("users.id")),
+        sa.Column("payload", sa.JSON()),
+    )
+    op.create_index("ix_call_events_call_id_id", "call_events", ["call_id", "id"], unique=False)
+
+    # Las reconexiones guardadas en calls.meta["resumes"] pasan a la bitácora
+    op.execute(
+        """
+        INSERT INTO call_events (call_id, type, at, payload)
+        SELECT c.id,
+               'resume',
+               COALESCE((r.value ->> 'at')::timestamptz, NOW()),
+               json_build_object('note', r.value ->> 'note')
+        FROM calls c
+        CROSS JOIN LATERAL json_array_elements(c.meta -> 'resumes') AS r(value)
+        WHERE json_typeof(c.meta -> 'resumes') = 'array'
+        ORDER BY c.id, r.value ->> 'at'
+        """
+    )
+    op.execute(
+        """
+        UPDATE calls
+        SET meta = (meta::jsonb - 'resumes')::json
+        WHERE meta IS NOT NULL AND meta::jsonb ? 'resumes'
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_call_events_call_id_id", table_name="call_events")
+    op.drop_table("call_events")
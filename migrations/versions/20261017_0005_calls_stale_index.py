@@ -0,0 +1,38 @@
+"""partial index for the stale call reaper
+
+Revision ID: 20261017_0005
+Revises: 20261017_0004
+Create Date: 2026-10-17 16:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261017_0005"
+down_revision = "20261017_0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Solo llamadas activas (no waiting): el índice se mantiene pequeño
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_calls_stale_active",
+            "calls",
+            [
+                "status",
+                sa.text("coalesce(last_resume_at, started_at, assigned_at, requested_at)"),
+            ],
+            unique=False,
+            postgresql_where=sa.text(
+                "status IN ('assigned', 'ringing', 'in_progress', 'reconnecting')"
+            ),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_calls_stale_active", table_name="calls", postgresql_concurrently=True)
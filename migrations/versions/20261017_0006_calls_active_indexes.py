@@ -0,0 +1,84 @@
+"""one active call per patient, doctor/status index, drop single-column call indexes
+
+Revision ID: 20261017_0006
+Revises: 20261017_0005
+Create Date: 2026-10-17 18:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261017_0006"
+down_revision = "20261017_0005"
+branch_labels = None
+depends_on = None
+
+ACTIVE = "status IN ('waiting', 'assigned', 'ringing', 'in_progress', 'reconnecting')"
+
+
+def upgrade() -> None:
+    # Duplicados que dejó la carrera del chequeo previo al INSERT: se conserva
+    # la llamada activa más reciente de cada paciente y se cancelan las demás
+    op.execute(
+        f"""
+        WITH duplicated AS (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY patient_id ORDER BY requested_at DESC, id DESC
+                ) AS rn
+                FROM calls
+                WHERE {ACTIVE}
+            ) ranked
+            WHERE rn > 1
+        ), cancelled AS (
+            UPDATE calls SET status = 'cancelled', ended_at = now()
+            FROM duplicated
+            WHERE calls.id = duplicated.id
+            RETURNING calls.id
+        )
+        INSERT INTO call_events (call_id, type, at, payload)
+        SELECT id, 'cancel', now(), '{{"reason": "duplicate_active"}}'::json FROM cancelled
+        """
+    )
+
+    # CONCURRENTLY: sin bloquear escrituras en calls. Si el índice único
+    # falla por un duplicado creado mientras tanto queda INVALID: repetir
+    # la migración tras borrarlo
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_calls_patient_active",
+            "calls",
+            ["patient_id"],
+            unique=True,
+            postgresql_where=sa.text(ACTIVE),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_calls_doctor_status",
+            "calls",
+            ["doctor_id", "status"],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        # Prefijos de ix_calls_patient_history / ix_calls_doctor_* y un status
+        # de baja cardinalidad: solo suman costo a cada escritura
+        op.drop_index("ix_calls_status", table_name="calls", postgresql_concurrently=True)
+        op.drop_index("ix_calls_patient_id", table_name="calls", postgresql_concurrently=True)
+        op.drop_index("ix_calls_doctor_id", table_name="calls", postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    # Las llamadas canceladas por duplicado no se reactivan
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_calls_doctor_id", "calls", ["doctor_id"], unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            "ix_calls_patient_id", "calls", ["patient_id"], unique=False, postgresql_concurrently=True
+        )
+        op.create_index(
+            "ix_calls_status", "calls", ["status"], unique=False, postgresql_concurrently=True
+        )
+        op.drop_index("ix_calls_doctor_status", table_name="calls", postgresql_concurrently=True)
+        op.drop_index("ix_calls_patient_active", table_name="calls", postgresql_concurrently=True)
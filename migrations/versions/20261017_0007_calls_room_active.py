@@ -0,0 +1,62 @@
+"""one active call per room
+
+Revision ID: 20261017_0007
+Revises: 20261017_0006
+Create Date: 2026-10-17 20:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "20261017_0007"
+down_revision = "20261017_0006"
+branch_labels = None
+depends_on = None
+
+ACTIVE = "status IN ('waiting', 'assigned', 'ringing', 'in_progress', 'reconnecting')"
+
+
+def upgrade() -> None:
+    # Salas compartidas por varias llamadas activas (room_id elegido por el
+    # cliente): se conserva la más antigua, dueña original de la sala, y se
+    # cancelan las que se sumaron después
+    op.execute(
+        f"""
+        WITH duplicated AS (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (
+                    PARTITION BY room_id ORDER BY requested_at ASC, id ASC
+                ) AS rn
+                FROM calls
+                WHERE {ACTIVE}
+            ) ranked
+            WHERE rn > 1
+        ), cancelled AS (
+            UPDATE calls SET status = 'cancelled', ended_at = now()
+            FROM duplicated
+            WHERE calls.id = duplicated.id
+            RETURNING calls.id
+        )
+        INSERT INTO call_events (call_id, type, at, payload)
+        SELECT id, 'cancel', now(), '{{"reason": "duplicate_room"}}'::json FROM cancelled
+        """
+    )
+
+    # CONCURRENTLY, como ix_calls_patient_active: si falla por un duplicado
+    # creado mientras tanto queda INVALID; repetir tras borrarlo
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_calls_room_active",
+            "calls",
+            ["room_id"],
+            unique=True,
+            postgresql_where=sa.text(ACTIVE),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    # Las llamadas canceladas por sala duplicada no se reactivan
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_calls_room_active", table_name="calls", postgresql_concurrently=True)
@@ -27,7 +27,8 @@ const state = {
   token: null,
   user: null,
   currentCall: null,
-  callPoll: null,
+  events: null,
+  waitingQueue: new Map(),
 };
 
 function setStatus(msg = "", type = "info") {
@@ -42,8 +43,8 @@ function setSectionVisible(section, visible) {
 }
 
 function resetCallState() {
+  unsubscribeCurrentCall();
   state.currentCall = null;
-  stopCallPolling();
   updateCallPanel();
   updatePanels();
 }
@@ -88,44 +89,103 @@ function updateCallPanel() {
   btnHang.disabled = call.status === "ended" || call.status === "cancelled";
 
   if (["ended", "cancelled"].includes(call.status)) {
-    stopCallPolling();
     btnStart.disabled = true;
   }
   updatePanels();
 }
 
 function assignCall(call) {
+  if (state.currentCall && state.currentCall.id !== call.id) {
+    unsubscribeCurrentCall();
+  }
   state.currentCall = call;
   updateCallPanel();
   updatePanels();
-  startCallPolling();
+  subscribeCurrentCall();
 }
 
-function startCallPolling() {
-  stopCallPolling();
-  if (!state.currentCall) return;
-  state.callPoll = setInterval(fetchCurrentCall, 5000);
+// Estado de la llamada empujado por el servidor (evento call-updated),
+// en lugar de consultar GET /calls/{id} periodicamente.
+function connectEvents() {
+  if (state.events) return state.events;
+  state.events = io(SIGNAL_URL, {
+    path: "/socket.io",
+    // JWT en el handshake; como función para que cada reconexión use el token actual
+    auth: (cb) => cb({ token: state.token }),
+    transports: ["polling", "websocket"],
+    withCredentials: false,
+  });
+  state.events.on("connect", () => {
+    subscribeCurrentCall();
+    subscribeWaitingQueue();
+  });
+  state.events.on("call-updated", (call) => {
+    if (!state.currentCall || state.currentCall.id !== call.id) return;
+    state.currentCall = call;
+    updateCallPanel();
+  });
+  state.events.on("queue-delta", applyQueueDelta);
+  return state.events;
 }
 
-function stopCallPolling() {
-  if (state.callPoll) {
-    clearInterval(state.callPoll);
-    state.callPoll = null;
-  }
+function disconnectEvents() {
+  if (!state.events) return;
+  try { state.events.disconnect(); } catch (_) {}
+  state.events = null;
 }
 
-async function fetchCurrentCall() {
-  if (!state.currentCall) return;
-  try {
-    const call = await apiFetch(`/calls/${state.currentCall.id}`);
-    state.currentCall = call;
-    updateCallPanel();
-    if (["ended", "cancelled"].includes(call.status)) {
-      stopCallPolling();
+function subscribeCurrentCall() {
+  const call = state.currentCall;
+  if (!call || !state.token) return;
+  const events = connectEvents();
+  if (!events.connected) return; // se suscribe al conectar
+  events.emit("subscribe-call", { call_id: call.id, token: state.token }, (res) => {
+    if (!res || !res.ok) {
+      console.error("No se pudo suscribir a la llamada", res && res.error);
+      return;
     }
-  } catch (err) {
-    console.error("Error fetching call", err);
+    if (state.currentCall && state.currentCall.id === res.call.id) {
+      state.currentCall = res.call;
+      updateCallPanel();
+    }
+  });
+}
+
+// Cola de espera en vivo para medicos: una foto inicial y luego deltas
+function subscribeWaitingQueue() {
+  if (!state.user || state.user.role !== "doctor" || !state.token) return;
+  const events = connectEvents();
+  if (!events.connected) return; // se suscribe al conectar
+  events.emit("subscribe-queue", { token: state.token }, (res) => {
+    if (!res || !res.ok) {
+      console.error("No se pudo suscribir a la cola", res && res.error);
+      refreshWaitingCalls();
+      return;
+    }
+    state.waitingQueue = new Map(res.calls.map((call) => [call.id, call]));
+    renderWaitingQueue();
+  });
+}
+
+function applyQueueDelta(delta) {
+  if (delta.op === "remove") {
+    state.waitingQueue.delete(delta.call_id);
+  } else {
+    state.waitingQueue.set(delta.call.id, delta.call);
   }
+  renderWaitingQueue();
+}
+
+function renderWaitingQueue() {
+  const calls = [...state.waitingQueue.values()].sort(
+    (a, b) => a.requested_at.localeCompare(b.requested_at) || a.id - b.id
+  );
+  renderWaitingCalls(calls);
+}
+
+function unsubscribeCurrentCall() {
+  if (!state.events || !state.currentCall) return;
+  state.events.emit("unsubscribe-call", { call_id: state.currentCall.id });
 }
 
 async function apiFetch(path, { method = "GET", body, headers } = {}) {
@@ -196,7 +256,8 @@ async function loadProfile() {
     authStatus.textContent = `Sesion activa: ${user.full_name} (${user.role})`;
     if (user.role === "doctor") {
       doctorAvailable.checked = Boolean(user.is_available);
-      await refreshWaitingCalls();
+      connectEvents();
+      subscribeWaitingQueue();
     }
     updatePanels();
   } catch (err) {
@@ -206,10 +267,13 @@ async function loadProfile() {
 
 function logout() {
   state.token = null;
+  iceCache = null;
   state.user = null;
+  state.waitingQueue = new Map();
   authStatus.textContent = "Ingresa tus credenciales para comenzar.";
   setStatus("Sesion cerrada", "info");
   resetCallState();
+  disconnectEvents();
   updatePanels();
   waitingCalls.innerHTML = "";
   hangup();
@@ -240,6 +304,7 @@ async function refreshWaitingCalls() {
   if (!state.user || state.user.role !== "doctor") return;
   try {
     const calls = await apiFetch("/calls/waiting");
+    state.waitingQueue = new Map(calls.map((call) => [call.id, call]));
     renderWaitingCalls(calls);
   } catch (err) {
     setStatus("No se pudieron obtener las llamadas en espera", "error");
@@ -298,8 +363,8 @@ async function handleStartVideo() {
     return;
   }
   try {
-    await apiFetch(`/calls/${state.currentCall.id}/start`, { method: "POST" });
-    await fetchCurrentCall();
+    state.currentCall = await apiFetch(`/calls/${state.currentCall.id}/start`, { method: "POST" });
+    updateCallPanel();
     await startCall();
     setStatus("Sesion WebRTC iniciada", "info");
   } catch (err) {
@@ -312,8 +377,8 @@ async function handleHangup() {
   try {
     await hangup();
     if (state.currentCall) {
-      await apiFetch(`/calls/${state.currentCall.id}/end`, { method: "POST" });
-      await fetchCurrentCall();
+      state.currentCall = await apiFetch(`/calls/${state.currentCall.id}/end`, { method: "POST" });
+      updateCallPanel();
       setStatus("Llamada finalizada", "info");
     }
   } catch (err) {
@@ -373,6 +438,9 @@ let pc = null;
 let localStream = null;
 let remoteStream = null;
 let currentPeerSid = null;
+// Token para reanudar la señalización tras un corte breve sin renegociar
+let resumeToken = null;
+let currentRoomId = null;
 
 const constraintsByRes = {
   qvga: { width: { exact: 320 }, height: { exact: 240 } },
@@ -410,6 +478,27 @@ function relay(msg) {
   sio.emit("relay", msg);
 }
 
+// Config ICE reutilizable mientras dure su max-age (las credenciales TURN
+// temporales vencen poco después); se pide de nuevo al cambiar de sesión
+let iceCache = null;
+
+async function getIceServers() {
+  const now = Date.now();
+  if (iceCache && iceCache.token === state.token && iceCache.expiresAt > now) {
+    return iceCache.servers;
+  }
+  const headers = state.token ? { Authorization: `Bearer ${state.token}` } : {};
+  const resp = await fetch(`${API_BASE}/ice`, { credentials: "include", headers });
+  if (!resp.ok) {
+    throw new Error(`ICE config HTTP ${resp.status}`);
+  }
+  const json = await resp.json();
+  const match = /max-age=(\d+)/.exec(resp.headers.get("Cache-Control") || "");
+  const maxAge = match ? parseInt(match[1], 10) : 0;
+  iceCache = { token: state.token, servers: json.iceServers || [], expiresAt: now + maxAge * 1000 };
+  return iceCache.servers;
+}
+
 async function startCall() {
   if (!navigator.mediaDevices || !navigator.mediaDevices.getUserMedia) {
     alert("Tu navegador requiere HTTPS o localhost para usar camara y microfono.");
@@ -426,14 +515,7 @@ async function startCall() {
   const bitrateKbps = Math.max(150, parseInt(el("bitrate").value, 10) || 1200);
 
   try {
-    const iceResp = await fetch(`${API_BASE}/ice`, {
-      credentials: "include",
-    });
-    if (!iceResp.ok) {
-      throw new Error(`ICE config HTTP ${iceResp.status}`);
-    }
-    const iceJson = await iceResp.json();
-    const iceServers = iceJson.iceServers || [];
+    const iceServers = await getIceServers();
 
     const mediaConstraints = {
       video: {
@@ -467,8 +549,12 @@ async function startCall() {
     };
 
     pc.onicecandidate = (ev) => {
-      if (ev.candidate && currentPeerSid) {
+      if (!currentPeerSid) return;
+      if (ev.candidate) {
         relay({ type: "candidate", payload: ev.candidate, to: currentPeerSid });
+      } else {
+        // Fin de candidatos: el servidor entrega en seguida la tanda pendiente
+        relay({ type: "end-of-candidates", to: currentPeerSid });
       }
     };
 
@@ -500,6 +586,9 @@ async function startCall() {
       //   - luego upgrade a websocket
       transports: ["polling", "websocket"],
       withCredentials: false,
+      // El servidor valida el JWT una vez al conectar y solo permite unirse
+      // a las salas de llamadas activas del usuario
+      auth: (cb) => cb({ token: state.token }),
       reconnectionAttempts: 3,
       timeout: 20000,
       // 👇 NO forzamos upgrade:false, que a veces rompe con proxies
@@ -511,9 +600,15 @@ async function startCall() {
     sio.on("connect_error", (err) => console.error("connect_error", err));
     sio.on("error", (err) => console.error("socket error", err));
 
-    sio.on("connect", () => {
-      log("Socket.IO conectado, sid:", sio.id);
+    const joinRoom = () => {
       sio.emit("join", { room: roomId }, async (res) => {
+        if (res && res.ok === false) {
+          log("No se pudo unir a la sala:", res.error);
+          alert("No se pudo unir a la sala: " + res.error);
+          return;
+        }
+        resumeToken = (res && res.resume_token) || null;
+        currentRoomId = roomId;
         const peers = (res && res.peers) || [];
         if (peers.length) {
           currentPeerSid = peers[0];
@@ -523,6 +618,24 @@ async function startCall() {
           relay({ type: "offer", to: currentPeerSid, payload: offer });
         }
       });
+    };
+
+    sio.on("connect", () => {
+      log("Socket.IO conectado, sid:", sio.id);
+      if (!resumeToken) {
+        joinRoom();
+        return;
+      }
+      // Reconexión: recupera el lugar en la sala y las señales perdidas
+      sio.emit("resume", { token: resumeToken }, (res) => {
+        if (res && res.ok) {
+          log("Señalización reanudada, señales reenviadas:", res.replayed);
+          return;
+        }
+        log("No se pudo reanudar:", res && res.error);
+        resumeToken = null;
+        joinRoom();
+      });
     });
 
     sio.on("peer-joined", async ({ sid }) => {
@@ -556,6 +669,18 @@ async function startCall() {
       }
     });
 
+    sio.on("signal-batch", async ({ from, payloads }) => {
+      log("signal-batch recibido:", payloads.length, "candidatos de", from);
+      currentPeerSid = from;
+      for (const payload of payloads) {
+        try {
+          await pc.addIceCandidate(payload);
+        } catch (err) {
+          console.error("Error agregando candidato", err);
+        }
+      }
+    });
+
     sio.on("disconnect", (reason) => log("Socket.IO desconectado:", reason));
   } catch (err) {
     console.error("Error en startCall:", err);
@@ -569,7 +694,14 @@ async function hangup() {
   btnStartLegacy.disabled = false;
   btnHangLegacy.disabled = true;
 
-  try { sio && sio.disconnect(); } catch (_) {}
+  try {
+    // Salida explícita: el servidor avisa peer-left sin esperar la ventana
+    // de reanudación
+    if (sio && currentRoomId) sio.emit("leave", { room: currentRoomId });
+    sio && sio.disconnect();
+  } catch (_) {}
+  resumeToken = null;
+  currentRoomId = null;
   try { pc && pc.close(); } catch (_) {}
   try {
     localStream && localStream.getTracks().forEach((t) => t.stop());
@@ -1,2 +1,5 @@
-nssm install py-api "C:\Python311\python.exe" "C:\path\to\your\app\run_api_entry.py"
-REM Si usas main combinado, apunta a app.main:app con uvicorn en un .bat
+@echo off
+REM API + señalización (app.main) como servicio. python -m app fija
+REM WindowsSelectorEventLoopPolicy antes de que uvicorn cree el event loop.
+nssm install py-api "D:\services\videollamada-python\.venv\Scripts\python.exe" "-m app --host 0.0.0.0 --port 8100"
+nssm set py-api AppDirectory "D:\services\videollamada-python"
@@ -1 +1,6 @@
-nssm install py-signal "C:\Python314\python.exe" "C:\path\to\your\app\run_signal_entry.py"
+@echo off
+REM La señalización Socket.IO corre en el mismo proceso que la API (app.main);
+REM con scripts\nssm_install_api.bat no hace falta otro servicio. Solo para
+REM servir la señalización en otro puerto/host, con la misma política de loop:
+nssm install py-signal "D:\services\videollamada-python\.venv\Scripts\python.exe" "-m app --host 0.0.0.0 --port 8200"
+nssm set py-signal AppDirectory "D:\services\videollamada-python"
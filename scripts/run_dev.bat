@@ -7,6 +7,7 @@ call .venv\Scripts\activate.bat
 REM Inicializar DB (solo crea tablas si no existen)
 python -c "from app.main import bootstrap; bootstrap()"
 
-REM Levantar uvicorn desde la venv
-python -m uvicorn app.main:app --host 0.0.0.0 --port 8100 --proxy-headers
+REM Levantar la API desde la venv. python -m app fija WindowsSelectorEventLoopPolicy
+REM antes de arrancar uvicorn (psycopg async no funciona con el loop Proactor)
+python -m app --host 0.0.0.0 --port 8100 --reload
 